@@ -1,10 +1,16 @@
 
+import os
+import sys
 import pandas as pd
 import numpy as np
 
+# Share the report reader (engine choice, column projection, schema dtypes) with ov_process_gmail_reports.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ov_process_gmail_reports"))
+from report_reader import read_report
+
 # Load the Excel file
 file_path = 'ov_process_gmail_reports/reports/volunteer-hours/volunteer-hours-2025-10-10.xlsx'
-df = pd.read_excel(file_path)
+df = read_report(file_path, columns=['Total Hours', 'Target Hours', 'Finished Hours', 'FundRaising Hours'])
 
 # Data Cleaning and Preparation
 # It's common for column names to have leading/trailing spaces
@@ -1,16 +1,33 @@
 
-import pandas as pd
-import numpy as np
 import logging
 import logging.config
 import os
 import argparse
+import glob
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import repeat
+
+from db_setup import DB_FILE, REPORT_TABLES, SUMMARY_BRACKETS
+from report_ingest import Report
+from report_reader import READER_ENGINES
+
+# The only report columns the analysis looks at.
+ANALYSIS_COLUMNS = ['Total Hours', 'Target Hours', 'Finished Hours', 'FundRaising Hours']
+
+# Completion brackets of the percentage of target hours completed.
+BRACKET_BINS = [0, 25, 50, 75, 100, float('inf')]
+BRACKET_LABELS = ['0-25%', '26-50%', '51-75%', '76-100%', '>100%']
+
+# Report snapshots are dated in their filenames, e.g. volunteer-hours-2025-10-10.xlsx.
+SNAPSHOT_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # --- Logging Configuration ---
 LOG_DIR = os.path.join(SCRIPT_DIR, "log")
-os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "analyze_report.log")
 
 LOGGING_CONFIG = {
@@ -40,58 +57,222 @@ LOGGING_CONFIG = {
     },
 }
 
-logging.config.dictConfig(LOGGING_CONFIG)
-
-# --- Argument Parsing ---
-parser = argparse.ArgumentParser(description='Analyze an OnVolunteers report.')
-parser.add_argument('file_path', type=str, help='The path to the report file.')
-args = parser.parse_args()
-
-# Load the Excel file
-df = pd.read_excel(args.file_path)
-
-# Data Cleaning and Preparation
-# It's common for column names to have leading/trailing spaces
-df.columns = df.columns.str.strip()
-
-# --- Analysis ---
-
-# 1. Families who have completed their target hours
-# Assuming 'Total Hours' and 'Target Hours' are columns in the dataframe
-if 'Total Hours' in df.columns and 'Target Hours' in df.columns:
-    completed_target_hours = df[df['Total Hours'] >= df['Target Hours']]
-    num_completed_target_hours = len(completed_target_hours)
-    logging.info(f"Number of families who have completed their target hours: {num_completed_target_hours}")
-
-# 2. Families who have finished hours
-# Assuming 'Finished Hours' is a column in the dataframe
-if 'Finished Hours' in df.columns:
-    finished_hours = df[df['Finished Hours'] > 0]
-    num_finished_hours = len(finished_hours)
-    logging.info(f"Number of families who have finished hours: {num_finished_hours}")
-
-# 3. Families who have completed or registered their fundraising hours
-# Assuming 'FundRaising Hours' is a column in the dataframe
-if 'FundRaising Hours' in df.columns:
-    fundraising_hours = df[df['FundRaising Hours'] > 0]
-    num_fundraising_hours = len(fundraising_hours)
-    logging.info(f"Number of families who have completed or registered fundraising hours: {num_fundraising_hours}")
-
-# 4. Additional Insights
-# Average number of hours contributed
-if 'Total Hours' in df.columns:
-    average_hours = df['Total Hours'].mean()
-    logging.info(f"Average number of hours contributed per family: {average_hours:.2f}")
-
-# Distribution of families by percentage of target hours completed
-if 'Total Hours' in df.columns and 'Target Hours' in df.columns:
-    df['Percent Complete'] = (df['Total Hours'] / df['Target Hours'])
-    df['Percent Complete'] = df['Percent Complete'].fillna(0)
-    df['Percent Complete'] = df['Percent Complete'].replace([np.inf, -np.inf], 0)
-    df['Percent Complete'] = df['Percent Complete'] * 100
-    bins = [0, 25, 50, 75, 100, np.inf]
-    labels = ['0-25%', '26-50%', '51-75%', '76-100%', '>100%']
-    df['Completion Bracket'] = pd.cut(df['Percent Complete'], bins=bins, labels=labels, right=False)
-    completion_distribution = df['Completion Bracket'].value_counts().sort_index()
+def analyze_report(df):
+    """Logs completion, participation and bracket metrics for one report DataFrame."""
+    import numpy as np
+    import pandas as pd
+
+    # Work on a shallow copy so a shared, already-parsed report is left untouched.
+    df = df.copy(deep=False)
+
+    # Data Cleaning and Preparation
+    # It's common for column names to have leading/trailing spaces
+    df.columns = df.columns.str.strip()
+
+    # --- Analysis ---
+
+    # 1. Families who have completed their target hours
+    # Assuming 'Total Hours' and 'Target Hours' are columns in the dataframe
+    if 'Total Hours' in df.columns and 'Target Hours' in df.columns:
+        completed_target_hours = df[df['Total Hours'] >= df['Target Hours']]
+        num_completed_target_hours = len(completed_target_hours)
+        logging.info(f"Number of families who have completed their target hours: {num_completed_target_hours}")
+
+    # 2. Families who have finished hours
+    # Assuming 'Finished Hours' is a column in the dataframe
+    if 'Finished Hours' in df.columns:
+        finished_hours = df[df['Finished Hours'] > 0]
+        num_finished_hours = len(finished_hours)
+        logging.info(f"Number of families who have finished hours: {num_finished_hours}")
+
+    # 3. Families who have completed or registered their fundraising hours
+    # Assuming 'FundRaising Hours' is a column in the dataframe
+    if 'FundRaising Hours' in df.columns:
+        fundraising_hours = df[df['FundRaising Hours'] > 0]
+        num_fundraising_hours = len(fundraising_hours)
+        logging.info(f"Number of families who have completed or registered fundraising hours: {num_fundraising_hours}")
+
+    # 4. Additional Insights
+    # Average number of hours contributed
+    if 'Total Hours' in df.columns:
+        average_hours = df['Total Hours'].mean()
+        logging.info(f"Average number of hours contributed per family: {average_hours:.2f}")
+
+    # Distribution of families by percentage of target hours completed
+    if 'Total Hours' in df.columns and 'Target Hours' in df.columns:
+        df['Percent Complete'] = (df['Total Hours'] / df['Target Hours'])
+        df['Percent Complete'] = df['Percent Complete'].fillna(0)
+        df['Percent Complete'] = df['Percent Complete'].replace([np.inf, -np.inf], 0)
+        df['Percent Complete'] = df['Percent Complete'] * 100
+        df['Completion Bracket'] = pd.cut(df['Percent Complete'], bins=BRACKET_BINS, labels=BRACKET_LABELS, right=False)
+        completion_distribution = df['Completion Bracket'].value_counts().sort_index()
+        logging.info("\nDistribution of families by percentage of target hours completed:")
+        logging.info(completion_distribution)
+
+def snapshot_date(path):
+    """Returns the date in a report's filename, or None if it has none."""
+    match = SNAPSHOT_DATE_PATTERN.search(os.path.basename(path))
+    try:
+        return date.fromisoformat(match.group()) if match else None
+    except ValueError:
+        return None
+
+def find_reports(path, since=None, until=None):
+    """
+    Returns the .xlsx reports named by a file, a directory or a glob, oldest first. With since
+    and/or until, only reports dated (in their filename) within that range are kept.
+    """
+    if os.path.isdir(path):
+        paths = glob.glob(os.path.join(path, "*.xlsx"))
+    elif glob.has_magic(path):
+        paths = glob.glob(path)
+    else:
+        paths = [path]
+    if since or until:
+        paths = [
+            p for p in paths
+            if snapshot_date(p) and (not since or snapshot_date(p) >= since) and (not until or snapshot_date(p) <= until)
+        ]
+    return sorted(paths, key=lambda p: (snapshot_date(p) or date.max, p))
+
+def _read_snapshot(path, engine=None):
+    return Report.from_file(path, columns=ANALYSIS_COLUMNS, engine=engine).df
+
+def load_snapshots(paths, engine=None, workers=1):
+    """
+    Reads the analysis columns of many reports into one DataFrame, with a 'snapshot' column
+    holding each row's report date (or filename, for undated or same-day reports).
+    """
+    import numpy as np
+    import pandas as pd
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(_read_snapshot, paths, repeat(engine), chunksize=max(1, len(paths) // (4 * workers))))
+    else:
+        frames = [_read_snapshot(path, engine) for path in paths]
+    keys = [str(snapshot_date(path) or os.path.basename(path)) for path in paths]
+    counts = Counter(keys)
+    keys = [key if counts[key] == 1 else os.path.basename(path) for key, path in zip(keys, paths)]
+    frames = [frame.rename(columns=str.strip).reindex(columns=ANALYSIS_COLUMNS) for frame in frames]
+    df = pd.concat(frames, ignore_index=True)
+    df['snapshot'] = pd.Categorical(np.repeat(keys, [len(frame) for frame in frames]), categories=keys, ordered=True)
+    return df
+
+def analyze_snapshots(df):
+    """
+    Computes the analyze_report metrics of every snapshot in one grouped pass over a frame
+    built by load_snapshots. Returns one row per snapshot, in snapshot order.
+    """
+    import numpy as np
+    import pandas as pd
+
+    total, target = df['Total Hours'], df['Target Hours']
+    percent_complete = (total / target).fillna(0).replace([np.inf, -np.inf], 0) * 100
+    flags = pd.DataFrame({
+        'snapshot': df['snapshot'],
+        'completed_target_hours': total >= target,
+        'with_finished_hours': df['Finished Hours'] > 0,
+        'with_fundraising_hours': df['FundRaising Hours'] > 0,
+        'Total Hours': total,
+    })
+    metrics = flags.groupby('snapshot', observed=False).agg(
+        families=('Total Hours', 'size'),
+        completed_target_hours=('completed_target_hours', 'sum'),
+        with_finished_hours=('with_finished_hours', 'sum'),
+        with_fundraising_hours=('with_fundraising_hours', 'sum'),
+        average_total_hours=('Total Hours', 'mean'),
+    )
+    brackets = pd.crosstab(
+        df['snapshot'], pd.cut(percent_complete, bins=BRACKET_BINS, labels=BRACKET_LABELS, right=False), dropna=False
+    )
+    return metrics.join(brackets.reindex(index=metrics.index, columns=BRACKET_LABELS, fill_value=0))
+
+def load_summaries(db_file, report_type, report_date=None):
+    """Returns the report_summary rows of a report type, oldest first, optionally for one date only."""
+    query = "SELECT * FROM report_summary WHERE report_type = ?"
+    params = [report_type]
+    if report_date:
+        query += " AND report_date = ?"
+        params.append(report_date)
+    import duckdb
+
+    con = duckdb.connect(db_file, read_only=True)
+    try:
+        return con.execute(query + " ORDER BY report_date, report_id", params).fetchdf()
+    finally:
+        con.close()
+
+def log_summary(summary):
+    """Logs one report_summary row with the same metrics analyze_report logs for a parsed report."""
+    import pandas as pd
+
+    logging.info(f"Number of families who have completed their target hours: {summary['completed_target_hours']}")
+    logging.info(f"Number of families who have finished hours: {summary['with_finished_hours']}")
+    logging.info(f"Number of families who have completed or registered fundraising hours: {summary['with_fundraising_hours']}")
+    logging.info(f"Average number of hours contributed per family: {summary['average_total_hours']:.2f}")
+    completion_distribution = pd.Series(
+        [summary[column] for column in SUMMARY_BRACKETS],
+        index=pd.Index([label for label, _, _ in SUMMARY_BRACKETS.values()], name='Completion Bracket'),
+        name='count',
+    )
     logging.info("\nDistribution of families by percentage of target hours completed:")
     logging.info(completion_distribution)
+
+def log_history(summaries):
+    """Logs the metrics of every report snapshot in the database, one line per snapshot."""
+    history = summaries.drop(columns=['report_id', 'report_type']).rename(
+        columns={column: label for column, (label, _, _) in SUMMARY_BRACKETS.items()}
+    )
+    logging.info(f"\nMetrics history ({len(history)} snapshots):\n{history.to_string(index=False, float_format='{:.2f}'.format)}")
+
+def analyze_from_db(db_file, report_type, report_date=None):
+    """Logs the stored metrics of one report date, or the whole history if no date is given."""
+    summaries = load_summaries(db_file, report_type, report_date)
+    if summaries.empty:
+        logging.error(f"No {report_type} report summaries found in {db_file}" + (f" for {report_date}." if report_date else "."))
+        return
+    if not report_date:
+        log_history(summaries)
+        return
+    for _, summary in summaries.iterrows():
+        logging.info(f"Report {summary['report_id']} ({report_date}):")
+        log_summary(summary)
+
+def main():
+    # --- Argument Parsing ---
+    parser = argparse.ArgumentParser(description='Analyze an OnVolunteers report.')
+    parser.add_argument('file_path', type=str, nargs='?', help='The path to a report file, a directory of reports, or a glob (quote it).')
+    parser.add_argument('--since', type=date.fromisoformat, help='Only analyze reports dated on or after this date (YYYY-MM-DD).')
+    parser.add_argument('--until', type=date.fromisoformat, help='Only analyze reports dated on or before this date (YYYY-MM-DD).')
+    parser.add_argument('--workers', type=int, default=1, help='Processes used to read many reports (default: 1).')
+    parser.add_argument('--reader', choices=READER_ENGINES, help='Excel reader engine (default: EXCEL_READER or auto).')
+    parser.add_argument('--from-db', action='store_true', help='Read the metrics stored by load_db.py instead of a report file.')
+    parser.add_argument('--date', help='With --from-db, the report date (YYYY-MM-DD) to show. Without it, the whole history is shown.')
+    parser.add_argument('--report-type', choices=list(REPORT_TABLES), default='volunteer', help='With --from-db, the report type (default: volunteer).')
+    parser.add_argument('--db', default=DB_FILE, help=f'With --from-db, the DuckDB database (default: {DB_FILE}).')
+    args = parser.parse_args()
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.config.dictConfig(LOGGING_CONFIG)
+
+    if args.from_db:
+        analyze_from_db(args.db, args.report_type, args.date)
+        return
+    if not args.file_path:
+        parser.error("file_path is required unless --from-db is given")
+
+    paths = find_reports(args.file_path, args.since, args.until)
+    if not paths:
+        logging.error(f"No reports found for {args.file_path}.")
+        return
+    if len(paths) == 1 and not os.path.isdir(args.file_path) and not glob.has_magic(args.file_path):
+        # Load the Excel file, reading only the columns the analysis uses
+        analyze_report(Report.from_file(paths[0], columns=ANALYSIS_COLUMNS, engine=args.reader).df)
+        return
+
+    metrics = analyze_snapshots(load_snapshots(paths, engine=args.reader, workers=args.workers))
+    logging.info(f"\nMetrics by snapshot ({len(metrics)} reports):\n{metrics.to_string(float_format='{:.2f}'.format)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the OnVolunteers report processing code.
+
+Usage:
+  python benchmark.py ingest [--rows N] [--file <path_to_report.xlsx>]
+  python benchmark.py reader [--rows N] [--file <path_to_report.xlsx>] [--memory]
+  python benchmark.py season [--rows N] [--snapshots N] [--file <path_to_report.xlsx>]
+  python benchmark.py startup [--runs N] [--budget-ms MS]
+  python benchmark.py fines [--rows N] [--snapshots N]
+  python benchmark.py writer [--rows N] [--workbooks N] [--memory]
+"""
+
+import argparse
+import io
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import data_lake
+import fines
+import report_ingest
+import report_writer
+from analyze_report import ANALYSIS_COLUMNS, analyze_report, analyze_snapshots, find_reports, load_snapshots
+from report_ingest import Report
+from report_reader import calamine_available, read_report
+
+def make_synthetic_frame(rows, seed=0):
+    """Returns the rows of a User Volunteer Hours report with the given number of families, as a DataFrame."""
+    rng = np.random.default_rng(seed)
+    total_hours = rng.gamma(2.0, 3.0, rows).round(2)
+    df = pd.DataFrame({
+        "Last Name": [f"Last{i}" for i in range(rows)],
+        "First Name": [f"First{i}" for i in range(rows)],
+        "Child Last Name": [f"Last{i}" for i in range(rows)],
+        "Child First Name": [f"Child{i}" for i in range(rows)],
+        "Children": [f"Child{i} Last{i}" for i in range(rows)],
+        "Email": [f"family{i}@example.org" for i in range(rows)],
+        "Telephone": [f"415-555-{i % 10000:04d}" for i in range(rows)],
+        "Upcoming Hours": rng.integers(0, 4, rows).astype(float),
+        "Pending Hours": rng.integers(0, 3, rows).astype(float),
+        "Finished Hours": total_hours,
+        "Adhoc Hours": np.zeros(rows),
+        "Total Hours": total_hours,
+        "FundRaising Hours": rng.integers(0, 3, rows).astype(float),
+        "Target Hours": np.full(rows, 10.0),
+        "Adjustment Hours": np.zeros(rows),
+        "Adjust Notes": [""] * rows,
+    })
+    return df
+
+def make_synthetic_report(rows, seed=0):
+    """Returns the .xlsx bytes of a User Volunteer Hours report with the given number of family rows."""
+    buffer = io.BytesIO()
+    make_synthetic_frame(rows, seed).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+def _consume(df):
+    """The work every consumer of a parsed report does: classify, build the export frame, analyze."""
+    df["Total Hours"].mean()
+    export = df.copy(deep=False)
+    export["report_id"] = "benchmark"
+    analyze_report(df)
+
+def bench_ingest(data):
+    """Times the old four-parse flow against a single shared Report parse."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "report.xlsx")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        # Before: get_report_type, export_to_data_lake, ov_identify_report and analyze_report
+        # each called pd.read_excel on the file themselves.
+        start = time.perf_counter()
+        for _ in range(4):
+            _consume(pd.read_excel(path, header=0))
+        before = time.perf_counter() - start
+
+        # After: one Report built from the in-memory attachment bytes, shared by every consumer.
+        parses_at_start = report_ingest.PARSE_COUNT
+        start = time.perf_counter()
+        report = Report(data, "report.xlsx")
+        for _ in range(4):
+            _consume(report.df)
+        after = time.perf_counter() - start
+        after_parses = report_ingest.PARSE_COUNT - parses_at_start
+
+    print(f"{'path':<8} {'parses':>6} {'seconds':>8}")
+    print(f"{'before':<8} {4:>6} {before:>8.3f}")
+    print(f"{'after':<8} {after_parses:>6} {after:>8.3f}")
+
+def bench_reader(data, memory=False):
+    """
+    Times each Excel reader engine, with and without column projection, against today's
+    pd.read_excel. With memory=True each case runs a second time under tracemalloc to
+    report peak Python-heap usage (slow, and blind to calamine's native allocations).
+    """
+    cases = [("pd.read_excel (today)", lambda: pd.read_excel(io.BytesIO(data), header=0))]
+    engines = ["openpyxl", "stream"] + (["calamine"] if calamine_available() else [])
+    for engine in engines:
+        cases.append((engine, lambda engine=engine: read_report(data, engine=engine)))
+        cases.append((f"{engine} + columns", lambda engine=engine: read_report(data, columns=ANALYSIS_COLUMNS, engine=engine)))
+
+    print(f"{'reader':<24} {'rows':>8} {'cols':>5} {'seconds':>8}" + (f" {'py peak MB':>10}" if memory else ""))
+    for name, read in cases:
+        start = time.perf_counter()
+        df = read()
+        elapsed = time.perf_counter() - start
+        line = f"{name:<24} {len(df):>8} {len(df.columns):>5} {elapsed:>8.3f}"
+        if memory:
+            del df
+            tracemalloc.start()
+            read()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            line += f" {peak / 2**20:>10.1f}"
+        print(line)
+    if not calamine_available():
+        print("python-calamine is not installed; the calamine engine was skipped.")
+
+def bench_season(data, snapshots):
+    """
+    Times a season of dated snapshots analyzed one `analyze_report.py <file>` process at a
+    time (the old shell loop) against a single `analyze_report.py <dir>` grouped pass.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyze_report.py")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i in range(snapshots):
+            with open(os.path.join(tmp_dir, f"volunteer-hours-2025-09-{i + 1:02d}.xlsx"), "wb") as f:
+                f.write(data)
+        paths = find_reports(tmp_dir)
+
+        start = time.perf_counter()
+        for path in paths:
+            subprocess.run([sys.executable, script, path], check=True, capture_output=True)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics = analyze_snapshots(load_snapshots(paths))
+        after = time.perf_counter() - start
+
+    print(f"{'path':<16} {'snapshots':>9} {'seconds':>8}")
+    print(f"{'per-file loop':<16} {len(paths):>9} {before:>8.3f}")
+    print(f"{'grouped pass':<16} {len(metrics):>9} {after:>8.3f}")
+
+def bench_fines(rows, snapshots):
+    """
+    Prices a season of parking and volunteer snapshots three ways: the notebook's fines cells
+    run once per snapshot, one compute_fines pass over every snapshot, and one DuckDB query
+    over the data lake. Raises if the three disagree on the season's fines.
+    """
+    import duckdb
+
+    frames = []
+    for i in range(snapshots):
+        for report_type in fines.FINE_POLICIES:
+            df = make_synthetic_frame(rows, seed=i)
+            df["report_type"] = report_type
+            df["report_date"] = f"2025-09-{i + 1:02d}"
+            df["report_id"] = f"{report_type}-{i}"
+            df["processed_timestamp"] = f"2025-09-{i + 1:02d}T08:00:00"
+            frames.append(df)
+    season = pd.concat(frames, ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for df in frames:
+            data_lake.write_report(df, tmp_dir, df["report_type"].iat[0], df["report_date"].iat[0], df["report_id"].iat[0])
+
+        # Before: the notebook's cells (filter, copy, assign) re-run for every snapshot.
+        start = time.perf_counter()
+        before_fines = 0.0
+        for (report_type, _), df in season.groupby(["report_type", "report_date"]):
+            policy = fines.FINE_POLICIES[report_type]
+            required = df["Target Hours"] if policy["required_hours"] is None else policy["required_hours"]
+            df_not_completed = df[df["Total Hours"] < required].copy()
+            required = required[df_not_completed.index] if policy["required_hours"] is None else required
+            df_not_completed["Hours Remaining"] = required - df_not_completed["Total Hours"]
+            df_not_completed["Fine Amount"] = df_not_completed["Hours Remaining"] * policy["fine_per_hour"]
+            before_fines += df_not_completed["Fine Amount"].sum()
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pandas_fines = fines.compute_fines(season)["fine_amount"].sum()
+        pandas_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        con = duckdb.connect()
+        summary = con.execute(fines.season_sql(tmp_dir)).fetchdf()
+        con.close()
+        sql_seconds = time.perf_counter() - start
+
+    if not np.allclose([before_fines, pandas_fines], summary["fines"].sum()):
+        raise AssertionError(f"Season fines disagree: notebook {before_fines}, pandas {pandas_fines}, DuckDB {summary['fines'].sum()}.")
+    print(f"{'path':<20} {'snapshots':>9} {'seconds':>8} {'fines':>12}")
+    print(f"{'per-snapshot cells':<20} {len(frames):>9} {before:>8.3f} {before_fines:>12,.2f}")
+    print(f"{'compute_fines':<20} {len(frames):>9} {pandas_seconds:>8.3f} {pandas_fines:>12,.2f}")
+    print(f"{'DuckDB season query':<20} {len(summary):>9} {sql_seconds:>8.3f} {summary['fines'].sum():>12,.2f}")
+
+def bench_writer(rows, workbooks, memory=False):
+    """
+    Writes a fines report the notebook's way (pd.ExcelWriter, then column widths from a string
+    copy of every column) and with report_writer, then writes it split into `workbooks` files
+    one at a time and in parallel. With memory=True the single-workbook cases run a second
+    time under tracemalloc (slow).
+    """
+    df = fines.compute_fines(make_synthetic_frame(rows), "parking")
+    df = df.rename(columns={column: title for title, column in report_writer.FINES_REPORT_COLUMNS.items()})
+    df = df[list(report_writer.FINES_REPORT_COLUMNS)]
+    notebook_engine = "xlsxwriter" if report_writer.xlsxwriter_available() else "openpyxl"
+
+    def notebook(path):
+        with pd.ExcelWriter(path, engine=notebook_engine) as writer:
+            df.to_excel(writer, index=False, sheet_name="Fines Report")
+            worksheet = writer.sheets["Fines Report"]
+            for i, col in enumerate(df.columns):
+                max_len = max(df[col].astype(str).str.len().max(), len(col)) + 2
+                if notebook_engine == "xlsxwriter":
+                    worksheet.set_column(i, i, max_len)
+                else:
+                    worksheet.column_dimensions[chr(ord("A") + i)].width = max_len
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "fines.xlsx")
+        cases = [
+            (f"notebook ({notebook_engine})", notebook),
+            *[(f"report_writer ({engine})", lambda path, engine=engine: report_writer.write_workbook(path, {"Fines Report": df}, engine))
+              for engine in (["xlsxwriter"] if report_writer.xlsxwriter_available() else []) + ["openpyxl"]],
+        ]
+        print(f"{'writer':<28} {'rows':>8} {'seconds':>8}" + (f" {'py peak MB':>10}" if memory else ""))
+        for name, write in cases:
+            start = time.perf_counter()
+            write(path)
+            line = f"{name:<28} {rows:>8} {time.perf_counter() - start:>8.3f}"
+            if memory:
+                tracemalloc.start()
+                write(path)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                line += f" {peak / 2**20:>10.1f}"
+            print(line)
+
+        split = df.assign(group=np.arange(len(df)) % workbooks)
+        jobs = report_writer.split_jobs(split, "group", os.path.join(tmp_dir, "fines-{value}.xlsx"), "Fines Report")
+        for name, workers in [("split, one at a time", 1), (f"split, {workbooks} processes", workbooks)]:
+            start = time.perf_counter()
+            report_writer.write_workbooks(jobs, workers)
+            print(f"{name:<28} {len(jobs):>7}x {time.perf_counter() - start:>8.3f}")
+
+def bench_startup(runs, budget_ms=None):
+    """
+    Times the start of each `ov` command in a fresh interpreter (best and median of `runs`).
+    The interpreter itself (a bare `python -c pass`) is subtracted, so the overhead column is
+    what our imports cost. Returns False if a command's overhead exceeds budget_ms.
+    """
+    ov = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ov.py")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # A renamed report is classified by its file name alone, without opening it.
+        report_path = os.path.join(tmp_dir, "volunteer-hours-2025-09-01.xlsx")
+        with open(report_path, "wb") as f:
+            f.write(b"")
+        cases = [
+            ("python -c pass", [sys.executable, "-c", "pass"]),
+            ("ov --help", [sys.executable, ov, "--help"]),
+            ("ov process --help", [sys.executable, ov, "process", "--help"]),
+            ("ov reports --help", [sys.executable, ov, "reports", "--help"]),
+            ("ov identify --help", [sys.executable, ov, "identify", "--help"]),
+            ("ov identify <renamed>", [sys.executable, ov, "identify", report_path]),
+            ("ov query --help", [sys.executable, ov, "query", "--help"]),
+            ("ov load-db --help", [sys.executable, ov, "load-db", "--help"]),
+            ("ov analyze --help", [sys.executable, ov, "analyze", "--help"]),
+            ("ov fines --help", [sys.executable, ov, "fines", "--help"]),
+            ("ov excel --help", [sys.executable, ov, "excel", "--help"]),
+            ("ov lake --help", [sys.executable, ov, "lake", "--help"]),
+        ]
+
+        print(f"{'command':<24} {'best ms':>8} {'median ms':>9} {'overhead':>8}" + (f" {'budget':>7}" if budget_ms else ""))
+        within_budget = True
+        baseline = None
+        for name, command in cases:
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(command, check=True, capture_output=True)
+                times.append((time.perf_counter() - start) * 1000)
+            best = min(times)
+            if baseline is None:
+                baseline = best
+            overhead = best - baseline
+            line = f"{name:<24} {best:>8.1f} {statistics.median(times):>9.1f} {overhead:>8.1f}"
+            if budget_ms and command is not cases[0][1]:
+                ok = overhead <= budget_ms
+                within_budget = within_budget and ok
+                line += f" {'ok' if ok else 'OVER':>7}"
+            print(line)
+    return within_budget
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OnVolunteers report processing code.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    ingest = subparsers.add_parser("ingest", help="Parse count and wall time per report, before and after single-parse ingestion.")
+    ingest.add_argument("--rows", type=int, default=2000, help="Rows in the synthetic report (default: 2000).")
+    ingest.add_argument("--file", help="Benchmark this report file instead of a synthetic one.")
+    reader = subparsers.add_parser("reader", help="Wall time and memory of each Excel reader engine.")
+    reader.add_argument("--rows", type=int, default=100000, help="Rows in the synthetic report (default: 100000).")
+    reader.add_argument("--file", help="Benchmark this report file instead of a synthetic one.")
+    reader.add_argument("--memory", action="store_true", help="Also measure peak Python memory (much slower).")
+    season = subparsers.add_parser("season", help="A season of snapshots analyzed file by file versus in one grouped pass.")
+    season.add_argument("--rows", type=int, default=2000, help="Rows in each synthetic snapshot (default: 2000).")
+    season.add_argument("--snapshots", type=int, default=20, help="Number of snapshots (default: 20).")
+    season.add_argument("--file", help="Use copies of this report file instead of a synthetic one.")
+    fines_parser = subparsers.add_parser("fines", help="A season of fines: per-snapshot notebook cells versus one pandas pass and one DuckDB query.")
+    fines_parser.add_argument("--rows", type=int, default=2000, help="Families in each synthetic snapshot (default: 2000).")
+    fines_parser.add_argument("--snapshots", type=int, default=30, help="Snapshots per report type (default: 30).")
+    writer = subparsers.add_parser("writer", help="The notebook's fines export versus report_writer, single and split into parallel workbooks.")
+    writer.add_argument("--rows", type=int, default=100000, help="Rows in the fines report (default: 100000).")
+    writer.add_argument("--workbooks", type=int, default=8, help="Workbooks the report is split into (default: 8).")
+    writer.add_argument("--memory", action="store_true", help="Also measure peak Python memory (much slower).")
+    startup = subparsers.add_parser("startup", help="Start-up time of each ov command in a fresh interpreter.")
+    startup.add_argument("--runs", type=int, default=10, help="Runs per command (default: 10).")
+    startup.add_argument("--budget-ms", type=float, help="Exit with status 1 if any command starts more than this many milliseconds slower than a bare interpreter.")
+    args = parser.parse_args()
+
+    # The analysis logs its metrics; keep the benchmark output readable.
+    logging.disable(logging.INFO)
+
+    if args.benchmark == "startup":
+        sys.exit(0 if bench_startup(args.runs, args.budget_ms) else 1)
+    if args.benchmark == "fines":
+        bench_fines(args.rows, args.snapshots)
+        return
+    if args.benchmark == "writer":
+        bench_writer(args.rows, args.workbooks, memory=args.memory)
+        return
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            data = f.read()
+    else:
+        data = make_synthetic_report(args.rows)
+
+    if args.benchmark == "ingest":
+        bench_ingest(data)
+    elif args.benchmark == "reader":
+        bench_reader(data, memory=args.memory)
+    elif args.benchmark == "season":
+        bench_season(data, args.snapshots)
+
+if __name__ == "__main__":
+    main()
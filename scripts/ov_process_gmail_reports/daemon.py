@@ -0,0 +1,104 @@
+"""
+Long-running mode for ov_process_gmail_reports.py (--daemon).
+
+A cron run starts Python, imports pandas and the Google client, loads the credentials and
+builds the Gmail and Drive services, only to find no new email most of the time. The
+daemon does all of that once and then waits. It runs a sync cycle when it is woken up:
+
+- by a Gmail push notification: users.watch() publishes to a Cloud Pub/Sub topic whose
+  push subscription POSTs to the daemon's webhook;
+- by any other POST to the webhook, e.g. `curl -X POST http://127.0.0.1:8765/` once
+  ov_reports_list.py has requested reports, or a local stand-in for Pub/Sub;
+- or, as a fallback, when the poll interval has passed without a wakeup.
+
+A burst of wakeups is coalesced into one cycle. Background tasks (token refresh, watch
+renewal) run on their own threads.
+"""
+
+import base64
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+def pubsub_history_id(body):
+    """Returns the historyId of a Gmail Pub/Sub push message, or None for any other body."""
+    try:
+        envelope = json.loads(body)
+        data = json.loads(base64.b64decode(envelope["message"]["data"]))
+        return data.get("historyId")
+    except (ValueError, KeyError, TypeError):
+        return None
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Wakes the daemon on POST; GET answers a health check."""
+
+    def log_message(self, format, *args):
+        logging.debug(f"Webhook: {format % args}")
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.end_headers()
+        self.wfile.write(b"ok\n")
+
+    def do_POST(self):
+        token = parse_qs(urlparse(self.path).query).get("token", [None])[0]
+        if self.server.token and token != self.server.token:
+            self.send_response(403)
+            self.end_headers()
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        history_id = pubsub_history_id(body)
+        if history_id:
+            logging.info(f"Gmail push notification (historyId {history_id}).")
+        else:
+            logging.info("Wakeup request received.")
+        self.server.wakeup.set()
+        # Pub/Sub treats any 2xx as an acknowledgement.
+        self.send_response(204)
+        self.end_headers()
+
+def start_webhook(host, port, wakeup, token=None):
+    """Serves the wakeup webhook on a background thread. Returns the server (call shutdown() to stop it)."""
+    server = ThreadingHTTPServer((host, port), WebhookHandler)
+    server.wakeup = wakeup
+    server.token = token
+    threading.Thread(target=server.serve_forever, name="webhook", daemon=True).start()
+    logging.info(f"Listening for wakeups on http://{host}:{server.server_port}/")
+    return server
+
+def run_periodically(interval, task, stop, name):
+    """Runs task every interval seconds on a background thread until stop is set. Errors are logged, not raised."""
+    def loop():
+        while not stop.wait(interval):
+            try:
+                task()
+            except Exception as e:
+                logging.error(f"Background task '{name}' failed: {e}")
+    thread = threading.Thread(target=loop, name=name, daemon=True)
+    thread.start()
+    return thread
+
+def run_daemon(run_cycle, wakeup, stop, poll_seconds, debounce_seconds=2.0):
+    """
+    Runs run_cycle once, then again whenever wakeup is set or poll_seconds pass without one,
+    until stop is set. A failed cycle is logged and the daemon keeps going.
+    """
+    while not stop.is_set():
+        # Cleared before the cycle, so a notification that arrives during it triggers another one.
+        wakeup.clear()
+        try:
+            run_cycle()
+        except Exception:
+            logging.exception("Sync cycle failed.")
+        woken = wakeup.wait(poll_seconds)
+        if stop.is_set():
+            break
+        if woken:
+            # Let a burst of notifications (one per email) settle into a single cycle.
+            stop.wait(debounce_seconds)
+        else:
+            logging.info(f"No wakeup for {poll_seconds}s; polling.")
+    logging.info("Daemon stopped.")
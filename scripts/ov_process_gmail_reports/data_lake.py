@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Hive-partitioned Parquet data lake for processed OnVolunteers reports.
+
+Layout:
+  <data_lake>/report_type=<type>/report_date=<YYYY-MM-DD>/<file>.parquet
+
+report_type and report_date live only in the directory names, so DuckDB
+(hive_partitioning) and pandas/pyarrow can prune partitions without opening
+files. The per-report metadata columns, which hold the same value on every row,
+are stored dictionary-encoded.
+
+Each processed report adds one small file to its partition. `compact` merges
+the files of a partition into one, and also moves files from the old flat
+`<type>-<date>-<uuid>.parquet` layout into their partitions.
+
+Usage:
+  python data_lake.py compact [--data-lake-dir DIR] [--row-group-size N]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import re
+import uuid
+
+from db_setup import METADATA_COLUMNS
+
+DATA_LAKE_DIR = "reports/data_lake"
+PARTITION_COLUMNS = ["report_type", "report_date"]
+# Metadata columns that repeat one value per report; partition columns are not stored in the files.
+DICTIONARY_COLUMNS = [name for name in METADATA_COLUMNS if name not in PARTITION_COLUMNS]
+ROW_GROUP_SIZE = int(os.getenv("DATA_LAKE_ROW_GROUP_SIZE", "100000"))
+
+LEGACY_FILE_PATTERN = re.compile(r"^(?P<report_type>[a-z]+)-(?P<report_date>\d{4}-\d{2}-\d{2})-.+\.parquet$")
+
+def partition_dir(data_lake_dir, report_type, report_date):
+    """Returns the directory of a report_type/report_date partition."""
+    return os.path.join(data_lake_dir, f"report_type={report_type}", f"report_date={report_date}")
+
+def partition_glob(data_lake_dir, report_type="*", report_date="*"):
+    """Returns a glob matching the Parquet files of the given partitions."""
+    return os.path.join(partition_dir(data_lake_dir, report_type, report_date), "*.parquet")
+
+def _to_table(df):
+    """Converts a report DataFrame to an Arrow table with dictionary-typed metadata columns."""
+    import pyarrow as pa
+
+    df = df.drop(columns=[name for name in PARTITION_COLUMNS if name in df.columns])
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return _dictionary_encode(table)
+
+def _dictionary_encode(table):
+    import pyarrow as pa
+
+    for name in DICTIONARY_COLUMNS:
+        i = table.schema.get_field_index(name)
+        if i >= 0 and not pa.types.is_dictionary(table.schema.field(i).type):
+            table = table.set_column(i, name, table.column(name).cast(pa.string()).dictionary_encode())
+    return table
+
+def _write(table, path, row_group_size=None):
+    """Writes a table atomically (temp file + rename) so readers never see a partial file."""
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(
+        table,
+        tmp_path,
+        row_group_size=row_group_size or ROW_GROUP_SIZE,
+        use_dictionary=[name for name in DICTIONARY_COLUMNS if name in table.column_names],
+    )
+    os.replace(tmp_path, path)
+
+def write_report(df, data_lake_dir, report_type, report_date, report_id, row_group_size=None):
+    """Writes one report's rows into its partition. Returns the file path."""
+    path = os.path.join(partition_dir(data_lake_dir, report_type, report_date), f"{report_id}.parquet")
+    _write(_to_table(df), path, row_group_size)
+    return path
+
+def partition_values(path):
+    """Returns {"report_type": ..., "report_date": ...} parsed from a partitioned file's path."""
+    values = {}
+    for part in os.path.normpath(path).split(os.sep):
+        key, sep, value = part.partition("=")
+        if sep and key in PARTITION_COLUMNS:
+            values[key] = value
+    return values
+
+def read_file(path):
+    """Reads one data lake file into a DataFrame, restoring the partition columns from its path."""
+    import pyarrow.parquet as pq
+
+    df = pq.read_table(path, partitioning=None).to_pandas()
+    for name, value in partition_values(path).items():
+        df[name] = value
+    return df
+
+def migrate_legacy_files(data_lake_dir):
+    """Moves flat <type>-<date>-<uuid>.parquet files into their partitions. Returns the number moved."""
+    import pyarrow.parquet as pq
+
+    moved = 0
+    for path in glob.glob(os.path.join(data_lake_dir, "*.parquet")):
+        match = LEGACY_FILE_PATTERN.match(os.path.basename(path))
+        if not match:
+            logging.warning(f"Skipping unrecognized data lake file: {path}")
+            continue
+        target_dir = partition_dir(data_lake_dir, match["report_type"], match["report_date"])
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, os.path.basename(path))
+        # The old files carry the partition columns in every row; drop them and dictionary-encode the rest.
+        table = pq.read_table(path)
+        table = _dictionary_encode(table.drop_columns([name for name in PARTITION_COLUMNS if name in table.column_names]))
+        _write(table, target)
+        os.remove(path)
+        moved += 1
+    return moved
+
+def compact_partition(directory, row_group_size=None):
+    """Merges all Parquet files in one partition directory into a single file. Returns the files merged."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    paths = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+    if len(paths) < 2:
+        return 0
+    tables = [_dictionary_encode(pq.read_table(path, partitioning=None)) for path in paths]
+    merged = pa.concat_tables(tables, promote_options="permissive")
+    target = os.path.join(directory, f"part-{uuid.uuid4()}.parquet")
+    _write(merged, target, row_group_size)
+    for path in paths:
+        os.remove(path)
+    return len(paths)
+
+def compact(data_lake_dir=DATA_LAKE_DIR, row_group_size=None):
+    """Migrates legacy flat files and compacts every partition of the data lake."""
+    moved = migrate_legacy_files(data_lake_dir)
+    if moved:
+        logging.info(f"Moved {moved} legacy data lake files into partitions.")
+    merged_partitions = 0
+    for directory in sorted(glob.glob(os.path.dirname(partition_glob(data_lake_dir)))):
+        merged = compact_partition(directory, row_group_size)
+        if merged:
+            merged_partitions += 1
+            logging.info(f"Compacted {merged} files in {os.path.relpath(directory, data_lake_dir)}.")
+    logging.info(f"Compaction complete: {merged_partitions} partitions compacted.")
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Maintain the OnVolunteers Parquet data lake.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Merge the small files in each partition and migrate legacy flat files.")
+    compact_parser.add_argument("--data-lake-dir", default=DATA_LAKE_DIR, help=f"Data lake directory (default: {DATA_LAKE_DIR}).")
+    compact_parser.add_argument("--row-group-size", type=int, default=None, help=f"Rows per Parquet row group (default: DATA_LAKE_ROW_GROUP_SIZE or {ROW_GROUP_SIZE}).")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        compact(args.data_lake_dir, args.row_group_size)
+
+if __name__ == "__main__":
+    main()
@@ -1,78 +1,205 @@
 
-import duckdb
+import argparse
 
 DB_FILE = "onvolunteers.db"
 
-def setup_database():
-    """Creates the DuckDB database and tables if they don't exist."""
-    con = duckdb.connect(DB_FILE)
+# Metadata columns added to every report row by export_to_data_lake.
+METADATA_COLUMNS = {
+    "report_id": "VARCHAR",
+    "report_type": "VARCHAR",
+    "report_date": "VARCHAR",
+    "processed_timestamp": "VARCHAR",
+    "source_filename": "VARCHAR",
+    "email_id": "VARCHAR",
+    "email_sender": "VARCHAR",
+    "email_subject": "VARCHAR",
+    "gdrive_file_id": "VARCHAR",
+    "gdrive_folder_path": "VARCHAR",
+}
 
-    # Create volunteer_hours table
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS volunteer_hours (
-        report_id VARCHAR,
+# Columns of the OnVolunteers "User Volunteer Hours" report itself.
+REPORT_COLUMNS = {
+    "Last Name": "VARCHAR",
+    "First Name": "VARCHAR",
+    "Child Last Name": "VARCHAR",
+    "Child First Name": "VARCHAR",
+    "Children": "VARCHAR",
+    "Email": "VARCHAR",
+    "Telephone": "VARCHAR",
+    "Upcoming Hours": "DOUBLE",
+    "Pending Hours": "DOUBLE",
+    "Finished Hours": "DOUBLE",
+    "Adhoc Hours": "DOUBLE",
+    "Total Hours": "DOUBLE",
+    "FundRaising Hours": "DOUBLE",
+    "Target Hours": "DOUBLE",
+    "Adjustment Hours": "DOUBLE",
+    "Adjust Notes": "VARCHAR",
+}
+
+# Snapshot table for each report type.
+REPORT_TABLES = {
+    "volunteer": "volunteer_hours",
+    "parking": "parking_hours",
+}
+
+# Manifest of what load_db.py has already loaded, so re-running it never duplicates rows.
+MANIFEST_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS ingested_files (
+        file_path VARCHAR PRIMARY KEY,
+        report_type VARCHAR,
+        loaded_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingested_reports (
+        report_id VARCHAR PRIMARY KEY,
         report_type VARCHAR,
         report_date VARCHAR,
-        processed_timestamp VARCHAR,
-        source_filename VARCHAR,
-        email_id VARCHAR,
-        email_sender VARCHAR,
-        email_subject VARCHAR,
-        gdrive_file_id VARCHAR,
-        gdrive_folder_path VARCHAR,
-        "Last Name" VARCHAR,
-        "First Name" VARCHAR,
-        "Child Last Name" VARCHAR,
-        "Child First Name" VARCHAR,
-        "Children" VARCHAR,
-        "Email" VARCHAR,
-        "Telephone" VARCHAR,
-        "Upcoming Hours" DOUBLE,
-        "Pending Hours" DOUBLE,
-        "Finished Hours" DOUBLE,
-        "Adhoc Hours" DOUBLE,
-        "Total Hours" DOUBLE,
-        "FundRaising Hours" DOUBLE,
-        "Target Hours" DOUBLE,
-        "Adjustment Hours" DOUBLE,
-        "Adjust Notes" VARCHAR
+        file_path VARCHAR,
+        loaded_at TIMESTAMP
     )
-    """)
+    """,
+]
 
-    # Create parking_hours table
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS parking_hours (
+# Stable family key: a hash of the normalized email and parent name on a report row.
+FAMILY_ID_SQL = """md5(concat_ws('|', lower(trim(coalesce("Email", ''))), lower(trim(coalesce("Last Name", ''))), lower(trim(coalesce("First Name", '')))))"""
+
+# Contact columns of the family dimension, and the report columns they come from.
+FAMILY_COLUMNS = {
+    "email": "Email",
+    "last_name": "Last Name",
+    "first_name": "First Name",
+    "children": "Children",
+    "telephone": "Telephone",
+}
+
+# Hours columns of the family_hours_snapshot fact table, and the report columns they come from.
+SNAPSHOT_HOURS_COLUMNS = {
+    "upcoming_hours": "Upcoming Hours",
+    "pending_hours": "Pending Hours",
+    "finished_hours": "Finished Hours",
+    "adhoc_hours": "Adhoc Hours",
+    "total_hours": "Total Hours",
+    "fundraising_hours": "FundRaising Hours",
+    "target_hours": "Target Hours",
+    "adjustment_hours": "Adjustment Hours",
+}
+
+# Change since the family's previous snapshot of the same report type (NULL for its first one).
+SNAPSHOT_DELTA_COLUMNS = {
+    "total_hours_delta": "total_hours",
+    "finished_hours_delta": "finished_hours",
+    "fundraising_hours_delta": "fundraising_hours",
+}
+
+# Normalized schema: one row per family, and one row per family, report type and date.
+# load_db.py inserts snapshots in (family_id, report_date) order so each family's history is clustered.
+FAMILY_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS family (
+        family_id VARCHAR PRIMARY KEY,
+        email VARCHAR,
+        last_name VARCHAR,
+        first_name VARCHAR,
+        children VARCHAR,
+        telephone VARCHAR,
+        first_seen DATE,
+        last_seen DATE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS family_hours_snapshot (
+        family_id VARCHAR,
+        report_type VARCHAR,
+        report_date DATE,
         report_id VARCHAR,
+        upcoming_hours DOUBLE,
+        pending_hours DOUBLE,
+        finished_hours DOUBLE,
+        adhoc_hours DOUBLE,
+        total_hours DOUBLE,
+        fundraising_hours DOUBLE,
+        target_hours DOUBLE,
+        adjustment_hours DOUBLE,
+        total_hours_delta DOUBLE,
+        finished_hours_delta DOUBLE,
+        fundraising_hours_delta DOUBLE,
+        PRIMARY KEY (family_id, report_type, report_date)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS family_hours_snapshot_family_idx ON family_hours_snapshot (family_id)",
+]
+
+# Completion brackets of the analyze_report.py distribution: column -> (label, lower %, upper %).
+SUMMARY_BRACKETS = {
+    "bracket_0_25": ("0-25%", 0, 25),
+    "bracket_26_50": ("26-50%", 25, 50),
+    "bracket_51_75": ("51-75%", 50, 75),
+    "bracket_76_100": ("76-100%", 75, 100),
+    "bracket_over_100": (">100%", 100, None),
+}
+
+# One row of analyze_report.py metrics per loaded report, kept up to date by load_db.py.
+SUMMARY_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS report_summary (
+        report_id VARCHAR PRIMARY KEY,
         report_type VARCHAR,
-        report_date VARCHAR,
-        processed_timestamp VARCHAR,
-        source_filename VARCHAR,
-        email_id VARCHAR,
-        email_sender VARCHAR,
-        email_subject VARCHAR,
-        gdrive_file_id VARCHAR,
-        gdrive_folder_path VARCHAR,
-        "Last Name" VARCHAR,
-        "First Name" VARCHAR,
-        "Child Last Name" VARCHAR,
-        "Child First Name" VARCHAR,
-        "Children" VARCHAR,
-        "Email" VARCHAR,
-        "Telephone" VARCHAR,
-        "Upcoming Hours" DOUBLE,
-        "Pending Hours" DOUBLE,
-        "Finished Hours" DOUBLE,
-        "Adhoc Hours" DOUBLE,
-        "Total Hours" DOUBLE,
-        "FundRaising Hours" DOUBLE,
-        "Target Hours" DOUBLE,
-        "Adjustment Hours" DOUBLE,
-        "Adjust Notes" VARCHAR
+        report_date DATE,
+        families BIGINT,
+        completed_target_hours BIGINT,
+        with_finished_hours BIGINT,
+        with_fundraising_hours BIGINT,
+        average_total_hours DOUBLE,
+        bracket_0_25 BIGINT,
+        bracket_26_50 BIGINT,
+        bracket_51_75 BIGINT,
+        bracket_76_100 BIGINT,
+        bracket_over_100 BIGINT
+    )
+    """,
+]
+
+def create_table_sql(table_name):
+    """Returns the CREATE TABLE statement for a report snapshot table."""
+    columns = {**METADATA_COLUMNS, **REPORT_COLUMNS}
+    column_defs = ",\n".join(f'        "{name}" {sql_type}' for name, sql_type in columns.items())
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+{column_defs}
     )
-    """)
+    """
+
+def setup_database():
+    """Creates the DuckDB database and tables if they don't exist."""
+    import duckdb
+
+    con = duckdb.connect(DB_FILE)
+
+    # Create volunteer_hours and parking_hours tables
+    for table_name in REPORT_TABLES.values():
+        con.execute(create_table_sql(table_name))
+
+    # Create the load manifest tables
+    for sql in MANIFEST_TABLES_SQL:
+        con.execute(sql)
+
+    # Create the family dimension and family_hours_snapshot fact table
+    for sql in FAMILY_TABLES_SQL:
+        con.execute(sql)
+
+    # Create the report_summary table
+    for sql in SUMMARY_TABLES_SQL:
+        con.execute(sql)
 
     con.close()
     print("Database setup complete.")
 
-if __name__ == "__main__":
+def main():
+    argparse.ArgumentParser(description="Create the OnVolunteers DuckDB database and tables if they don't exist.").parse_args()
     setup_database()
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,273 @@
-
-import duckdb
+import argparse
 import os
 import glob
-import pandas as pd
+
+import data_lake
+from db_setup import (
+    FAMILY_COLUMNS, FAMILY_ID_SQL, FAMILY_TABLES_SQL, MANIFEST_TABLES_SQL, METADATA_COLUMNS, REPORT_COLUMNS,
+    REPORT_TABLES, SNAPSHOT_DELTA_COLUMNS, SNAPSHOT_HOURS_COLUMNS, SUMMARY_BRACKETS, SUMMARY_TABLES_SQL, create_table_sql,
+)
 
 DB_FILE = "onvolunteers.db"
 DATA_LAKE_DIR = "reports/data_lake"
 
-def get_latest_file(report_type):
-    """Finds the latest parquet file for a given report type."""
-    files = glob.glob(os.path.join(DATA_LAKE_DIR, f"{report_type}-*.parquet"))
-    if not files:
-        return None
-    return max(files, key=os.path.getctime)
+def _sql_list(paths):
+    """Renders file paths as a DuckDB list literal."""
+    return "[" + ", ".join("'" + path.replace("'", "''") + "'" for path in paths) + "]"
+
+def _table_exists(con, table_name):
+    return con.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [table_name]
+    ).fetchone()[0] > 0
+
+def _column_or_null(columns, name, sql_type):
+    """Returns a quoted column reference, or a typed NULL if the source doesn't have the column."""
+    return f'"{name}"' if name in columns else f"NULL::{sql_type}"
+
+def ensure_schema(con):
+    """
+    Creates the report, manifest, family and summary tables if they don't exist. When the
+    manifest is new, it is seeded with the report_ids already in the report tables, so rows
+    loaded by the old latest-file loader are not loaded a second time. When the family or
+    summary tables are new, they are filled from the report tables.
+    """
+    has_manifest = _table_exists(con, "ingested_reports")
+    has_family_tables = _table_exists(con, "family_hours_snapshot")
+    has_summary_table = _table_exists(con, "report_summary")
+    for table_name in REPORT_TABLES.values():
+        con.execute(create_table_sql(table_name))
+    for sql in MANIFEST_TABLES_SQL:
+        con.execute(sql)
+    for sql in FAMILY_TABLES_SQL:
+        con.execute(sql)
+    for sql in SUMMARY_TABLES_SQL:
+        con.execute(sql)
+    if not has_manifest:
+        for table_name in REPORT_TABLES.values():
+            con.execute(f"""
+            INSERT INTO ingested_reports
+            SELECT report_id, any_value(report_type), any_value(report_date), NULL, now()
+            FROM {table_name}
+            WHERE report_id IS NOT NULL
+            GROUP BY report_id
+            ON CONFLICT DO NOTHING
+            """)
+    if not has_family_tables:
+        migrate_family_hours(con)
+    if not has_summary_table:
+        for table_name in REPORT_TABLES.values():
+            reports = load_report_summaries(con, table_name)
+            if reports:
+                print(f"Summarized {reports} reports from {table_name} into report_summary.")
+
+def migrate_family_hours(con):
+    """Fills the family and family_hours_snapshot tables from the wide report tables."""
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for report_type, table_name in REPORT_TABLES.items():
+            families = load_family_snapshots(con, report_type, table_name)
+            if families:
+                print(f"Migrated {families} {report_type} family snapshots from {table_name} to family_hours_snapshot.")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+def load_family_snapshots(con, report_type, source):
+    """
+    Upserts the families and family_hours_snapshot rows of one report type from a table of
+    report rows (a report table, or the staged new rows), then recomputes the deltas of the
+    families it touched from the earliest new date onwards. Returns the snapshot rows written.
+    """
+    columns = {row[0] for row in con.execute(f"DESCRIBE {source}").fetchall()}
+    family = ", ".join(f"{_column_or_null(columns, name, 'VARCHAR')} AS {column}" for column, name in FAMILY_COLUMNS.items())
+    hours = ", ".join(f"{_column_or_null(columns, name, 'DOUBLE')} AS {column}" for column, name in SNAPSHOT_HOURS_COLUMNS.items())
+    # One row per family and date; if a date has several reports, the last one processed wins.
+    con.execute(f"""
+    CREATE OR REPLACE TEMP TABLE family_rows AS
+    SELECT {FAMILY_ID_SQL} AS family_id, TRY_CAST(report_date AS DATE) AS report_date, report_id, {family}, {hours}
+    FROM {source}
+    WHERE TRY_CAST(report_date AS DATE) IS NOT NULL
+    QUALIFY row_number() OVER (
+        PARTITION BY family_id, TRY_CAST(report_date AS DATE)
+        ORDER BY {_column_or_null(columns, "processed_timestamp", "VARCHAR")} DESC NULLS LAST, report_id DESC
+    ) = 1
+    """)
+    rows = con.execute("SELECT count(*) FROM family_rows").fetchone()[0]
+    if not rows:
+        con.execute("DROP TABLE family_rows")
+        return 0
+
+    # Contact details come from the family's most recent snapshot.
+    family_columns = ", ".join(FAMILY_COLUMNS)
+    family_updates = ", ".join(
+        f"{column} = CASE WHEN excluded.last_seen >= last_seen THEN excluded.{column} ELSE {column} END" for column in FAMILY_COLUMNS
+    )
+    con.execute(f"""
+    INSERT INTO family
+    SELECT family_id, {family_columns},
+        min(report_date) OVER (PARTITION BY family_id) AS first_seen,
+        max(report_date) OVER (PARTITION BY family_id) AS last_seen
+    FROM family_rows
+    QUALIFY row_number() OVER (PARTITION BY family_id ORDER BY report_date DESC) = 1
+    ON CONFLICT (family_id) DO UPDATE SET
+        {family_updates},
+        first_seen = least(first_seen, excluded.first_seen),
+        last_seen = greatest(last_seen, excluded.last_seen)
+    """)
+
+    hours_columns = ", ".join(SNAPSHOT_HOURS_COLUMNS)
+    hours_updates = ", ".join(f"{column} = excluded.{column}" for column in ["report_id", *SNAPSHOT_HOURS_COLUMNS])
+    con.execute(f"""
+    INSERT INTO family_hours_snapshot (family_id, report_type, report_date, report_id, {hours_columns})
+    SELECT family_id, ?, report_date, report_id, {hours_columns}
+    FROM family_rows
+    ORDER BY family_id, report_date
+    ON CONFLICT (family_id, report_type, report_date) DO UPDATE SET {hours_updates}
+    """, [report_type])
+
+    deltas = ", ".join(f"{column} - lag({column}) OVER w AS {delta}" for delta, column in SNAPSHOT_DELTA_COLUMNS.items())
+    delta_updates = ", ".join(f"{delta} = d.{delta}" for delta in SNAPSHOT_DELTA_COLUMNS)
+    con.execute(f"""
+    UPDATE family_hours_snapshot SET {delta_updates}
+    FROM (
+        SELECT family_id, report_date, {deltas}
+        FROM family_hours_snapshot
+        WHERE report_type = $report_type AND family_id IN (SELECT family_id FROM family_rows)
+        WINDOW w AS (PARTITION BY family_id ORDER BY report_date)
+    ) AS d
+    WHERE family_hours_snapshot.report_type = $report_type
+        AND family_hours_snapshot.family_id = d.family_id
+        AND family_hours_snapshot.report_date = d.report_date
+        AND d.report_date >= (SELECT min(report_date) FROM family_rows)
+    """, {"report_type": report_type})
+    con.execute("DROP TABLE family_rows")
+    return rows
+
+def get_new_files(con, report_type):
+    """Returns the data lake files of a report type that have not been loaded yet."""
+    files = sorted(os.path.abspath(path) for path in glob.glob(data_lake.partition_glob(DATA_LAKE_DIR, report_type)))
+    loaded = {row[0] for row in con.execute("SELECT file_path FROM ingested_files WHERE report_type = ?", [report_type]).fetchall()}
+    return [path for path in files if path not in loaded]
+
+def load_files(con, report_type, files):
+    """
+    Loads Parquet files straight into the report type's table in one transaction, skipping
+    report_ids that are already loaded (e.g. reports merged into a new file by compaction).
+    Returns the number of rows inserted.
+    """
+    table_name = REPORT_TABLES[report_type]
+    con.execute("BEGIN TRANSACTION")
+    try:
+        # Keep each report's rows from a single file, in case the same report is in two new files.
+        con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE staged AS
+        SELECT *
+        FROM read_parquet({_sql_list(files)}, hive_partitioning = true, hive_types_autocast = false, union_by_name = true, filename = true)
+        WHERE report_id NOT IN (SELECT report_id FROM ingested_reports)
+        QUALIFY filename = min(filename) OVER (PARTITION BY report_id)
+        """)
+        staged_columns = {row[0] for row in con.execute("DESCRIBE staged").fetchall()}
+        columns = ", ".join(f'"{name}"' for name in {**METADATA_COLUMNS, **REPORT_COLUMNS} if name in staged_columns)
+        rows = con.execute(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM staged").fetchone()[0]
+        con.execute("""
+        INSERT INTO ingested_reports
+        SELECT report_id, any_value(report_type), any_value(report_date), any_value(filename), now()
+        FROM staged
+        GROUP BY report_id
+        """)
+        load_family_snapshots(con, report_type, "staged")
+        load_report_summaries(con, "staged")
+        con.executemany("INSERT INTO ingested_files VALUES (?, ?, now())", [[path, report_type] for path in files])
+        con.execute("DROP TABLE staged")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return rows
+
+def load_report_summaries(con, source):
+    """
+    Computes the analyze_report.py metrics of each report in a table of report rows and
+    upserts them into report_summary. Returns the number of reports summarized.
+    """
+    columns = {row[0] for row in con.execute(f"DESCRIBE {source}").fetchall()}
+    total = _column_or_null(columns, "Total Hours", "DOUBLE")
+    target = _column_or_null(columns, "Target Hours", "DOUBLE")
+    finished = _column_or_null(columns, "Finished Hours", "DOUBLE")
+    fundraising = _column_or_null(columns, "FundRaising Hours", "DOUBLE")
+    # Same rules as analyze_report: a missing or zero target counts as 0% complete, and
+    # brackets include their lower bound.
+    brackets = ", ".join(
+        f"count(*) FILTER (WHERE percent_complete >= {lower}" + (f" AND percent_complete < {upper}" if upper is not None else "") + f") AS {column}"
+        for column, (_, lower, upper) in SUMMARY_BRACKETS.items()
+    )
+    con.execute(f"""
+    INSERT OR REPLACE INTO report_summary
+    SELECT
+        report_id,
+        any_value(report_type),
+        TRY_CAST(any_value(report_date) AS DATE),
+        count(*),
+        count(*) FILTER (WHERE total_hours >= target_hours),
+        count(*) FILTER (WHERE finished_hours > 0),
+        count(*) FILTER (WHERE fundraising_hours > 0),
+        avg(total_hours),
+        {brackets}
+    FROM (
+        SELECT
+            report_id, report_type, report_date,
+            {total} AS total_hours, {target} AS target_hours, {finished} AS finished_hours, {fundraising} AS fundraising_hours,
+            CASE WHEN {total} IS NULL OR {target} IS NULL OR {target} = 0 THEN 0 ELSE {total} / {target} * 100 END AS percent_complete
+        FROM {source}
+        WHERE report_id IS NOT NULL
+    )
+    GROUP BY report_id
+    """)
+    return con.execute(f"SELECT count(DISTINCT report_id) FROM {source} WHERE report_id IS NOT NULL").fetchone()[0]
+
+def clear_data(con):
+    """Empties the report, manifest, family and summary tables, for a full rebuild."""
+    con.execute("BEGIN TRANSACTION")
+    for table_name in list(REPORT_TABLES.values()) + ["ingested_reports", "ingested_files", "family_hours_snapshot", "family", "report_summary"]:
+        con.execute(f"DELETE FROM {table_name}")
+    con.execute("COMMIT")
+
+def load_data(rebuild=False, threads=None):
+    """Loads every data lake file not loaded before into the DuckDB database."""
+    import duckdb
 
-def load_data():
-    """Loads data from the latest parquet files into the DuckDB database."""
     con = duckdb.connect(DB_FILE)
+    # DuckDB scans the Parquet files in parallel; a full rebuild uses every core.
+    con.execute(f"SET threads = {threads or os.cpu_count() or 1}")
+    ensure_schema(con)
+    if rebuild:
+        print("Rebuilding: clearing report tables and load manifest...")
+        clear_data(con)
+
+    # Files from the old flat layout are outside the partitions get_new_files looks in.
+    moved = data_lake.migrate_legacy_files(DATA_LAKE_DIR)
+    if moved:
+        print(f"Moved {moved} legacy data lake files into partitions.")
 
-    # Load volunteer hours
-    latest_volunteer_file = get_latest_file("volunteer")
-    if latest_volunteer_file:
-        print(f"Loading data from {latest_volunteer_file} into volunteer_hours table...")
-        df = pd.read_parquet(latest_volunteer_file)
-        columns = '", "'.join(df.columns)
-        con.execute(f'INSERT INTO volunteer_hours ("{columns}") SELECT * FROM df')
-        print("Volunteer hours data loaded.")
-    else:
-        print("No volunteer hours parquet files found.")
-
-    # Load parking hours
-    latest_parking_file = get_latest_file("parking")
-    if latest_parking_file:
-        print(f"Loading data from {latest_parking_file} into parking_hours table...")
-        df = pd.read_parquet(latest_parking_file)
-        columns = '", "'.join(df.columns)
-        con.execute(f'INSERT INTO parking_hours ("{columns}") SELECT * FROM df')
-        print("Parking hours data loaded.")
-    else:
-        print("No parking hours parquet files found.")
+    for report_type, table_name in REPORT_TABLES.items():
+        files = get_new_files(con, report_type)
+        if not files:
+            print(f"No new {report_type} hours parquet files found.")
+            continue
+        print(f"Loading {len(files)} new {report_type} hours parquet files into {table_name} table...")
+        rows = load_files(con, report_type, files)
+        print(f"Loaded {rows} rows into {table_name}.")
 
     con.close()
 
+def main():
+    parser = argparse.ArgumentParser(description='Load new OnVolunteers data lake files into the database.')
+    parser.add_argument('--rebuild', action='store_true', help='Clear the report tables and reload every file.')
+    parser.add_argument('--threads', type=int, default=None, help='DuckDB threads (default: one per CPU).')
+    args = parser.parse_args()
+
+    load_data(rebuild=args.rebuild, threads=args.threads)
+
 if __name__ == "__main__":
-    load_data()
+    main()
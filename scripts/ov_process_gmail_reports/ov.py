@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Single entry point for the OnVolunteers tools.
+
+Usage:
+  python ov.py <command> [options]
+  python ov.py <command> --help
+
+Each command runs the main() of one script with the remaining arguments. Only that
+script is imported, and the scripts import pandas, DuckDB, pyarrow, Playwright and the
+Google client only on the code paths that use them, so `--help` and light commands start
+in milliseconds.
+"""
+
+import argparse
+import importlib
+import inspect
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORTS_LIST_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "ov_reports_list")
+
+# command -> (module, directory, summary)
+COMMANDS = {
+    "process": ("ov_process_gmail_reports", SCRIPT_DIR, "Process report emails from Gmail into Google Drive and the data lake (also --daemon)."),
+    "reports": ("ov_reports_list", REPORTS_LIST_DIR, "Generate reports in the OnVolunteers portal."),
+    "identify": ("ov_identify_report", SCRIPT_DIR, "Identify the type of report files."),
+    "analyze": ("analyze_report", SCRIPT_DIR, "Analyze a report, a season of snapshots or the database summaries."),
+    "setup-db": ("db_setup", SCRIPT_DIR, "Create the DuckDB database and tables."),
+    "load-db": ("load_db", SCRIPT_DIR, "Load new data lake files into the database."),
+    "query": ("query_db", SCRIPT_DIR, "Query the database: SQL, canned queries or an interactive session."),
+    "lake": ("data_lake", SCRIPT_DIR, "Maintain the Parquet data lake."),
+    "fines": ("fines", SCRIPT_DIR, "Hours owing and fines of every family, per snapshot or for the season."),
+    "excel": ("report_writer", SCRIPT_DIR, "Write the fines and season summary workbooks."),
+    "benchmark": ("benchmark", SCRIPT_DIR, "Run the benchmarks."),
+}
+
+def main(argv=None):
+    commands = "\n".join(f"  {name:<10} {summary}" for name, (_, _, summary) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog="ov",
+        description="OnVolunteers report tools.",
+        epilog=f"commands:\n{commands}\n\nRun 'ov <command> --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=COMMANDS, metavar="command", help="One of the commands below.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    module_name, directory, _ = COMMANDS[args.command]
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    # The script parses sys.argv itself; its usage line reads "ov <command>".
+    sys.argv = [f"ov {args.command}", *args.args]
+    result = importlib.import_module(module_name).main()
+    if inspect.iscoroutine(result):
+        # asyncio alone takes tens of milliseconds to import; only the async scripts need it.
+        import asyncio
+        result = asyncio.run(result)
+    return result
+
+if __name__ == "__main__":
+    sys.exit(main())
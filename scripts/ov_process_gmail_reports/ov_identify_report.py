@@ -4,44 +4,68 @@ Identifies the type of an OnVolunteers report file.
 
 Usage:
   python ov_identify_report.py <path_to_report.xlsx>
+  python ov_identify_report.py --batch <directory> [--workers N] [--sample-rows N]
 """
 
+import argparse
+import glob
 import sys
 import os
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
-# Threshold to differentiate reports. If sum of "Total Hours" is > this value, it's a volunteer report.
-HOURS_THRESHOLD = 4
+from report_ingest import classify_file
 
-def get_report_type(file_path):
-    """Determines the report type by summing the 'Total Hours' column."""
+def get_report_type(file_path, sample_rows=None, use_name=True):
+    """Determines the report type from the filename, or else from the 'Total Hours' column alone."""
     try:
-        df = pd.read_excel(file_path, header=0)
-        if "Total Hours" in df.columns:
-            average_total_hours = df["Total Hours"].mean()
-            if average_total_hours >= HOURS_THRESHOLD:
-                return "volunteer"
-            else:
-                return "parking"
-        else:
+        report_type, _ = classify_file(file_path, sample_rows=sample_rows, use_name=use_name)
+        if report_type == "unknown":
             print(f"Warning: 'Total Hours' column not found in {file_path}. Could not determine report type.", file=sys.stderr)
-            return "unknown"
+        return report_type
     except Exception as e:
         print(f"An error occurred while reading the excel file: {e}", file=sys.stderr)
         return "unknown"
 
+def _identify(args):
+    """Process-pool worker: returns (file_path, report_type)."""
+    file_path, sample_rows, use_name = args
+    return file_path, get_report_type(file_path, sample_rows, use_name)
+
+def identify_batch(directory, workers=None, sample_rows=None, use_name=True):
+    """Classifies every .xlsx file under directory across a pool of processes. Yields (path, report_type) in path order."""
+    paths = sorted(glob.glob(os.path.join(directory, "**", "*.xlsx"), recursive=True))
+    jobs = [(path, sample_rows, use_name) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_identify, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1))))
+
 def main():
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Identify the type of OnVolunteers report files.")
+    parser.add_argument("report_path", nargs="?", help="The report file to identify.")
+    parser.add_argument("--batch", metavar="DIR", help="Classify every .xlsx file under DIR in parallel.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for --batch (default: one per CPU).")
+    parser.add_argument("--sample-rows", type=int, default=None, help="Only average the first N rows of 'Total Hours'.")
+    parser.add_argument("--ignore-names", action="store_true", help="Always read 'Total Hours', even if the filename gives the type away.")
+    args = parser.parse_args()
+
+    if args.batch:
+        if not os.path.isdir(args.batch):
+            print(f"Error: Directory not found at '{args.batch}'")
+            sys.exit(1)
+        for file_path, report_type in identify_batch(args.batch, args.workers, args.sample_rows, not args.ignore_names):
+            print(f"{report_type}\t{file_path}")
+        return
+
+    if not args.report_path:
         print("Usage: python ov_identify_report.py <path_to_report.xlsx>")
         sys.exit(1)
 
-    report_path = sys.argv[1]
+    report_path = args.report_path
 
     if not os.path.exists(report_path):
         print(f"Error: File not found at '{report_path}'")
         sys.exit(1)
 
-    report_type = get_report_type(report_path)
+    report_type = get_report_type(report_path, args.sample_rows, not args.ignore_names)
 
     if report_type == "unknown":
         print(f"Could not determine the report type for '{report_path}'.")
@@ -49,4 +73,4 @@ def main():
         print(f"The report '{report_path}' is a '{report_type}-hours' report.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
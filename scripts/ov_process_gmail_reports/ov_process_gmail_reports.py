@@ -1,19 +1,25 @@
 
 import os
 import base64
+import json
 import logging
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+# The Google client, pandas and pyarrow are imported where they are used, so --help and
+# importing this module (e.g. from ov_reports_list.py or the ov CLI) stay fast.
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
-from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
-import pandas as pd
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import argparse
+import hashlib
+import signal
+import tempfile
+import threading
 import uuid
+from collections import Counter
+
+import data_lake
+from pipeline import run_pipeline
+from report_ingest import HOURS_THRESHOLD, Report
 
 # ov_process_gmail_reports.py
 # This script processes GMail emails containing OnVolunteers reports
@@ -28,36 +34,87 @@ load_dotenv(dotenv_path=os.path.join(SCRIPT_DIR, 'gmail_gdrive.env'), override=T
 GDRIVE_CREDENTIALS_FILE = os.path.join(SCRIPT_DIR, os.getenv("GDRIVE_CREDENTIALS_FILE", "credentials.json"))
 LOG_FILE = os.getenv("LOG_FILE", os.path.join(SCRIPT_DIR, "ov_process_gmail_reports.log"))
 REPORTS_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, os.getenv("REPORTS_DIR", "reports")))
+# Each attachment is downloaded into a directory of its own here, so two attachments with the same
+# name never share a file while workers classify them; only the renamed report is shared.
+INCOMING_DIR = os.path.join(REPORTS_DIR, ".incoming")
 
-# --- Create a .tmp directory for the token file ---
+# --- The .tmp directory holds the token file, checkpoints and caches; created on first write ---
 TMP_DIR = os.path.join(SCRIPT_DIR, ".tmp")
-os.makedirs(TMP_DIR, exist_ok=True)
 TOKEN_FILE = os.path.join(TMP_DIR, "token.json")
+HISTORY_CHECKPOINT_FILE = os.path.join(TMP_DIR, "gmail_history.json")
+# Google Drive folder IDs by "<parent ID>/<name>", so folders are looked up once across runs.
+GDRIVE_FOLDER_CACHE_FILE = os.path.join(TMP_DIR, "gdrive_folders.json")
+# Google Drive file IDs by "<folder ID>/<file name>/<MD5 of the content>", so an unchanged file is not uploaded twice.
+GDRIVE_UPLOAD_INDEX_FILE = os.path.join(TMP_DIR, "gdrive_uploads.json")
+
+# Reports already processed, by report_id and by report date + SHA-256 of their .xlsx bytes, so a report
+# that arrives twice is renamed, uploaded and exported only once.
+REPORT_INDEX_FILE = os.path.join(REPORTS_DIR, "report_index.json")
+# report_id is a UUID derived from the report type, date and parsed rows, so the same report always gets the same ID.
+REPORT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://portal.onvolunteers.com/Report.aspx")
+
+# Attachments are base64-decoded this many characters (a multiple of 4) at a time, straight to disk.
+ATTACHMENT_DECODE_CHUNK = 4 * 1024 * 1024
+# Attachments up to this many bytes are also kept in memory for the parser; larger ones (e.g. the
+# "All Activities" export) are parsed from the file, so memory use stays flat.
+ATTACHMENT_MEMORY_LIMIT = int(os.getenv("ATTACHMENT_MEMORY_LIMIT", str(16 * 1024 * 1024)))
+
+# Resumable uploads: bytes per chunk (a multiple of 256 KiB) and retries of a chunk on 429/5xx.
+GDRIVE_CHUNK_SIZE = int(os.getenv("GDRIVE_CHUNK_SIZE", str(5 * 1024 * 1024)))
+GDRIVE_UPLOAD_RETRIES = int(os.getenv("GDRIVE_UPLOAD_RETRIES", "5"))
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify", "https://www.googleapis.com/auth/drive"]
 GDRIVE_TARGET_FOLDER = "/My Drive/PTA 2025-2026 SHARED FOLDER/SubCommittees/OnVolunteers/Reports"
 
-# Threshold to differentiate reports. If sum of "Total Hours" is > this value, it's a volunteer report.
-HOURS_THRESHOLD = 4
+# --daemon: seconds between polls when no wakeup arrives, and the local wakeup webhook (port 0 disables it).
+DAEMON_POLL_SECONDS = int(os.getenv("DAEMON_POLL_SECONDS", "900"))
+DAEMON_WEBHOOK_HOST = os.getenv("DAEMON_WEBHOOK_HOST", "127.0.0.1")
+DAEMON_WEBHOOK_PORT = int(os.getenv("DAEMON_WEBHOOK_PORT", "8765"))
+# Optional shared secret; the webhook then only accepts POST /?token=<secret>.
+DAEMON_WEBHOOK_TOKEN = os.getenv("DAEMON_WEBHOOK_TOKEN")
+# Cloud Pub/Sub topic for Gmail push notifications (projects/<project>/topics/<topic>); unset to rely on the webhook and polling.
+GMAIL_PUBSUB_TOPIC = os.getenv("GMAIL_PUBSUB_TOPIC")
+# Gmail watches expire after 7 days; Google recommends renewing them daily.
+GMAIL_WATCH_RENEW_SECONDS = 24 * 3600
+# How often the daemon checks the OAuth token, and how close to expiry it refreshes it.
+TOKEN_CHECK_SECONDS = 300
+TOKEN_REFRESH_MARGIN = timedelta(minutes=10)
+
+# Gmail accepts up to 100 calls per batch request but recommends no more than 50.
+GMAIL_BATCH_SIZE = 50
+# users.messages.batchModify accepts up to 1000 message IDs per call.
+GMAIL_BATCH_MODIFY_SIZE = 1000
+# Attachments are prefetched for a few emails at a time, at most this many bytes (as Gmail
+# reports their size) per batch, so a chunk of large reports is never all in memory at once.
+GMAIL_PREFETCH_BYTES = int(os.getenv("GMAIL_PREFETCH_BYTES", str(16 * 1024 * 1024)))
+
+# Google API HTTP requests made this run, keyed by API method. A batch counts once.
+API_CALLS = Counter()
+_api_calls_lock = threading.Lock()
 
 # --- Logging Setup ---
-# --- Logging Setup ---
-# Get the root logger
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
+def setup_logging():
+    """Logs to LOG_FILE and the console. Called by main(), so importing this module (e.g. from ov_reports_list.py) leaves logging alone."""
+    # Get the root logger
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
 
-# Create a file handler
-file_handler = logging.FileHandler(LOG_FILE)
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-root_logger.addHandler(file_handler)
+    # Create a file handler
+    file_handler = logging.FileHandler(LOG_FILE)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root_logger.addHandler(file_handler)
 
-# Create a stream handler (for console output)
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-root_logger.addHandler(stream_handler)
+    # Create a stream handler (for console output)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root_logger.addHandler(stream_handler)
 
 def get_credentials():
     """Gets user credentials from the specified credentials file."""
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
     if os.path.exists(TOKEN_FILE):
         creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
@@ -72,54 +129,311 @@ def get_credentials():
         else:
             flow = InstalledAppFlow.from_client_secrets_file(GDRIVE_CREDENTIALS_FILE, SCOPES)
             creds = flow.run_local_server(port=0)
+        os.makedirs(TMP_DIR, exist_ok=True)
         with open(TOKEN_FILE, "w") as token:
             token.write(creds.to_json())
     return creds
 
-def search_emails(service, sender, subject):
-    """Searches for emails from a specific sender with a specific subject, unread and from the past day."""
+def refresh_credentials(creds):
+    """Refreshes the OAuth token if it expires within TOKEN_REFRESH_MARGIN, and saves it."""
+    from google.auth.transport.requests import Request
+
+    # google-auth keeps expiry as a naive UTC datetime.
+    if creds.expiry and creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None) > TOKEN_REFRESH_MARGIN:
+        return
+    creds.refresh(Request())
+    with open(TOKEN_FILE, "w") as token:
+        token.write(creds.to_json())
+    logging.info(f"Refreshed the OAuth token; it now expires at {creds.expiry} UTC.")
+
+def execute(request, api_method):
+    """Executes a Google API request or batch request, counting it in API_CALLS."""
+    with _api_calls_lock:
+        API_CALLS[api_method] += 1
+    return request.execute()
+
+def _chunks(items, size):
+    """Yields successive lists of at most size items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def search_emails(service, sender, subject, after=None):
+    """
+    Searches for unread emails from a specific sender with a specific subject, following
+    every result page. Only emails after the given date (default: yesterday) are returned.
+    """
     try:
-        yesterday = datetime.now() - timedelta(days=1)
-        yesterday_date = yesterday.strftime("%Y/%m/%d")
-        query = f"from:{sender} subject:{subject} is:unread after:{yesterday_date}"
-        result = service.users().messages().list(userId="me", q=query).execute()
-        messages = result.get("messages", [])
-        return messages
+        after = after or datetime.now() - timedelta(days=1)
+        query = f"from:{sender} subject:{subject} is:unread after:{after.strftime('%Y/%m/%d')}"
+        messages = []
+        page_token = None
+        while True:
+            result = execute(service.users().messages().list(userId="me", q=query, pageToken=page_token), "gmail.messages.list")
+            messages.extend(result.get("messages", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return messages
     except HttpError as error:
         logging.error(f"An error occurred while searching for emails: {error}")
         return []
 
+def load_sync_checkpoint():
+    """Returns the saved incremental sync checkpoint ({"historyId", "synced_at"}), or None."""
+    if not os.path.exists(HISTORY_CHECKPOINT_FILE):
+        return None
+    try:
+        with open(HISTORY_CHECKPOINT_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable sync checkpoint {HISTORY_CHECKPOINT_FILE}: {e}")
+        return None
+
+def save_sync_checkpoint(history_id):
+    """Saves the Gmail historyId that the next incremental sync should start from."""
+    os.makedirs(TMP_DIR, exist_ok=True)
+    tmp_path = f"{HISTORY_CHECKPOINT_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"historyId": str(history_id), "synced_at": datetime.now().isoformat()}, f)
+    os.replace(tmp_path, HISTORY_CHECKPOINT_FILE)
+    logging.info(f"Saved Gmail sync checkpoint at historyId {history_id}.")
+
+def list_history_message_ids(service, start_history_id):
+    """
+    Returns the IDs of messages added since start_history_id, following every result page.
+    Raises HttpError (status 404) if the history ID is too old for Gmail to replay.
+    """
+    msg_ids = {}
+    page_token = None
+    while True:
+        result = execute(
+            service.users().history().list(userId="me", startHistoryId=start_history_id, historyTypes=["messageAdded"], pageToken=page_token),
+            "gmail.history.list",
+        )
+        for record in result.get("history", []):
+            for added in record.get("messagesAdded", []):
+                msg_ids[added["message"]["id"]] = None
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return list(msg_ids)
+
+def filter_messages(service, msg_ids, sender, subject, batch_size=GMAIL_BATCH_SIZE):
+    """
+    Keeps the unread messages whose From and Subject headers match, fetching only their headers.
+    Returns (matches, unfetched), unfetched being the IDs whose headers could not be fetched.
+    """
+    matches = []
+    unfetched = []
+    for chunk in _chunks(list(msg_ids), batch_size):
+        fetched = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                logging.error(f"An error occurred while fetching message {request_id}: {exception}")
+            else:
+                fetched[request_id] = response
+
+        batch = service.new_batch_http_request(callback=callback)
+        for msg_id in chunk:
+            batch.add(
+                service.users().messages().get(userId="me", id=msg_id, format="metadata", metadataHeaders=["From", "Subject"]),
+                request_id=msg_id,
+            )
+        try:
+            execute(batch, "gmail.batch")
+        except HttpError as error:
+            logging.error(f"An error occurred while fetching a batch of message headers: {error}")
+        for msg_id in chunk:
+            message = fetched.get(msg_id)
+            if not message:
+                unfetched.append(msg_id)
+                continue
+            if "UNREAD" not in message.get("labelIds", []):
+                continue
+            headers = {header["name"]: header["value"] for header in message["payload"].get("headers", [])}
+            if sender in headers.get("From", "") and subject in headers.get("Subject", ""):
+                matches.append({"id": msg_id})
+    return matches, unfetched
+
+def sync_emails(service, sender, subject):
+    """
+    Finds new report emails since the last saved checkpoint.
+
+    Uses users.history.list from the checkpointed historyId, so a run only looks at
+    messages that arrived since the last one. Without a checkpoint, or when Gmail reports
+    it as too old, falls back to a fully paginated search back to the last sync date.
+    Returns (messages, history_id); save history_id with save_sync_checkpoint once the
+    messages have been processed. history_id is None when the checkpoint must stay put.
+    """
+    checkpoint = load_sync_checkpoint()
+    try:
+        # Read the current historyId first so nothing arriving during this run is skipped next time.
+        history_id = execute(service.users().getProfile(userId="me"), "gmail.users.getProfile")["historyId"]
+    except HttpError as error:
+        logging.error(f"An error occurred while reading the Gmail profile: {error}")
+        return [], None
+
+    if checkpoint:
+        try:
+            msg_ids = list_history_message_ids(service, checkpoint["historyId"])
+            logging.info(f"Incremental sync: {len(msg_ids)} new emails since historyId {checkpoint['historyId']}.")
+            messages, unfetched = filter_messages(service, msg_ids, sender, subject)
+            if unfetched:
+                # Saving the checkpoint would skip these emails for good; the next sync replays them.
+                logging.warning(f"Could not fetch {len(unfetched)} new emails; keeping the previous sync checkpoint.")
+                return messages, None
+            return messages, history_id
+        except HttpError as error:
+            if error.resp.status != 404:
+                logging.error(f"An error occurred while listing Gmail history: {error}")
+                return [], None
+            logging.warning(f"Sync checkpoint historyId {checkpoint['historyId']} is too old. Falling back to a full search.")
+
+    after = None
+    if checkpoint and checkpoint.get("synced_at"):
+        after = datetime.fromisoformat(checkpoint["synced_at"]) - timedelta(days=1)
+    return search_emails(service, sender, subject, after=after), history_id
+
 def get_attachment(service, msg_id, attachment_id):
     """Gets a specific attachment from a message."""
     try:
-        return service.users().messages().attachments().get(userId="me", messageId=msg_id, id=attachment_id).execute()
+        return execute(service.users().messages().attachments().get(userId="me", messageId=msg_id, id=attachment_id), "gmail.attachments.get")
     except HttpError as error:
         logging.error(f"An error occurred while getting an attachment: {error}")
         return None
 
-def get_report_type(file_path):
-    """Determines the report type by summing the 'Total Hours' column."""
+def get_messages_batch(service, msg_ids, batch_size=GMAIL_BATCH_SIZE):
+    """Fetches messages with one HTTP batch request per batch_size messages. Returns {msg_id: message}."""
+    messages = {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            logging.error(f"An error occurred while fetching message {request_id}: {exception}")
+        else:
+            messages[request_id] = response
+
+    for chunk in _chunks(list(msg_ids), batch_size):
+        batch = service.new_batch_http_request(callback=callback)
+        for msg_id in chunk:
+            batch.add(service.users().messages().get(userId="me", id=msg_id), request_id=msg_id)
+        try:
+            execute(batch, "gmail.batch")
+        except HttpError as error:
+            logging.error(f"An error occurred while fetching a batch of messages: {error}")
+    return messages
+
+def get_attachments_batch(service, attachment_refs, batch_size=GMAIL_BATCH_SIZE):
+    """
+    Fetches attachments with one HTTP batch request per batch_size attachments.
+
+    attachment_refs is a list of (msg_id, attachment_id) pairs. Returns a dict keyed by
+    those pairs; attachments that could not be fetched are left out.
+    """
+    attachments = {}
+    attachment_refs = list(attachment_refs)
+
+    def callback(request_id, response, exception):
+        ref = attachment_refs[int(request_id)]
+        if exception is not None:
+            logging.error(f"An error occurred while getting an attachment of message {ref[0]}: {exception}")
+        else:
+            attachments[ref] = response
+
+    for start in range(0, len(attachment_refs), batch_size):
+        batch = service.new_batch_http_request(callback=callback)
+        for i, (msg_id, attachment_id) in enumerate(attachment_refs[start:start + batch_size], start):
+            batch.add(service.users().messages().attachments().get(userId="me", messageId=msg_id, id=attachment_id), request_id=str(i))
+        try:
+            execute(batch, "gmail.batch")
+        except HttpError as error:
+            logging.error(f"An error occurred while getting a batch of attachments: {error}")
+    return attachments
+
+def mark_as_read_batch(service, msg_ids, batch_size=GMAIL_BATCH_MODIFY_SIZE):
+    """Removes the UNREAD label from many emails with one batchModify call per batch_size IDs."""
+    for chunk in _chunks(list(msg_ids), batch_size):
+        try:
+            execute(service.users().messages().batchModify(userId="me", body={"ids": chunk, "removeLabelIds": ["UNREAD"]}), "gmail.messages.batchModify")
+            logging.info(f"Marked {len(chunk)} emails as read.")
+        except HttpError as error:
+            logging.error(f"An error occurred while marking emails as read: {error}")
+
+def get_report_type(report):
+    """Determines the report type of a Report from the average of its 'Total Hours' column."""
     try:
-        df = pd.read_excel(file_path, header=0)
-        if "Total Hours" in df.columns:
-            average_total_hours = df["Total Hours"].mean()
-            report_type = "volunteer" if average_total_hours >= HOURS_THRESHOLD else "parking"
-            logging.info(f"Report: {os.path.basename(file_path)} - Average Total Hours: {average_total_hours:.2f}. Threshold: {HOURS_THRESHOLD}. Determined type: {report_type}")
-            return report_type
+        report_type, average_total_hours = report.classify(HOURS_THRESHOLD)
+        if report_type != "unknown":
+            logging.info(f"Report: {report.filename} - Average Total Hours: {average_total_hours:.2f}. Threshold: {HOURS_THRESHOLD}. Determined type: {report_type}")
         else:
-            logging.warning(f"'Total Hours' column not found in {file_path}. Could not determine report type.")
-            return "unknown"
+            logging.warning(f"'Total Hours' column not found in {report.filename}. Could not determine report type.")
+        return report_type
     except Exception as e:
         logging.error(f"An error occurred while reading the excel file: {e}")
         return "unknown"
 
+def _load_json_cache(path):
+    """Returns the dict saved in a JSON cache file, or {} if there is none or it is unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable cache {path}: {e}")
+        return {}
+
+def _save_json_cache(path, cache):
+    """Writes a JSON cache file atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+# Loaded on first use; guarded by _gdrive_folder_lock (folders) and _gdrive_upload_lock (uploads).
+_gdrive_folder_cache = None
+_gdrive_upload_index = None
+
+def _folder_cache_key(folder_name, parent_folder_id=None):
+    return f"{parent_folder_id or ''}/{folder_name}"
+
 def get_gdrive_folder_id(service, folder_name, parent_folder_id=None):
+    """
+    Returns the ID of a Google Drive folder by its name, optionally within a parent folder.
+    IDs found are kept in GDRIVE_FOLDER_CACHE_FILE, so each folder is looked up once across
+    runs; see invalidate_gdrive_folder_cache.
+    """
+    global _gdrive_folder_cache
+    if _gdrive_folder_cache is None:
+        _gdrive_folder_cache = _load_json_cache(GDRIVE_FOLDER_CACHE_FILE)
+    key = _folder_cache_key(folder_name, parent_folder_id)
+    if key in _gdrive_folder_cache:
+        return _gdrive_folder_cache[key]
+    folder_id = find_gdrive_folder_id(service, folder_name, parent_folder_id)
+    if folder_id:
+        _cache_gdrive_folder_id(key, folder_id)
+    return folder_id
+
+def _cache_gdrive_folder_id(key, folder_id):
+    global _gdrive_folder_cache
+    if _gdrive_folder_cache is None:
+        _gdrive_folder_cache = _load_json_cache(GDRIVE_FOLDER_CACHE_FILE)
+    _gdrive_folder_cache[key] = folder_id
+    _save_json_cache(GDRIVE_FOLDER_CACHE_FILE, _gdrive_folder_cache)
+
+def invalidate_gdrive_folder_cache():
+    """Forgets every cached folder ID, e.g. after Drive answered 404 for one (moved or deleted)."""
+    global _gdrive_folder_cache
+    _gdrive_folder_cache = {}
+    _save_json_cache(GDRIVE_FOLDER_CACHE_FILE, _gdrive_folder_cache)
+    logging.warning("A cached Google Drive folder no longer exists; looking the folders up again.")
+
+def find_gdrive_folder_id(service, folder_name, parent_folder_id=None):
     """Finds the ID of a Google Drive folder by its name, optionally within a parent folder."""
     try:
         query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}'"
         if parent_folder_id:
             query += f" and '{parent_folder_id}' in parents"
-        results = service.files().list(q=query, fields="files(id, name)").execute()
+        results = execute(service.files().list(q=query, fields="files(id, name)"), "drive.files.list")
         items = results.get("files", [])
         if not items:
             logging.warning(f"Google Drive folder '{folder_name}' not found.")
@@ -129,17 +443,58 @@ def get_gdrive_folder_id(service, folder_name, parent_folder_id=None):
         logging.error(f"An error occurred while searching for the Google Drive folder: {error}")
         return None
 
+def file_md5(file_path):
+    """Returns the hex MD5 of a file's content (the checksum Google Drive reports as md5Checksum)."""
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
 def upload_to_gdrive(service, file_path, folder_id):
-    """Uploads a file to a specific Google Drive folder."""
+    """
+    Uploads a file to a specific Google Drive folder with a resumable, chunked upload; a
+    chunk that fails with 429 or 5xx is retried with exponential backoff. A file whose
+    content was already uploaded to the folder is not uploaded again: the existing file ID
+    is returned. Raises HttpError if the folder does not exist (404), so the caller can
+    refresh its cached folder ID; returns None on other errors.
+    """
+    global _gdrive_upload_index
+    from googleapiclient.http import MediaFileUpload
+
+    upload_key = f"{folder_id}/{os.path.basename(file_path)}/{file_md5(file_path)}"
+    with _gdrive_upload_lock:
+        if _gdrive_upload_index is None:
+            _gdrive_upload_index = _load_json_cache(GDRIVE_UPLOAD_INDEX_FILE)
+        if upload_key in _gdrive_upload_index:
+            file_id = _gdrive_upload_index[upload_key]
+            logging.info(f"Unchanged file already uploaded, skipping upload. File ID: {file_id}")
+            return file_id
     try:
         file_metadata = {"name": os.path.basename(file_path), "parents": [folder_id]}
-        media = MediaFileUpload(file_path, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        file = service.files().create(body=file_metadata, media_body=media, fields="id").execute()
+        media = MediaFileUpload(
+            file_path,
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            chunksize=GDRIVE_CHUNK_SIZE,
+            resumable=True,
+        )
+        request = service.files().create(body=file_metadata, media_body=media, fields="id")
+        file = None
+        while file is None:
+            with _api_calls_lock:
+                API_CALLS["drive.files.create"] += 1
+            # next_chunk resumes from the last byte Drive acknowledged, backing off between retries.
+            _, file = request.next_chunk(num_retries=GDRIVE_UPLOAD_RETRIES)
         logging.info(f"File uploaded successfully. File ID: {file.get('id')}")
-        return file.get("id")
     except HttpError as error:
+        if error.resp.status == 404:
+            raise
         logging.error(f"An error occurred while uploading the file to Google Drive: {error}")
         return None
+    with _gdrive_upload_lock:
+        _gdrive_upload_index[upload_key] = file.get("id")
+        _save_json_cache(GDRIVE_UPLOAD_INDEX_FILE, _gdrive_upload_index)
+    return file.get("id")
 
 def create_gdrive_folder(service, folder_name, parent_folder_id=None):
     """Creates a new folder in Google Drive."""
@@ -151,8 +506,9 @@ def create_gdrive_folder(service, folder_name, parent_folder_id=None):
         if parent_folder_id:
             file_metadata['parents'] = [parent_folder_id]
         
-        folder = service.files().create(body=file_metadata, fields='id').execute()
+        folder = execute(service.files().create(body=file_metadata, fields='id'), "drive.files.create")
         logging.info(f"Folder '{folder_name}' created successfully. Folder ID: {folder.get('id')}")
+        _cache_gdrive_folder_id(_folder_cache_key(folder_name, parent_folder_id), folder.get('id'))
         return folder.get('id')
     except HttpError as error:
         logging.error(f"An error occurred while creating the folder: {error}")
@@ -167,18 +523,24 @@ def export_to_data_lake(
     message_payload_headers, # Pass headers to extract sender/subject
     gdrive_file_id,
     GDRIVE_TARGET_FOLDER,
-    REPORTS_DIR
+    REPORTS_DIR,
+    report=None,
+    report_id=None
 ):
     """
     Processes the downloaded Excel report, adds metadata, and saves it as a Parquet file
-    in the data lake.
+    in the data lake. Pass the already-parsed Report to avoid reading the file again, and
+    its content-derived report_id (see report_content_id); without one a random ID is used.
+    Returns the Parquet file path, or None on error.
     """
     try:
-        # Read the Excel file into a DataFrame
-        df_report = pd.read_excel(final_local_path, header=0)
+        # Reuse the parsed report if we have one; the shallow copy keeps its columns untouched.
+        if report is None:
+            report = Report.from_file(final_local_path)
+        df_report = report.df.copy(deep=False)
 
         # Add metadata fields
-        df_report["report_id"] = str(uuid.uuid4())
+        df_report["report_id"] = report_id or str(uuid.uuid4())
         df_report["report_type"] = report_type
         df_report["report_date"] = report_date
         df_report["processed_timestamp"] = datetime.now().isoformat()
@@ -198,16 +560,645 @@ def export_to_data_lake(
         df_report["gdrive_file_id"] = gdrive_file_id
         df_report["gdrive_folder_path"] = GDRIVE_TARGET_FOLDER
 
-        # Define data lake directory and save as Parquet
+        # Save as Parquet in the report_type=/report_date= partition of the data lake
         data_lake_dir = os.path.join(REPORTS_DIR, "data_lake")
-        os.makedirs(data_lake_dir, exist_ok=True)
-        parquet_filename = f"{report_type}-{report_date}-{df_report["report_id"].iloc[0]}.parquet"
-        parquet_path = os.path.join(data_lake_dir, parquet_filename)
-        df_report.to_parquet(parquet_path, index=False)
-        logging.info(f"Saved data lake entry: {parquet_filename}")
+        parquet_path = data_lake.write_report(df_report, data_lake_dir, report_type, report_date, df_report["report_id"].iloc[0])
+        logging.info(f"Saved data lake entry: {os.path.relpath(parquet_path, data_lake_dir)}")
+        return parquet_path
 
     except Exception as e:
         logging.error(f"Error during data lake processing for {os.path.basename(final_local_path)}: {e}")
+        return None
+
+def report_content_id(report_type, report_date, rows_hash):
+    """Returns the deterministic report_id of a report: the same type, date and rows always give the same ID."""
+    return str(uuid.uuid5(REPORT_ID_NAMESPACE, f"{report_type}/{report_date}/{rows_hash}"))
+
+# Loaded on first use and guarded by _report_index_lock, like the Drive caches.
+_report_index = None
+_report_index_lock = threading.Lock()
+# report_ids being uploaded right now, so two workers never process the same report at once.
+_claimed_report_ids = set()
+
+def _get_report_index():
+    """Returns the report index ({"reports": {report_id: ...}, "content_hashes": {"<date>/<sha256>": report_id}}); call with the lock held."""
+    global _report_index
+    if _report_index is None:
+        _report_index = _load_json_cache(REPORT_INDEX_FILE)
+        _report_index.setdefault("reports", {})
+        _report_index.setdefault("content_hashes", {})
+    return _report_index
+
+def _content_key(workbook):
+    # The report date comes from the filename, so the same bytes under another date are another snapshot.
+    return f"{parse_report_date(workbook.filename)}/{workbook.content_hash}"
+
+def find_duplicate_content(workbook):
+    """Returns the report_id of an already processed report with the same date and .xlsx bytes, or None. Needs no parse."""
+    with _report_index_lock:
+        index = _get_report_index()
+        report_id = index["content_hashes"].get(_content_key(workbook))
+        return report_id if report_id in index["reports"] else None
+
+def claim_report(report):
+    """
+    Claims report["report_id"] for processing. Returns False if a report with the same ID
+    was already processed or is being processed by another worker.
+    """
+    with _report_index_lock:
+        index = _get_report_index()
+        report_id = report["report_id"]
+        if report_id in index["reports"]:
+            # Remember these bytes too, so the next identical copy is skipped before parsing.
+            index["content_hashes"][_content_key(report["workbook"])] = report_id
+            _save_json_cache(REPORT_INDEX_FILE, index)
+            return False
+        if report_id in _claimed_report_ids:
+            return False
+        _claimed_report_ids.add(report_id)
+        return True
+
+def record_report(report, msg_id):
+    """Adds a fully uploaded and exported report to the report index."""
+    with _report_index_lock:
+        index = _get_report_index()
+        index["reports"][report["report_id"]] = {
+            "report_type": report["report_type"],
+            "report_date": report["report_date"],
+            "source_filename": report["original_filename"],
+            "email_id": msg_id,
+            "final_local_path": report["final_local_path"],
+            "gdrive_file_id": report["gdrive_file_id"],
+            "processed_timestamp": datetime.now().isoformat(),
+        }
+        index["content_hashes"][_content_key(report["workbook"])] = report["report_id"]
+        _save_json_cache(REPORT_INDEX_FILE, index)
+
+def parse_report_date(original_filename):
+    """Extracts the report date (YYYY-MM-DD) from an OnVolunteers attachment filename."""
+    try:
+        date_str = original_filename.split("Report")[-1].split("__")[0]
+        for fmt in ("%Y-%m-%d", "%Y%m%d"):
+            try:
+                return datetime.strptime(date_str, fmt).strftime("%Y-%m-%d")
+            except ValueError:
+                pass
+        logging.warning(f"Could not parse date from filename: {original_filename}. Using current date.")
+    except IndexError:
+        logging.warning(f"Could not extract date from filename: {original_filename}. Using current date.")
+    return datetime.now().strftime("%Y-%m-%d")
+
+def report_subdir(report_type):
+    """Returns the local/Google Drive subdirectory and base filename prefix for a report type."""
+    if report_type == "parking":
+        return "parking-hours", "parking-hours"
+    elif report_type == "volunteer":
+        return "volunteer-hours", "volunteer-hours"
+    return "unknown-reports", "unknown"
+
+# Guards the exists()/rename() pair so concurrent workers never pick the same target file.
+_rename_lock = threading.Lock()
+
+def incoming_path(original_filename):
+    """Returns a path for a new download of original_filename, in a fresh directory under INCOMING_DIR."""
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    return os.path.join(tempfile.mkdtemp(dir=INCOMING_DIR), original_filename)
+
+def _remove_incoming_dir(local_path):
+    """Removes the directory of a download once its file has been moved out."""
+    if os.path.dirname(os.path.dirname(local_path)) == INCOMING_DIR:
+        try:
+            os.rmdir(os.path.dirname(local_path))
+        except OSError:
+            pass
+
+def discard_download(local_path):
+    """Deletes a download, e.g. a duplicate report, together with its directory under INCOMING_DIR."""
+    os.remove(local_path)
+    _remove_incoming_dir(local_path)
+
+def set_aside_report(local_path):
+    """Moves a download that could not be classified to REPORTS_DIR, for a look by hand. Returns its new path."""
+    final_local_path = os.path.join(REPORTS_DIR, os.path.basename(local_path))
+    with _rename_lock:
+        os.replace(local_path, final_local_path)
+    _remove_incoming_dir(local_path)
+    return final_local_path
+
+def move_report(local_path, report_type, report_date):
+    """Moves a downloaded report to its typed directory, timestamping it if the name is taken."""
+    subdir, prefix = report_subdir(report_type)
+    target_dir = os.path.join(REPORTS_DIR, subdir)
+    os.makedirs(target_dir, exist_ok=True)
+
+    with _rename_lock:
+        final_filename = f"{prefix}-{report_date}.xlsx"
+        final_local_path = os.path.join(target_dir, final_filename)
+
+        if os.path.exists(final_local_path):
+            logging.info(f"File {final_filename} already exists. Checking for timestamped version.")
+            current_time = datetime.now().strftime("%H%M")
+            timestamped_filename = f"{report_type}-hours-{report_date}_{current_time}.xlsx"
+            timestamped_local_path = os.path.join(target_dir, timestamped_filename)
+
+            if os.path.exists(timestamped_local_path):
+                logging.info(f"Timestamped file {timestamped_filename} also exists. Overwriting.")
+            else:
+                logging.info(f"Saving as timestamped file: {timestamped_filename}")
+            final_local_path = timestamped_local_path
+            final_filename = timestamped_filename
+
+        os.replace(local_path, final_local_path)
+    _remove_incoming_dir(local_path)
+    logging.info(f"Renamed file to: {final_filename}")
+    return final_local_path
+
+def write_file_atomic(path, chunks):
+    """
+    Writes an iterable of byte chunks to path through a temp file that is renamed into place,
+    so a crash never leaves a partial report behind. Returns the SHA-256 of the content.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hexdigest()
+
+def decode_base64_chunks(encoded, chunk_size=ATTACHMENT_DECODE_CHUNK):
+    """Yields the base64url-decoded bytes of a Gmail attachment, chunk_size characters at a time."""
+    for start in range(0, len(encoded), chunk_size):
+        chunk = encoded[start:start + chunk_size]
+        if start + chunk_size >= len(encoded):
+            # Gmail may leave out the padding of the last quantum.
+            chunk += "=" * (-len(chunk) % 4)
+        yield base64.urlsafe_b64decode(chunk)
+
+def save_attachment(attachment, local_path):
+    """
+    Decodes an attachment straight to local_path without holding the whole file in memory.
+    Returns a Report backed by the file, or also by the decoded bytes if the attachment is no
+    larger than ATTACHMENT_MEMORY_LIMIT (so the parser skips the disk round-trip).
+    """
+    encoded = attachment["data"]
+    keep_in_memory = attachment.get("size", len(encoded) * 3 // 4) <= ATTACHMENT_MEMORY_LIMIT
+    kept = []
+
+    def chunks():
+        for chunk in decode_base64_chunks(encoded):
+            if keep_in_memory:
+                kept.append(chunk)
+            yield chunk
+
+    content_hash = write_file_atomic(local_path, chunks())
+    data = b"".join(kept) if keep_in_memory else None
+    return Report(data, os.path.basename(local_path), path=local_path, content_hash=content_hash)
+
+def is_report_part(part):
+    """Returns True if a message part is an OnVolunteers report attachment."""
+    return bool(part["filename"]) and part["filename"].endswith(".xlsx") and "OnVolunteers_Volunteer_Hours_Report" in part["filename"]
+
+def download_reports(gmail_service, msg_id, message=None, attachments=None):
+    """
+    Fetches a message and saves each of its OnVolunteers report attachments to a path of its
+    own under INCOMING_DIR (see incoming_path).
+
+    message and attachments ({(msg_id, attachment_id): attachment}) may be prefetched in
+    batch; anything missing is fetched individually.
+    """
+    if message is None:
+        message = execute(gmail_service.users().messages().get(userId="me", id=msg_id), "gmail.messages.get")
+    attachments = attachments or {}
+    reports = []
+    for part in message["payload"]["parts"]:
+        if is_report_part(part):
+            attachment_id = part["body"]["attachmentId"]
+            # Popped, so the encoded data is freed as soon as this attachment is decoded.
+            attachment = attachments.pop((msg_id, attachment_id), None) or get_attachment(gmail_service, msg_id, attachment_id)
+            if attachment:
+                original_filename = part["filename"].lstrip('/')
+                local_path = incoming_path(original_filename)
+                workbook = save_attachment(attachment, local_path)
+                del attachment
+                duplicate_of = find_duplicate_content(workbook)
+                if duplicate_of:
+                    logging.info(f"Attachment {original_filename} is identical to report {duplicate_of}; skipping it.")
+                    discard_download(local_path)
+                    reports.append({"original_filename": original_filename, "workbook": workbook, "duplicate_of": duplicate_of})
+                    continue
+                logging.info(f"Downloaded attachment: {original_filename}")
+                reports.append({
+                    "original_filename": original_filename,
+                    "local_path": local_path,
+                    "workbook": workbook,
+                })
+    return message, reports
+
+def classify_report(report):
+    """
+    Classifies a downloaded report, gives it its content-derived report_id and moves it into
+    place. A report with the same rows as one already processed is marked as a duplicate
+    (report["duplicate_of"]) and its download deleted. Returns False for unknown reports,
+    which are left in REPORTS_DIR.
+    """
+    if report.get("duplicate_of"):
+        return True
+    report["report_type"] = get_report_type(report["workbook"])
+    if report["report_type"] == "unknown":
+        report["local_path"] = set_aside_report(report["local_path"])
+        return False
+    report["report_date"] = parse_report_date(report["original_filename"])
+    report["report_id"] = report_content_id(report["report_type"], report["report_date"], report["workbook"].rows_hash)
+    if not claim_report(report):
+        logging.info(f"Report {report['original_filename']} has the same rows as report {report['report_id']}; skipping it.")
+        report["duplicate_of"] = report["report_id"]
+        # This job's own download; a copy being processed by another worker lives at another path.
+        discard_download(report["local_path"])
+        return True
+    report["final_local_path"] = move_report(report["local_path"], report["report_type"], report["report_date"])
+    report["workbook"].path = report["final_local_path"]
+    return True
+
+# Serializes Drive folder get-or-create (and the folder cache) so concurrent uploads don't create duplicate folders.
+_gdrive_folder_lock = threading.Lock()
+# Guards the upload index.
+_gdrive_upload_lock = threading.Lock()
+
+def get_report_subdir_id(drive_service, reports_folder_id, subdir):
+    """Returns the ID of a report type's Google Drive subfolder, creating it if needed."""
+    with _gdrive_folder_lock:
+        gdrive_subdir_id = get_gdrive_folder_id(drive_service, subdir, parent_folder_id=reports_folder_id)
+        if not gdrive_subdir_id:
+            logging.info(f"Google Drive folder '{subdir}' not found, creating it.")
+            gdrive_subdir_id = create_gdrive_folder(drive_service, subdir, parent_folder_id=reports_folder_id)
+    return gdrive_subdir_id
+
+def upload_report(drive_service, reports_folder_id, msg_id, headers, report):
+    """
+    Uploads a classified report to its Google Drive subfolder and exports it to the data lake,
+    then records it in the report index. Duplicates are skipped.
+    """
+    if report.get("duplicate_of"):
+        return
+    try:
+        if _upload_report(drive_service, reports_folder_id, msg_id, headers, report):
+            record_report(report, msg_id)
+    finally:
+        with _report_index_lock:
+            _claimed_report_ids.discard(report["report_id"])
+
+def _upload_report(drive_service, reports_folder_id, msg_id, headers, report):
+    """Uploads and exports a report. Returns True if both succeeded."""
+    subdir, _ = report_subdir(report["report_type"])
+    final_local_path = report["final_local_path"]
+
+    # Get or create the subdirectory in Google Drive (cached, so usually no API call)
+    gdrive_subdir_id = get_report_subdir_id(drive_service, reports_folder_id, subdir)
+    if not gdrive_subdir_id:
+        logging.error(f"Could not find or create Google Drive folder '{subdir}'.")
+        return
+
+    gdrive_folder_path = f"{GDRIVE_TARGET_FOLDER}/{subdir}"
+    logging.info(f"Uploading {os.path.basename(final_local_path)} to Google Drive folder: {gdrive_folder_path}")
+    try:
+        gdrive_file_id = upload_to_gdrive(drive_service, final_local_path, gdrive_subdir_id)
+    except HttpError:
+        # The cached folder is gone; look up the reports folder and the subfolder again, then retry once.
+        with _gdrive_folder_lock:
+            invalidate_gdrive_folder_cache()
+        reports_folder_id = get_reports_folder_id(drive_service)
+        gdrive_subdir_id = reports_folder_id and get_report_subdir_id(drive_service, reports_folder_id, subdir)
+        if not gdrive_subdir_id:
+            logging.error(f"Could not find or create Google Drive folder '{subdir}'.")
+            return
+        try:
+            gdrive_file_id = upload_to_gdrive(drive_service, final_local_path, gdrive_subdir_id)
+        except HttpError as error:
+            logging.error(f"An error occurred while uploading the file to Google Drive: {error}")
+            gdrive_file_id = None
+    report["gdrive_file_id"] = gdrive_file_id
+
+    if not gdrive_file_id:
+        return False
+    parquet_path = export_to_data_lake(
+        final_local_path,
+        report["original_filename"],
+        report["report_type"],
+        report["report_date"],
+        msg_id,
+        headers,
+        gdrive_file_id,
+        gdrive_folder_path,
+        REPORTS_DIR,
+        report=report["workbook"],
+        report_id=report["report_id"]
+    )
+    return parquet_path is not None
+
+def process_report_file(drive_service, reports_folder_id, data, original_filename, source_id, headers=None):
+    """
+    Runs a report that did not arrive by email, e.g. one ov_reports_list.py downloaded straight
+    from the portal, through the same save, classify/rename, upload and data lake steps.
+    source_id is recorded in place of the email ID. Returns the report dict, or None if the
+    report could not be classified. A duplicate of a processed report is returned with
+    report["duplicate_of"] set, without being uploaded again.
+    """
+    workbook = Report(data, original_filename)
+    duplicate_of = find_duplicate_content(workbook)
+    if duplicate_of:
+        logging.info(f"Captured report {original_filename} is identical to report {duplicate_of}; skipping it.")
+        return {"original_filename": original_filename, "workbook": workbook, "duplicate_of": duplicate_of}
+    local_path = incoming_path(original_filename)
+    write_file_atomic(local_path, [data])
+    logging.info(f"Saved captured report: {original_filename}")
+    report = {"original_filename": original_filename, "local_path": local_path, "workbook": workbook}
+    if not classify_report(report):
+        logging.warning(f"Could not classify {original_filename}; left in {REPORTS_DIR}.")
+        return None
+    upload_report(drive_service, reports_folder_id, source_id, headers or [], report)
+    return report
+
+def mark_as_read(gmail_service, msg_id, keep_unread=False):
+    """Removes the UNREAD label from a processed email unless --keep-unread was given."""
+    if not keep_unread:
+        execute(gmail_service.users().messages().modify(userId='me', id=msg_id, body={'removeLabelIds': ['UNREAD']}), "gmail.messages.modify")
+        logging.info(f"Email {msg_id} marked as read.")
+    else:
+        logging.info(f"Email {msg_id} left unread as per --keep-unread flag.")
+
+# What process_messages keeps of each report once its email is done: no message, bytes or DataFrame.
+REPORT_SUMMARY_KEYS = ("original_filename", "report_type", "report_date", "report_id", "duplicate_of", "final_local_path", "gdrive_file_id")
+
+def summarize_job(job):
+    """Returns the message ID and report summaries of a finished pipeline payload."""
+    return {
+        "msg_id": job["msg_id"],
+        "reports": [{key: report[key] for key in REPORT_SUMMARY_KEYS if key in report} for report in job.get("reports", [])],
+    }
+
+class ServicePool:
+    """
+    (gmail, drive) service pairs for pipeline worker threads, built by factory on demand and
+    kept between process_messages calls, so the daemon builds them once rather than every cycle.
+    A pair is used by one thread at a time.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self.factory()
+
+    def release(self, services):
+        with self._lock:
+            self._idle.append(services)
+
+def process_messages(gmail_service, drive_service, messages, reports_folder_id, keep_unread=False, workers=1, service_pool=None, batch_size=GMAIL_BATCH_SIZE):
+    """
+    Downloads, classifies, uploads and marks each message through a staged pipeline.
+
+    With workers > 1 every stage runs on its own pool of threads. The Google API client
+    is not thread-safe, so each worker thread takes its own (gmail, drive) services from
+    service_pool (a ServicePool) and returns them when the run ends; without a pool the
+    given services are shared (e.g. a fake service in tests).
+
+    With batch_size > 0, messages are prefetched with one Gmail batch request per batch_size
+    messages, and their report attachments a few emails at a time, at most
+    GMAIL_PREFETCH_BYTES per batch. Processed emails are marked as read with one batchModify
+    per batch_size emails as they finish. Returns the pipeline jobs in message order.
+    A finished job keeps only its status and summarize_job's ids: the message, attachment bytes
+    and parsed report are dropped as soon as its email is done, so memory stays flat on a
+    large backlog.
+    """
+    local = threading.local()
+    local.services = (gmail_service, drive_service)
+    taken_services = []
+    taken_lock = threading.Lock()
+    processed_msg_ids = []
+    processed_lock = threading.Lock()
+
+    def services():
+        if not hasattr(local, "services"):
+            if service_pool:
+                local.services = service_pool.acquire()
+                with taken_lock:
+                    taken_services.append(local.services)
+            else:
+                local.services = (gmail_service, drive_service)
+        return local.services
+
+    def prefetched_payloads():
+        # Runs on the pipeline's feeder thread, ahead of the download stage.
+        for chunk in _chunks([msg["id"] for msg in messages], batch_size):
+            fetched = get_messages_batch(gmail_service, chunk, batch_size)
+            group, group_bytes = [], 0
+            for msg_id in chunk:
+                parts = [part for part in fetched[msg_id]["payload"]["parts"] if is_report_part(part)] if msg_id in fetched else []
+                size = sum(part["body"].get("size", 0) for part in parts)
+                if group and group_bytes + size > GMAIL_PREFETCH_BYTES:
+                    yield from prefetch_attachments(group, fetched)
+                    group, group_bytes = [], 0
+                group.append((msg_id, [(msg_id, part["body"]["attachmentId"]) for part in parts]))
+                group_bytes += size
+            yield from prefetch_attachments(group, fetched)
+
+    def prefetch_attachments(group, fetched):
+        # group is a list of (msg_id, attachment refs); each payload gets only its own attachments.
+        attachments = get_attachments_batch(gmail_service, [ref for _, refs in group for ref in refs], batch_size)
+        for msg_id, refs in group:
+            own = {ref: attachments.pop(ref) for ref in refs if ref in attachments}
+            yield {"msg_id": msg_id, "message": fetched.get(msg_id), "attachments": own}
+
+    def mark_processed(gmail, msg_ids):
+        if keep_unread:
+            logging.info(f"{len(msg_ids)} emails left unread as per --keep-unread flag.")
+        else:
+            mark_as_read_batch(gmail, msg_ids)
+
+    def download(job):
+        gmail, _ = services()
+        job["message"], job["reports"] = download_reports(gmail, job["msg_id"], job.get("message"), job.pop("attachments", None))
+        return job if job["reports"] else None
+
+    def classify(job):
+        job["reports"] = [report for report in job["reports"] if classify_report(report)]
+        return job if job["reports"] else None
+
+    def upload(job):
+        _, drive = services()
+        for report in job["reports"]:
+            upload_report(drive, reports_folder_id, job["msg_id"], job["message"]["payload"]["headers"], report)
+        return job
+
+    def mark(job):
+        if batch_size > 0:
+            # One batchModify per batch_size finished emails, so an interrupted run keeps what it marked.
+            with processed_lock:
+                processed_msg_ids.append(job["msg_id"])
+                msg_ids = processed_msg_ids[:] if len(processed_msg_ids) >= batch_size else None
+                if msg_ids:
+                    processed_msg_ids.clear()
+            if msg_ids:
+                gmail, _ = services()
+                mark_processed(gmail, msg_ids)
+            return job
+        gmail, _ = services()
+        # The serial flow marked once per processed report; the label change is idempotent.
+        for _ in job["reports"]:
+            mark_as_read(gmail, job["msg_id"], keep_unread)
+        return job
+
+    stages = [("download", download), ("classify", classify), ("upload", upload), ("mark", mark)]
+    if batch_size > 0:
+        payloads = prefetched_payloads()
+    else:
+        payloads = ({"msg_id": msg["id"]} for msg in messages)
+    jobs = run_pipeline(payloads, stages, workers=workers, finish=summarize_job)
+    # Every worker thread has finished, so its services can go to the next run.
+    for taken in taken_services:
+        service_pool.release(taken)
+
+    if processed_msg_ids:
+        mark_processed(gmail_service, processed_msg_ids)
+    return jobs
+
+def watch_gmail(gmail_service, topic_name):
+    """Asks Gmail to publish inbox changes to a Cloud Pub/Sub topic. Returns the watch's historyId, or None."""
+    try:
+        response = execute(
+            gmail_service.users().watch(userId="me", body={"topicName": topic_name, "labelIds": ["INBOX"], "labelFilterBehavior": "INCLUDE"}),
+            "gmail.users.watch",
+        )
+    except HttpError as error:
+        logging.error(f"An error occurred while starting the Gmail watch: {error}")
+        return None
+    expiration = datetime.fromtimestamp(int(response["expiration"]) / 1000)
+    logging.info(f"Gmail push notifications go to {topic_name} until {expiration:%Y-%m-%d %H:%M}.")
+    return response.get("historyId")
+
+def process_new_emails(gmail_service, drive_service, args, service_pool=None):
+    """Finds new report emails and processes them: one cron run, or one --daemon cycle."""
+    if not os.path.exists(REPORTS_DIR):
+        os.makedirs(REPORTS_DIR)
+
+    history_id = None
+    if args.incremental:
+        messages, history_id = sync_emails(gmail_service, "no-reply@onvolunteers.com", "Requested OnVolunteers Report")
+    else:
+        messages = search_emails(gmail_service, "no-reply@onvolunteers.com", "Requested OnVolunteers Report")
+    if not messages:
+        logging.info("No new report emails found.")
+        if history_id:
+            save_sync_checkpoint(history_id)
+        return
+
+    # Find the Google Drive folder ID for the main reports folder
+    reports_folder_id = get_reports_folder_id(drive_service)
+    if not reports_folder_id:
+        return
+
+    if args.workers > 1:
+        logging.info(f"Processing {len(messages)} emails with {args.workers} workers per stage.")
+
+    jobs = process_messages(
+        gmail_service,
+        drive_service,
+        messages,
+        reports_folder_id,
+        keep_unread=args.keep_unread,
+        workers=args.workers,
+        service_pool=service_pool,
+        batch_size=min(args.batch_size, 100),
+    )
+    failed = [job for job in jobs if job.error]
+    if history_id and failed:
+        logging.warning(f"{len(failed)} emails failed; keeping the previous sync checkpoint so they are retried.")
+    elif history_id:
+        save_sync_checkpoint(history_id)
+
+def log_api_calls(label="this run"):
+    """Logs the Google API requests counted in API_CALLS, and resets the count."""
+    with _api_calls_lock:
+        calls = ", ".join(f"{api_method}={count}" for api_method, count in sorted(API_CALLS.items()))
+        logging.info(f"Google API requests {label}: {sum(API_CALLS.values())} ({calls})")
+        API_CALLS.clear()
+
+def run_daemon_mode(creds, gmail_service, drive_service, args, service_pool):
+    """
+    Keeps the credentials and services built, the worker threads' ones in service_pool too, and
+    processes new emails whenever Gmail pushes a notification, the webhook is called, or the
+    poll interval passes (see daemon.py).
+    """
+    # The webhook server (http.server) is only needed in daemon mode.
+    import daemon
+
+    wakeup = threading.Event()
+    stop = threading.Event()
+    # Token refreshes and watch renewals wait for a running cycle to finish.
+    cycle_lock = threading.Lock()
+
+    def shutdown(signum, frame):
+        logging.info(f"Received signal {signum}; stopping after the current cycle.")
+        stop.set()
+        wakeup.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    def run_cycle():
+        with cycle_lock:
+            process_new_emails(gmail_service, drive_service, args, service_pool)
+            log_api_calls("this cycle")
+
+    def refresh_token():
+        with cycle_lock:
+            refresh_credentials(creds)
+
+    def renew_watch():
+        with cycle_lock:
+            watch_gmail(gmail_service, GMAIL_PUBSUB_TOPIC)
+
+    server = None
+    if args.webhook_port:
+        server = daemon.start_webhook(DAEMON_WEBHOOK_HOST, args.webhook_port, wakeup, DAEMON_WEBHOOK_TOKEN)
+    if GMAIL_PUBSUB_TOPIC:
+        watch_gmail(gmail_service, GMAIL_PUBSUB_TOPIC)
+        daemon.run_periodically(GMAIL_WATCH_RENEW_SECONDS, renew_watch, stop, "gmail-watch")
+    daemon.run_periodically(TOKEN_CHECK_SECONDS, refresh_token, stop, "token-refresh")
+
+    logging.info(f"Running as a daemon; polling every {args.poll_seconds}s without a wakeup.")
+    daemon.run_daemon(run_cycle, wakeup, stop, args.poll_seconds)
+    if server:
+        server.shutdown()
+
+def get_reports_folder_id(drive_service):
+    """Returns the ID of the main Google Drive reports folder, or None (logged) if it is missing."""
+    target_folder_name = "Reports"
+    with _gdrive_folder_lock:
+        reports_folder_id = get_gdrive_folder_id(drive_service, target_folder_name)
+    if not reports_folder_id:
+        logging.error(f"Main Google Drive folder '{target_folder_name}' not found under the specified path in GDRIVE_TARGET_FOLDER. Please ensure the folder exists and the path is correct.")
+    return reports_folder_id
+
+def connect_drive():
+    """Returns (drive_service, reports_folder_id) for processing reports outside main()."""
+    from googleapiclient.discovery import build
+
+    drive_service = build("drive", "v3", credentials=get_credentials())
+    return drive_service, get_reports_folder_id(drive_service)
 
 def main():
     """Main function to process emails and attachments."""
@@ -218,8 +1209,49 @@ def main():
         default=False,
         help="Keep processed emails as unread (default: False, i.e., mark as read)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker threads per pipeline stage (default: 1, i.e., process emails one at a time)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="Only look at emails that arrived since the last run, using the Gmail history checkpoint in .tmp"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=GMAIL_BATCH_SIZE,
+        help=f"Number of Gmail calls per HTTP batch request, at most 100 (default: {GMAIL_BATCH_SIZE}; 0 disables batching)"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        default=False,
+        help="Keep running and process new emails as soon as Gmail pushes a notification or the webhook is called, polling as a fallback (implies --incremental)"
+    )
+    parser.add_argument(
+        "--poll-seconds",
+        type=int,
+        default=DAEMON_POLL_SECONDS,
+        help=f"With --daemon, seconds between polls when no wakeup arrives (default: DAEMON_POLL_SECONDS or {DAEMON_POLL_SECONDS})"
+    )
+    parser.add_argument(
+        "--webhook-port",
+        type=int,
+        default=DAEMON_WEBHOOK_PORT,
+        help=f"With --daemon, port of the local wakeup webhook on DAEMON_WEBHOOK_HOST, 0 to disable it (default: DAEMON_WEBHOOK_PORT or {DAEMON_WEBHOOK_PORT})"
+    )
     args = parser.parse_args()
+    if args.daemon:
+        args.incremental = True
+
+    from googleapiclient.discovery import build
 
+    setup_logging()
     start_time = datetime.now().strftime("%Y-%m-%d %H:%M")
     logging.info(f"### ov_process_gmail_reports STARTED {start_time} ###")
     if args.keep_unread:
@@ -237,118 +1269,14 @@ def main():
         logging.critical("Could not refresh authentication token. Please follow the instructions above.")
         return
 
-    if not os.path.exists(REPORTS_DIR):
-        os.makedirs(REPORTS_DIR)
+    # Worker threads' services share creds, so a token refresh reaches the pooled ones too.
+    service_pool = ServicePool(lambda: (build("gmail", "v1", credentials=creds), build("drive", "v3", credentials=creds)))
 
-    messages = search_emails(gmail_service, "no-reply@onvolunteers.com", "Requested OnVolunteers Report")
-    if not messages:
-        logging.info("No new report emails found.")
-        return
-
-    # Find the Google Drive folder ID for the main reports folder
-    target_folder_name = "Reports"
-    reports_folder_id = get_gdrive_folder_id(drive_service, target_folder_name)
-    if not reports_folder_id:
-        logging.error(f"Main Google Drive folder '{target_folder_name}' not found under the specified path in GDRIVE_TARGET_FOLDER. Please ensure the folder exists and the path is correct.")
-        return
-
-    for msg in messages:
-        msg_id = msg["id"]
-        message = gmail_service.users().messages().get(userId="me", id=msg_id).execute()
-        for part in message["payload"]["parts"]:
-            if part["filename"] and part["filename"].endswith(".xlsx") and "OnVolunteers_Volunteer_Hours_Report" in part["filename"]:
-                attachment = get_attachment(gmail_service, msg_id, part["body"]["attachmentId"])
-                if attachment:
-                    file_data = base64.urlsafe_b64decode(attachment["data"].encode("UTF-8"))
-                    original_filename = part["filename"].lstrip('/')
-                    local_path = os.path.join(REPORTS_DIR, original_filename)
-                    os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                    with open(local_path, "wb") as f:
-                        f.write(file_data)
-                    logging.info(f"Downloaded attachment: {original_filename}")
-
-                    report_type = get_report_type(local_path)
-                    if report_type != "unknown":
-                        try:
-                            date_str = original_filename.split("Report")[-1].split("__")[0]
-                            for fmt in ("%Y-%m-%d", "%Y%m%d"):
-                                try:
-                                    report_date = datetime.strptime(date_str, fmt).strftime("%Y-%m-%d")
-                                    break
-                                except ValueError:
-                                    pass
-                            else:
-                                logging.warning(f"Could not parse date from filename: {original_filename}. Using current date.")
-                                report_date = datetime.now().strftime("%Y-%m-%d")
-                        except IndexError:
-                            logging.warning(f"Could not extract date from filename: {original_filename}. Using current date.")
-                            report_date = datetime.now().strftime("%Y-%m-%d")
-
-                        if report_type == "parking":
-                            subdir = "parking-hours"
-                            base_name = f"parking-hours-{report_date}.xlsx"
-                        elif report_type == "volunteer":
-                            subdir = "volunteer-hours"
-                            base_name = f"volunteer-hours-{report_date}.xlsx"
-                        else:
-                            subdir = "unknown-reports"
-                            base_name = f"unknown-{report_date}.xlsx"
-
-                        target_dir = os.path.join(REPORTS_DIR, subdir)
-                        os.makedirs(target_dir, exist_ok=True)
-
-                        final_filename = base_name
-                        final_local_path = os.path.join(target_dir, final_filename)
-
-                        if os.path.exists(final_local_path):
-                            logging.info(f"File {final_filename} already exists. Checking for timestamped version.")
-                            current_time = datetime.now().strftime("%H%M")
-                            timestamped_filename = f"{report_type}-hours-{report_date}_{current_time}.xlsx"
-                            timestamped_local_path = os.path.join(target_dir, timestamped_filename)
-
-                            if os.path.exists(timestamped_local_path):
-                                logging.info(f"Timestamped file {timestamped_filename} also exists. Overwriting.")
-                                final_local_path = timestamped_local_path
-                                final_filename = timestamped_filename
-                            else:
-                                logging.info(f"Saving as timestamped file: {timestamped_filename}")
-                                final_local_path = timestamped_local_path
-                                final_filename = timestamped_filename
-                        
-                        os.rename(local_path, final_local_path)
-                        logging.info(f"Renamed file to: {final_filename}")
-
-                        # Get or create the subdirectory in Google Drive
-                        gdrive_subdir_id = get_gdrive_folder_id(drive_service, subdir, parent_folder_id=reports_folder_id)
-                        if not gdrive_subdir_id:
-                            logging.info(f"Google Drive folder '{subdir}' not found, creating it.")
-                            gdrive_subdir_id = create_gdrive_folder(drive_service, subdir, parent_folder_id=reports_folder_id)
-
-                        if gdrive_subdir_id:
-                            gdrive_folder_path = f"{GDRIVE_TARGET_FOLDER}/{subdir}"
-                            logging.info(f"Uploading {final_filename} to Google Drive folder: {gdrive_folder_path}")
-                            gdrive_file_id = upload_to_gdrive(drive_service, final_local_path, gdrive_subdir_id)
-                            
-                            if gdrive_file_id:
-                                export_to_data_lake(
-                                    final_local_path,
-                                    original_filename,
-                                    report_type,
-                                    report_date,
-                                    msg_id,
-                                    message["payload"]["headers"],
-                                    gdrive_file_id,
-                                    gdrive_folder_path,
-                                    REPORTS_DIR
-                                )
-                        else:
-                            logging.error(f"Could not find or create Google Drive folder '{subdir}'.")
-
-                        if not args.keep_unread:
-                            gmail_service.users().messages().modify(userId='me', id=msg_id, body={'removeLabelIds': ['UNREAD']}).execute()
-                            logging.info(f"Email {msg_id} marked as read.")
-                        else:
-                            logging.info(f"Email {msg_id} left unread as per --keep-unread flag.")
+    if args.daemon:
+        run_daemon_mode(creds, gmail_service, drive_service, args, service_pool)
+    else:
+        process_new_emails(gmail_service, drive_service, args, service_pool)
+        log_api_calls()
 
     end_time = datetime.now().strftime("%Y-%m-%d %H:%M")
     logging.info(f"### ov_process_gmail_reports FINISHED {end_time} ###")
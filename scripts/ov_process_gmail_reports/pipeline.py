@@ -0,0 +1,166 @@
+"""
+A small bounded-concurrency pipeline used by ov_process_gmail_reports.py.
+
+Jobs flow through a list of stages. Each stage runs in its own pool of worker
+threads and hands its output to the next stage through a bounded queue, so a
+slow stage (e.g. uploads) applies back-pressure instead of letting downloads
+pile up in memory.
+
+Log records emitted on a worker thread while it works on a job are held on
+that job and replayed in job order once every earlier job has finished, so the
+log reads the same as a serial run.
+"""
+
+import logging
+import queue
+import threading
+
+_STOP = object()
+_current = threading.local()
+
+
+class Job:
+    """A unit of work flowing through the pipeline."""
+
+    def __init__(self, seq, payload):
+        self.seq = seq
+        self.payload = payload
+        self.records = []
+        self.error = None
+        self.done = False
+
+
+class _CaptureFilter(logging.Filter):
+    """Diverts records logged on a worker thread onto the job it is processing."""
+
+    def filter(self, record):
+        job = getattr(_current, "job", None)
+        if job is None:
+            return True
+        job.records.append(record)
+        return False
+
+
+def _run_stage(name, func, job):
+    """Runs one stage for a job, recording (not raising) any error."""
+    if job.done:
+        return
+    try:
+        result = func(job.payload)
+    except Exception as e:
+        logging.error(f"Stage '{name}' failed: {e}")
+        job.error = e
+        job.done = True
+        return
+    if result is None:
+        job.done = True
+    else:
+        job.payload = result
+
+
+def _stage_worker(name, func, in_queue, out_queue):
+    while True:
+        job = in_queue.get()
+        if job is _STOP:
+            return
+        _current.job = job
+        try:
+            _run_stage(name, func, job)
+        finally:
+            _current.job = None
+        out_queue.put(job)
+
+
+def _finish(job, finish):
+    """Replaces a finished job's payload with finish(payload), dropping what later code does not need."""
+    if finish is not None:
+        job.payload = finish(job.payload)
+
+
+def run_pipeline(payloads, stages, workers=1, queue_size=None, finish=None):
+    """
+    Runs every payload through the stages and returns the finished jobs in input order.
+
+    stages is a list of (name, func) pairs. func receives the payload and returns the
+    payload for the next stage, or None when the job needs no further stages. An
+    exception in a stage is logged and stored on job.error; the job skips the
+    remaining stages.
+
+    payloads may be a lazy iterable; it is consumed only as fast as the first stage
+    accepts jobs, so a generator can fetch work in chunks without holding it all.
+
+    finish, if given, is called with the payload of each job once it has left the last
+    stage (or stopped early), and its result is kept as the payload. Every job is kept
+    until the run ends, so finish should keep only the ids and status the caller needs:
+    memory then stays flat however many payloads there are.
+
+    With workers <= 1 the stages run one job at a time on the calling thread.
+    """
+    jobs = []
+    if workers <= 1:
+        for seq, payload in enumerate(payloads):
+            job = Job(seq, payload)
+            jobs.append(job)
+            for name, func in stages:
+                _run_stage(name, func, job)
+            _finish(job, finish)
+        return jobs
+
+    queue_size = queue_size or 2 * workers
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    queues.append(queue.Queue())
+    pools = []
+    for i, (name, func) in enumerate(stages):
+        pool = [
+            threading.Thread(
+                target=_stage_worker,
+                args=(name, func, queues[i], queues[i + 1]),
+                name=f"{name}-{n}",
+                daemon=True,
+            )
+            for n in range(workers)
+        ]
+        for thread in pool:
+            thread.start()
+        pools.append(pool)
+
+    def feed():
+        try:
+            for seq, payload in enumerate(payloads):
+                job = Job(seq, payload)
+                jobs.append(job)
+                queues[0].put(job)
+        except Exception as e:
+            logging.error(f"Pipeline input failed: {e}")
+        # Shut the stages down in order so every job drains before its successors stop.
+        for i, pool in enumerate(pools):
+            for _ in pool:
+                queues[i].put(_STOP)
+            for thread in pool:
+                thread.join()
+        queues[-1].put(_STOP)
+
+    root_logger = logging.getLogger()
+    capture = _CaptureFilter()
+    root_logger.addFilter(capture)
+    feeder = threading.Thread(target=feed, name="pipeline-feeder", daemon=True)
+    feeder.start()
+    try:
+        finished = {}
+        next_seq = 0
+        while True:
+            job = queues[-1].get()
+            if job is _STOP:
+                break
+            _finish(job, finish)
+            finished[job.seq] = job
+            while next_seq in finished:
+                job = finished.pop(next_seq)
+                for record in job.records:
+                    root_logger.handle(record)
+                job.records = []
+                next_seq += 1
+        feeder.join()
+    finally:
+        root_logger.removeFilter(capture)
+    return jobs
@@ -1,19 +1,353 @@
+"""
+Queries the OnVolunteers DuckDB database.
+
+Usage:
+  python query_db.py "<SQL>" [--format table|csv|json|parquet] [--output <path>]
+  python query_db.py <canned query> [--param name=value ...]
+  python query_db.py --list
+  python query_db.py --repl
+
+Results are streamed from DuckDB in Arrow record batches and written batch by batch, so a
+large result is never held in memory (the table format shows only its first rows).
+"""
 
-import duckdb
 import argparse
+import json
+import os
+import sys
+import time
+
+from db_setup import SUMMARY_BRACKETS
+from fines import fines_sql, policy_sql
 
 DB_FILE = "onvolunteers.db"
 
-def query_database(query):
-    """Executes a query against the DuckDB database and prints the results."""
-    con = duckdb.connect(DB_FILE)
-    result = con.execute(query).fetchdf()
-    con.close()
-    print(result)
+# Rows per Arrow record batch streamed out of DuckDB.
+BATCH_ROWS = 65536
+# Rows the table format prints; the rest of the result is only counted.
+TABLE_ROWS = 50
 
-if __name__ == "__main__":
+OUTPUT_FORMATS = ["table", "csv", "json", "parquet"]
+
+# The snapshot of a report type on $report_date, or its latest one when $report_date is NULL.
+SNAPSHOT_SQL = """(
+    SELECT * FROM family_hours_snapshot
+    WHERE report_type = $report_type
+      AND report_date = coalesce(CAST($report_date AS DATE), (SELECT max(report_date) FROM family_hours_snapshot WHERE report_type = $report_type))
+)"""
+
+# The fine policies of fines.py, with $required_hours and $fine_per_hour overriding them when set.
+POLICY_SQL = f"""(
+    SELECT report_type,
+        coalesce(CAST($required_hours AS DOUBLE), required_hours) AS required_hours,
+        coalesce(CAST($fine_per_hour AS DOUBLE), fine_per_hour) AS fine_per_hour
+    FROM {policy_sql()}
+)"""
+
+SNAPSHOT_FINES_SQL = fines_sql(SNAPSHOT_SQL, POLICY_SQL, total_column="total_hours", target_column="target_hours")
+
+BRACKET_COLUMNS_SQL = ", ".join(f'{column} AS "{label}"' for column, (label, _, _) in SUMMARY_BRACKETS.items())
+
+# name -> (description, SQL with $name parameters, default parameter values)
+CANNED_QUERIES = {
+    "owing-families": (
+        "Families below their required hours on a snapshot (default: the latest). Empty parameters use the policy in fines.py.",
+        f"""
+        SELECT report_date, last_name, first_name, email, total_hours, required_hours, hours_owing
+        FROM ({SNAPSHOT_FINES_SQL}) JOIN family USING (family_id)
+        WHERE hours_owing > 0
+        ORDER BY hours_owing DESC, last_name, first_name
+        """,
+        {"report_type": "volunteer", "report_date": None, "required_hours": None, "fine_per_hour": None},
+    ),
+    "completion-brackets": (
+        "Families per completion bracket of every report (or only report_date), from report_summary.",
+        f"""
+        SELECT report_date, families, completed_target_hours, {BRACKET_COLUMNS_SQL}
+        FROM report_summary
+        WHERE report_type = $report_type AND (CAST($report_date AS DATE) IS NULL OR report_date = CAST($report_date AS DATE))
+        ORDER BY report_date
+        """,
+        {"report_type": "volunteer", "report_date": None},
+    ),
+    "parking-fines": (
+        "Fines of the families short of the required parking hours on a snapshot (default: the latest). Empty parameters use the policy in fines.py.",
+        f"""
+        SELECT report_date, last_name, first_name, email, finished_hours, total_hours, hours_owing, fine_amount
+        FROM ({SNAPSHOT_FINES_SQL}) JOIN family USING (family_id)
+        WHERE hours_owing > 0
+        ORDER BY fine_amount DESC, last_name, first_name
+        """,
+        {"report_type": "parking", "report_date": None, "required_hours": None, "fine_per_hour": None},
+    ),
+}
+
+def sql_literal(value):
+    """Returns value as a SQL literal, for the arguments of EXECUTE (which can't bind parameters)."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def parse_params(pairs):
+    """Parses ["name=value", ...] into a dict. An empty value means NULL."""
+    params = {}
+    for pair in pairs:
+        name, sep, value = pair.partition("=")
+        if not sep or not name:
+            raise ValueError(f"Expected name=value, got '{pair}'.")
+        params[name.strip()] = value or None
+    return params
+
+class QueryService:
+    """
+    One warm DuckDB connection with a cache of prepared statements. Canned and parameterized
+    queries are prepared (parsed and planned) once per connection and then only executed.
+    """
+
+    def __init__(self, db_file=DB_FILE, read_only=False):
+        import duckdb
+
+        self.con = duckdb.connect(db_file, read_only=read_only)
+        # SQL text -> name of its prepared statement.
+        self.prepared = {}
+
+    def close(self):
+        self.con.close()
+
+    def execute(self, sql, params=None):
+        """Runs sql, through the prepared-statement cache when params (a dict of $name values) is given."""
+        if params is None:
+            return self.con.execute(sql)
+        name = self.prepared.get(sql)
+        if name is None:
+            name = f"ov_query_{len(self.prepared) + 1}"
+            self.con.execute(f"PREPARE {name} AS {sql}")
+            self.prepared[sql] = name
+        args = ", ".join(f"{key} := {sql_literal(value)}" for key, value in params.items())
+        return self.con.execute(f"EXECUTE {name}({args})" if args else f"EXECUTE {name}")
+
+    def execute_canned(self, name, params=None):
+        """Runs a canned query with its default parameters overridden by params."""
+        if name not in CANNED_QUERIES:
+            raise ValueError(f"Unknown query '{name}'. Canned queries: {', '.join(CANNED_QUERIES)}.")
+        _, sql, defaults = CANNED_QUERIES[name]
+        unknown = set(params or {}) - set(defaults)
+        if unknown:
+            raise ValueError(f"Query '{name}' has no parameter {', '.join(sorted(unknown))}. Parameters: {', '.join(defaults)}.")
+        return self.execute(sql, {**defaults, **(params or {})})
+
+def record_batches(result, batch_rows=BATCH_ROWS):
+    """Returns a pyarrow RecordBatchReader over a DuckDB result."""
+    if hasattr(result, "to_arrow_reader"):
+        return result.to_arrow_reader(batch_rows)
+    return result.fetch_record_batch(batch_rows)
+
+def write_results(result, output_format="table", output=None, batch_rows=BATCH_ROWS, table_rows=TABLE_ROWS):
+    """
+    Streams a DuckDB result to output (a path, or stdout when None) as a table, CSV,
+    newline-delimited JSON or Parquet, one record batch at a time. Returns the row count.
+    """
+    if result.description is None:
+        return 0
+    if output_format == "parquet" and output is None:
+        raise ValueError("The parquet format needs --output.")
+    reader = record_batches(result, batch_rows)
+    rows = 0
+
+    if output_format == "table":
+        import pyarrow as pa
+
+        shown = []
+        for batch in reader:
+            if rows < table_rows:
+                shown.append(batch.slice(0, table_rows - rows))
+            rows += batch.num_rows
+        table = pa.Table.from_batches(shown, schema=reader.schema)
+        text = table.to_pandas().to_string(index=False) if table.num_rows else ", ".join(reader.schema.names)
+        more = f" (showing the first {table.num_rows})" if rows > table.num_rows else ""
+        text += f"\n{rows} row(s){more}\n"
+        if output is None:
+            sys.stdout.write(text)
+        else:
+            with open(output, "w") as f:
+                f.write(text)
+        return rows
+
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(output, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        return rows
+
+    sink = open(output, "wb") if output is not None else sys.stdout.buffer
+    try:
+        if output_format == "csv":
+            import pyarrow.csv as pcsv
+
+            with pcsv.CSVWriter(sink, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+        elif output_format == "json":
+            for batch in reader:
+                sink.write("".join(json.dumps(row, default=str) + "\n" for row in batch.to_pylist()).encode())
+                rows += batch.num_rows
+        else:
+            raise ValueError(f"Unknown output format '{output_format}'. Formats: {', '.join(OUTPUT_FORMATS)}.")
+    finally:
+        if output is not None:
+            sink.close()
+        else:
+            sink.flush()
+    return rows
+
+def query_database(query, params=None, output_format="table", output=None, read_only=False):
+    """Executes a query (SQL or the name of a canned query) against the DuckDB database and writes the results."""
+    service = QueryService(read_only=read_only)
+    try:
+        if query in CANNED_QUERIES:
+            result = service.execute_canned(query, params)
+        else:
+            result = service.execute(query, params or None)
+        rows = write_results(result, output_format, output)
+    finally:
+        service.close()
+    if output is not None:
+        print(f"Wrote {rows} row(s) to {output}.", file=sys.stderr)
+
+def list_canned_queries():
+    """Returns a description of the canned queries and their parameters."""
+    lines = []
+    for name, (description, _, defaults) in CANNED_QUERIES.items():
+        params = " ".join(f"{key}={'' if value is None else value}" for key, value in defaults.items())
+        lines.append(f"{name}\n    {description}\n    Parameters: {params}")
+    return "\n".join(lines)
+
+REPL_HELP = """\
+Enter SQL ending in ';', or a command:
+  .queries                       list the canned queries
+  .run <name> [name=value ...]   run a canned query
+  .format <format>               table, csv, json or parquet (default: table)
+  .output [<path>]               write results to a file; without a path, back to the screen
+  .help                          this help
+  .quit                          exit"""
+
+def repl(service, output_format="table", output=None):
+    """Reads SQL and dot-commands from stdin until EOF or .quit, running them on the service's warm connection."""
+    import duckdb
+
+    try:
+        import readline  # noqa: F401 (line editing and history for input())
+    except ImportError:
+        pass
+
+    print(f"Connected to {DB_FILE}. Type .help for help.")
+    buffer = []
+    while True:
+        try:
+            line = input("...> " if buffer else "ov> ")
+        except EOFError:
+            print()
+            break
+        except KeyboardInterrupt:
+            print()
+            buffer = []
+            continue
+        stripped = line.strip()
+        if not buffer and stripped.startswith("."):
+            command, *words = stripped.split()
+            try:
+                if command == ".quit":
+                    break
+                elif command == ".help":
+                    print(REPL_HELP)
+                elif command == ".queries":
+                    print(list_canned_queries())
+                elif command == ".format":
+                    if not words or words[0] not in OUTPUT_FORMATS:
+                        raise ValueError(f"Formats: {', '.join(OUTPUT_FORMATS)}.")
+                    output_format = words[0]
+                elif command == ".output":
+                    output = words[0] if words else None
+                elif command == ".run" and words:
+                    _run_repl_query(lambda: service.execute_canned(words[0], parse_params(words[1:])), output_format, output)
+                else:
+                    raise ValueError(f"Unknown command '{stripped}'. Type .help for help.")
+            except (ValueError, duckdb.Error) as e:
+                print(f"Error: {e}")
+            continue
+        if stripped:
+            buffer.append(line)
+        if buffer and stripped.endswith(";"):
+            sql = "\n".join(buffer)
+            buffer = []
+            try:
+                _run_repl_query(lambda: service.execute(sql), output_format, output)
+            except (ValueError, duckdb.Error) as e:
+                print(f"Error: {e}")
+
+def _run_repl_query(run, output_format, output):
+    """Runs one REPL query and prints its wall time."""
+    start = time.perf_counter()
+    rows = write_results(run(), output_format, output)
+    elapsed = (time.perf_counter() - start) * 1000
+    if output:
+        print(f"Wrote {rows} row(s) to {output} in {elapsed:.1f} ms.")
+    else:
+        print(f"({elapsed:.1f} ms)")
+
+def main():
     parser = argparse.ArgumentParser(description='Query the OnVolunteers database.')
-    parser.add_argument('query', type=str, help='The SQL query to execute.')
+    parser.add_argument('query', type=str, nargs='?', help='The SQL query to execute, or the name of a canned query (see --list).')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE', help='A parameter of a canned query, or a $NAME parameter of the SQL (repeatable).')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='table', help='Output format (default: table). json writes one object per line.')
+    parser.add_argument('--output', help='Write the results to this file instead of stdout (required for parquet).')
+    parser.add_argument('--list', action='store_true', help='List the canned queries and their parameters.')
+    parser.add_argument('--repl', action='store_true', help='Start an interactive session on one warm connection.')
+    parser.add_argument('--read-only', action='store_true', help='Open the database read-only. Several read-only sessions can share it; none can while load_db.py writes.')
     args = parser.parse_args()
 
-    query_database(args.query)
+    try:
+        run_command(parser, args)
+    except BrokenPipeError:
+        # The reader (e.g. `| head`) stopped early; point stdout at /dev/null so the flush at exit doesn't fail again.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+
+def run_command(parser, args):
+    """Runs the --list, --repl or query command of main()."""
+    if args.list:
+        print(list_canned_queries())
+        return
+    try:
+        params = parse_params(args.param)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.repl:
+        service = QueryService(read_only=args.read_only)
+        try:
+            repl(service, args.format, args.output)
+        finally:
+            service.close()
+        return
+    if not args.query:
+        parser.error("a query, --list or --repl is required.")
+    import duckdb
+
+    try:
+        query_database(args.query, params, args.format, args.output, args.read_only)
+    except ValueError as e:
+        parser.error(str(e))
+    except duckdb.Error as e:
+        sys.exit(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Parse-once ingestion of OnVolunteers report workbooks.
+
+A Report holds the raw .xlsx bytes of one report (straight from the decoded
+Gmail attachment, or read from disk), or just the path of a large report that
+was decoded straight to disk, and parses it into a DataFrame the first time
+anything asks for it. Classification, the data lake export and the
+analysis all share that one parse.
+"""
+
+import hashlib
+import os
+import re
+
+from report_reader import read_report
+
+# Threshold to differentiate reports. If the average "Total Hours" is >= this value, it's a volunteer report.
+HOURS_THRESHOLD = 4
+
+# Number of workbook parses done by this process (see benchmark.py).
+PARSE_COUNT = 0
+
+# Filename/subject patterns that settle the report type without opening the workbook,
+# e.g. files already renamed by ov_process_gmail_reports.py.
+NAME_PATTERNS = [
+    (re.compile(r"parking", re.IGNORECASE), "parking"),
+    (re.compile(r"volunteer-hours|all[ _-]activities", re.IGNORECASE), "volunteer"),
+]
+
+
+def _canonical_value(value):
+    return float(value) if isinstance(value, (bool, int, float)) else value
+
+def _canonical_strings(values):
+    """
+    Returns a column as strings that do not depend on the reader engine's types: numbers and
+    booleans go through float64 (1, 1.0 and True all give "1.0"), dates are ISO formatted and
+    missing values are "".
+    """
+    from pandas.api import types
+
+    values = values.infer_objects()
+    if values.dtype == object:
+        # Engines disagree only on mixed columns, e.g. True/None (stream) against 1.0/NaN (pandas).
+        values = values.map(_canonical_value)
+    if types.is_numeric_dtype(values):
+        values = values.astype("float64")
+    elif types.is_datetime64_any_dtype(values):
+        values = values.dt.strftime("%Y-%m-%dT%H:%M:%S")
+    return values.astype(str).where(values.notna(), "")
+
+
+class Report:
+    """One OnVolunteers report workbook, parsed at most once."""
+
+    def __init__(self, data, filename, columns=None, engine=None, path=None, content_hash=None):
+        # The raw bytes, or None to parse the file at path instead (keeps large reports out of memory).
+        self.data = data
+        self.filename = filename
+        self.path = path
+        # Optional column projection and reader engine, see report_reader.read_report.
+        self.columns = columns
+        self.engine = engine
+        self._df = None
+        # May be passed in when it was computed while the file was written.
+        self._content_hash = content_hash
+        self._rows_hash = None
+
+    @classmethod
+    def from_file(cls, path, columns=None, engine=None):
+        """Reads a report from disk."""
+        with open(path, "rb") as f:
+            return cls(f.read(), os.path.basename(path), columns, engine)
+
+    @property
+    def df(self):
+        """The report's first sheet as a DataFrame. Treat it as read-only; copy before adding columns."""
+        if self._df is None:
+            global PARSE_COUNT
+            PARSE_COUNT += 1
+            self._df = read_report(self.data if self.data is not None else self.path, columns=self.columns, engine=self.engine)
+        return self._df
+
+    @property
+    def content_hash(self):
+        """SHA-256 of the workbook bytes: identical attachments have the same hash, without parsing."""
+        if self._content_hash is None:
+            if self.data is not None:
+                self._content_hash = hashlib.sha256(self.data).hexdigest()
+            else:
+                with open(self.path, "rb") as f:
+                    self._content_hash = hashlib.file_digest(f, "sha256").hexdigest()
+        return self._content_hash
+
+    @property
+    def rows_hash(self):
+        """
+        SHA-256 of the parsed rows, independent of row order, column order and reader engine.
+        Unlike content_hash it matches a report that was generated again with the same data
+        (the .xlsx bytes differ by timestamps).
+        """
+        if self._rows_hash is None:
+            import numpy as np
+            import pandas as pd
+
+            order = sorted(range(len(self.df.columns)), key=lambda i: str(self.df.columns[i]))
+            digest = hashlib.sha256("\x1f".join(str(self.df.columns[i]) for i in order).encode())
+            canonical = pd.DataFrame({n: _canonical_strings(self.df.iloc[:, i]) for n, i in enumerate(order)})
+            digest.update(np.sort(pd.util.hash_pandas_object(canonical, index=False).to_numpy()).tobytes())
+            self._rows_hash = digest.hexdigest()
+        return self._rows_hash
+
+    def classify(self, threshold=HOURS_THRESHOLD):
+        """
+        Returns (report_type, average_total_hours). report_type is "volunteer" or "parking",
+        or "unknown" (with average None) if the report has no "Total Hours" column.
+        """
+        if "Total Hours" not in self.df.columns:
+            return "unknown", None
+        average_total_hours = self.df["Total Hours"].mean()
+        report_type = "volunteer" if average_total_hours >= threshold else "parking"
+        return report_type, average_total_hours
+
+
+def report_type_from_name(filename=None, subject=None):
+    """Returns the report type implied by a filename or email subject, or None if they don't say."""
+    for text in (filename, subject):
+        if not text:
+            continue
+        for pattern, report_type in NAME_PATTERNS:
+            if pattern.search(text):
+                return report_type
+    return None
+
+
+def classify_file(path, subject=None, sample_rows=None, use_name=True, threshold=HOURS_THRESHOLD):
+    """
+    Classifies a report file as cheaply as possible. Returns (report_type, how).
+
+    The filename and email subject are tried first (how="name"). Otherwise only the header
+    and the "Total Hours" column are read, limited to the first sample_rows rows if given
+    (how="hours").
+    """
+    if use_name:
+        report_type = report_type_from_name(os.path.basename(path), subject)
+        if report_type:
+            return report_type, "name"
+    df = read_report(path, columns=["Total Hours"], nrows=sample_rows)
+    global PARSE_COUNT
+    PARSE_COUNT += 1
+    if "Total Hours" not in df.columns:
+        return "unknown", "hours"
+    return ("volunteer" if df["Total Hours"].mean() >= threshold else "parking"), "hours"
+
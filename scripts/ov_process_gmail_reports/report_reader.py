@@ -0,0 +1,121 @@
+"""
+Pluggable .xlsx reader for OnVolunteers reports.
+
+Engines:
+  openpyxl  pandas' default reader (loads the whole workbook into memory).
+  stream    openpyxl in read-only mode, streaming rows and keeping only the
+            requested columns.
+  calamine  pandas' calamine engine (Rust), when python-calamine is installed.
+  auto      calamine if available, otherwise stream.
+
+The engine comes from the `engine` argument, else the EXCEL_READER environment
+variable (e.g. in gmail_gdrive.env), else "auto". Whatever the engine, the
+report columns are converted to the types declared in db_setup.REPORT_COLUMNS.
+"""
+
+import importlib.util
+import io
+import os
+
+from db_setup import REPORT_COLUMNS
+
+READER_ENGINES = ("auto", "openpyxl", "stream", "calamine")
+
+def calamine_available():
+    """Returns True if the python-calamine package is installed."""
+    return importlib.util.find_spec("python_calamine") is not None
+
+def resolve_engine(engine=None):
+    """Returns the concrete engine to use for the given (or configured) engine name."""
+    engine = engine or os.getenv("EXCEL_READER", "auto")
+    if engine not in READER_ENGINES:
+        raise ValueError(f"Unknown Excel reader '{engine}'. Choose one of: {', '.join(READER_ENGINES)}.")
+    if engine == "auto":
+        return "calamine" if calamine_available() else "stream"
+    if engine == "calamine" and not calamine_available():
+        raise ValueError("The 'calamine' Excel reader needs the python-calamine package.")
+    return engine
+
+def _as_source(source):
+    """Wraps raw bytes in a file-like object; paths and file objects pass through."""
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+def _dedupe_names(names):
+    """
+    Renames repeated column names the way pandas does, so every engine gives the same columns:
+    the second "Name" becomes "Name.1", or the next free "Name.<n>" if the sheet has a "Name.1".
+    """
+    taken = set(names)
+    seen = set()
+    deduped = []
+    for name in names:
+        if name in seen:
+            n = 1
+            while f"{name}.{n}" in taken:
+                n += 1
+            name = f"{name}.{n}"
+            taken.add(name)
+        seen.add(name)
+        deduped.append(name)
+    return deduped
+
+def _read_stream(source, columns=None, nrows=None):
+    """Streams the first sheet row by row with openpyxl's read-only mode, stopping after nrows rows."""
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(_as_source(source), read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        names = _dedupe_names([name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)])
+        if columns is None:
+            keep = list(range(len(names)))
+        else:
+            keep = [i for i, name in enumerate(names) if str(name).strip() in columns]
+        data = {names[i]: [] for i in keep}
+        count = 0
+        for row in rows:
+            if nrows is not None and count >= nrows:
+                break
+            if all(value is None for value in row):
+                continue
+            for i in keep:
+                data[names[i]].append(row[i] if i < len(row) else None)
+            count += 1
+    finally:
+        workbook.close()
+    return pd.DataFrame(data)
+
+def apply_schema(df):
+    """Converts known report columns to their db_setup types (DOUBLE -> float64, VARCHAR -> string)."""
+    import pandas as pd
+
+    for name, sql_type in REPORT_COLUMNS.items():
+        if name not in df.columns:
+            continue
+        if sql_type == "DOUBLE":
+            df[name] = pd.to_numeric(df[name], errors="coerce").astype("float64")
+        else:
+            values = df[name]
+            df[name] = values.where(values.isna(), values.astype(str)).astype("string")
+    return df
+
+def read_report(source, columns=None, engine=None, nrows=None):
+    """
+    Reads the first sheet of a report into a DataFrame.
+
+    source is a path, a file-like object or the raw .xlsx bytes. columns, if given, limits
+    the result to those columns (matched ignoring surrounding spaces; missing ones are
+    simply absent) and is applied while reading, so unused columns are never materialized.
+    nrows, if given, stops reading after that many data rows.
+    """
+    import pandas as pd
+
+    engine = resolve_engine(engine)
+    if engine == "stream":
+        df = _read_stream(source, columns, nrows)
+    else:
+        usecols = (lambda name: str(name).strip() in columns) if columns is not None else None
+        df = pd.read_excel(_as_source(source), header=0, engine=engine, usecols=usecols, nrows=nrows)
+    return apply_schema(df)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+"""
+Streaming .xlsx writer for the fines and summary workbooks.
+
+Engines:
+  xlsxwriter  XlsxWriter in constant_memory mode: each row goes to disk as it is written.
+              Used when the xlsxwriter package is installed.
+  openpyxl    openpyxl's write-only mode, which also streams rows.
+  auto        xlsxwriter if available, otherwise openpyxl.
+
+The engine comes from the `engine` argument, else the EXCEL_WRITER environment variable,
+else "auto". A sheet's rows can come from a DataFrame, an Arrow table or record batch
+reader, or a DuckDB query. They are written one batch at a time, so a query result is never
+held in memory. Column widths come from the header and the first WIDTH_SAMPLE_ROWS rows,
+or from lengths measured by DuckDB (exact_widths) or passed in by the caller. The whole
+frame is never converted to strings. A workbook is written to a temp file and renamed into
+place, so a synced folder (e.g. Google Drive) never sees a partial file.
+
+Usage:
+  python report_writer.py fines [--report-type parking] [--date YYYY-MM-DD] [--output-dir DIR] [--workers N]
+  python report_writer.py summary [--output PATH] [--db onvolunteers.db]
+"""
+
+import argparse
+import glob
+import importlib.util
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+
+import data_lake
+import fines
+
+WRITER_ENGINES = ("auto", "xlsxwriter", "openpyxl")
+
+DATA_LAKE_DIR = "reports/data_lake"
+DB_FILE = "onvolunteers.db"
+FINES_OUTPUT_DIR = "reports/fines"
+SUMMARY_OUTPUT_FILE = "reports/season-summary.xlsx"
+
+# Rows per batch when a DataFrame or Arrow table is written; bounds the memory of the conversion.
+BATCH_ROWS = 10000
+# Rows looked at to size the columns.
+WIDTH_SAMPLE_ROWS = 1000
+MAX_COLUMN_WIDTH = 60
+DATE_FORMAT = "yyyy-mm-dd"
+
+# Columns of the fines workbook, in the notebook's order, and the fines columns they come from.
+FINES_REPORT_COLUMNS = {
+    "Last Name": '"Last Name"',
+    "First Name": '"First Name"',
+    "Email": '"Email"',
+    "Finished Hours": '"Finished Hours"',
+    "Total Hours": '"Total Hours"',
+    "Required Hours": "required_hours",
+    "Hours Owing": "hours_owing",
+    "Fine Amount": "fine_amount",
+}
+
+def xlsxwriter_available():
+    """Returns True if the xlsxwriter package is installed."""
+    return importlib.util.find_spec("xlsxwriter") is not None
+
+def resolve_engine(engine=None):
+    """Returns the concrete engine to use for the given (or configured) engine name."""
+    engine = engine or os.getenv("EXCEL_WRITER", "auto")
+    if engine not in WRITER_ENGINES:
+        raise ValueError(f"Unknown Excel writer '{engine}'. Choose one of: {', '.join(WRITER_ENGINES)}.")
+    if engine == "auto":
+        return "xlsxwriter" if xlsxwriter_available() else "openpyxl"
+    if engine == "xlsxwriter" and not xlsxwriter_available():
+        raise ValueError("The 'xlsxwriter' Excel writer needs the xlsxwriter package.")
+    return engine
+
+def _record_batches(source, con=None):
+    """Returns (column names, iterator of Arrow record batches) for a DataFrame, Arrow table or reader, or SQL query."""
+    import pyarrow as pa
+
+    if isinstance(source, str):
+        from query_db import record_batches
+
+        reader = record_batches(con.execute(source))
+        return reader.schema.names, iter(reader)
+    if isinstance(source, pa.Table):
+        return source.column_names, iter(source.to_batches(BATCH_ROWS))
+    if isinstance(source, pa.RecordBatchReader):
+        return source.schema.names, iter(source)
+    # A DataFrame, converted a slice at a time (NaN becomes an empty cell).
+    names = [str(name) for name in source.columns]
+    frame = source.set_axis(names, axis=1)
+    batches = (pa.RecordBatch.from_pandas(frame.iloc[start:start + BATCH_ROWS], preserve_index=False) for start in range(0, len(frame), BATCH_ROWS))
+    return names, batches
+
+def _rows(batches):
+    """Yields the rows of record batches as tuples of Python values (None for nulls)."""
+    for batch in batches:
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+def _display_length(value):
+    """Returns roughly how many characters Excel shows for a value (numbers in the General format)."""
+    if isinstance(value, float):
+        return len(f"{value:.11g}")
+    return len(value.isoformat() if hasattr(value, "isoformat") else str(value))
+
+def column_widths(names, sample, known=None):
+    """
+    Returns the width of each column: its longest header or sample value, or the length in
+    known (column -> characters, e.g. from column_lengths) when given, plus padding.
+    """
+    lengths = [len(name) for name in names]
+    for row in sample:
+        for i, value in enumerate(row):
+            if value is not None:
+                lengths[i] = max(lengths[i], _display_length(value))
+    for i, name in enumerate(names):
+        if known and known.get(name) is not None:
+            lengths[i] = max(len(name), known[name])
+    return [min(length + 2, MAX_COLUMN_WIDTH) for length in lengths]
+
+def column_lengths(con, sql):
+    """Returns {column: longest value in characters} of a query, measured by DuckDB without fetching the rows."""
+    names = [column[0] for column in con.execute(f"SELECT * FROM ({sql}) LIMIT 0").description]
+    if not names:
+        return {}
+    lengths = ", ".join(f'max(length(CAST("{name}" AS VARCHAR)))' for name in (name.replace('"', '""') for name in names))
+    return dict(zip(names, con.execute(f"SELECT {lengths} FROM ({sql})").fetchone()))
+
+def _open_sheets(sheets, con, widths=None, exact_widths=False):
+    """Yields (sheet name, column names, column widths, rows) for each sheet, sizing the columns from a sample."""
+    for sheet_name, source in sheets.items():
+        known = dict(widths or {})
+        if exact_widths and isinstance(source, str):
+            known.update(column_lengths(con, source))
+        names, batches = _record_batches(source, con)
+        rows = _rows(batches)
+        sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+        yield sheet_name, names, column_widths(names, sample, known), _chain(sample, rows)
+
+def _chain(sample, rows):
+    yield from sample
+    yield from rows
+
+def _write_xlsxwriter(path, sheets):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "default_date_format": DATE_FORMAT,
+        # Names and notes are text, even when they start with '=' or look like a URL.
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "nan_inf_to_errors": True,
+    })
+    try:
+        for sheet_name, names, widths, rows in sheets:
+            worksheet = workbook.add_worksheet(sheet_name)
+            for i, width in enumerate(widths):
+                worksheet.set_column(i, i, width)
+            worksheet.write_row(0, 0, names)
+            for row_number, row in enumerate(rows, start=1):
+                worksheet.write_row(row_number, 0, row)
+    finally:
+        workbook.close()
+
+def _write_openpyxl(path, sheets):
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, names, widths, rows in sheets:
+        worksheet = workbook.create_sheet(sheet_name)
+        for i, width in enumerate(widths):
+            worksheet.column_dimensions[get_column_letter(i + 1)].width = width
+        worksheet.append(names)
+        for row in rows:
+            if any(isinstance(value, str) and value.startswith("=") for value in row):
+                # openpyxl would store these as formulas; keep them as text.
+                row = [_text_cell(worksheet, value) for value in row]
+            worksheet.append(row)
+    workbook.save(path)
+
+def _text_cell(worksheet, value):
+    from openpyxl.cell import WriteOnlyCell
+
+    if not (isinstance(value, str) and value.startswith("=")):
+        return value
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.data_type = "s"
+    return cell
+
+def write_workbook(path, sheets, engine=None, widths=None, exact_widths=False, db_file=None):
+    """
+    Writes a workbook with one sheet per entry of sheets (sheet name -> DataFrame, Arrow table
+    or reader, or DuckDB SQL), streaming the rows. SQL runs on db_file (read-only) or an
+    in-memory database. widths maps column names to known lengths; with exact_widths, DuckDB
+    measures the columns of SQL sheets. Returns path.
+    """
+    engine = resolve_engine(engine)
+    con = None
+    if any(isinstance(source, str) for source in sheets.values()):
+        import duckdb
+
+        con = duckdb.connect(db_file, read_only=True) if db_file else duckdb.connect()
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    try:
+        opened = _open_sheets(sheets, con, widths, exact_widths)
+        if engine == "xlsxwriter":
+            _write_xlsxwriter(tmp_path, opened)
+        else:
+            _write_openpyxl(tmp_path, opened)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if con is not None:
+            con.close()
+    return path
+
+def _write_job(job, engine, exact_widths, db_file):
+    path, sheets = job
+    return write_workbook(path, sheets, engine, exact_widths=exact_widths, db_file=db_file)
+
+def write_workbooks(jobs, workers=1, engine=None, exact_widths=False, db_file=None):
+    """
+    Writes many workbooks, each job a (path, sheets) pair as for write_workbook, on up to
+    `workers` processes. Returns the paths, in job order.
+    """
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            return list(executor.map(_write_job, jobs, repeat(engine), repeat(exact_widths), repeat(db_file)))
+    return [_write_job(job, engine, exact_widths, db_file) for job in jobs]
+
+def safe_filename(value):
+    """Returns value as a string usable in a file name."""
+    return re.sub(r"[^\w.-]+", "_", str(value)).strip("_") or "blank"
+
+def split_jobs(df, by, path_template, sheet_name="Report"):
+    """
+    Returns one write_workbooks job per value of column `by` (e.g. an activity or grade),
+    with the file name from path_template, e.g. "reports/fines-{value}.xlsx".
+    """
+    return [
+        (path_template.format(value=safe_filename(value)), {sheet_name: group.drop(columns=[by])})
+        for value, group in df.groupby(by, sort=True)
+    ]
+
+def fines_report_sql(data_lake_dir, report_type, report_date, policies=None):
+    """Returns the DuckDB query of a snapshot's fines workbook: the families owing hours, largest fine first."""
+    columns = ", ".join(f'{column} AS "{title}"' for title, column in FINES_REPORT_COLUMNS.items())
+    return f"""
+    SELECT {columns}
+    FROM ({fines.snapshot_owing_sql(data_lake_dir, report_type, report_date, policies)})
+    ORDER BY fine_amount DESC, "Last Name", "First Name"
+    """
+
+def fines_jobs(data_lake_dir, report_type, output_dir, report_date=None):
+    """Returns one fines workbook job per snapshot of a report type (or only report_date) in the data lake."""
+    files = glob.glob(data_lake.partition_glob(data_lake_dir, report_type, report_date or "*"))
+    dates = sorted({data_lake.partition_values(path)["report_date"] for path in files})
+    return [
+        (os.path.join(output_dir, f"{report_type}-hours-{date}-fines.xlsx"), {"Fines Report": fines_report_sql(data_lake_dir, report_type, date)})
+        for date in dates
+    ]
+
+def summary_sheets(data_lake_dir, db_file=None):
+    """Returns the sheets of the season summary workbook: fines per snapshot, and completion brackets if there is a database."""
+    from query_db import BRACKET_COLUMNS_SQL
+
+    sheets = {}
+    if glob.glob(data_lake.partition_glob(data_lake_dir)):
+        sheets["Fines by Snapshot"] = fines.season_sql(data_lake_dir)
+    if db_file:
+        sheets["Completion Brackets"] = f"""
+        SELECT report_type, report_date, families, completed_target_hours, {BRACKET_COLUMNS_SQL}
+        FROM report_summary
+        ORDER BY report_type, report_date
+        """
+    return sheets
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the fines and season summary workbooks.")
+    parser.add_argument("--engine", choices=WRITER_ENGINES, help="Excel writer engine (default: EXCEL_WRITER or auto).")
+    parser.add_argument("--data-lake-dir", default=DATA_LAKE_DIR, help=f"Data lake directory (default: {DATA_LAKE_DIR}).")
+    parser.add_argument("--exact-widths", action="store_true", help=f"Size columns from every value, measured by DuckDB, instead of the first {WIDTH_SAMPLE_ROWS} rows.")
+    subparsers = parser.add_subparsers(dest="workbook", required=True)
+    fines_parser = subparsers.add_parser("fines", help="One fines workbook per snapshot, written in parallel.")
+    fines_parser.add_argument("--report-type", default="parking", choices=list(fines.FINE_POLICIES), help="Report type (default: parking).")
+    fines_parser.add_argument("--date", help="Only this report date (YYYY-MM-DD).")
+    fines_parser.add_argument("--output-dir", default=FINES_OUTPUT_DIR, help=f"Directory for the workbooks (default: {FINES_OUTPUT_DIR}).")
+    fines_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Workbooks written at once (default: CPU count).")
+    summary_parser = subparsers.add_parser("summary", help="The season summary: fines per snapshot and completion brackets.")
+    summary_parser.add_argument("--output", default=SUMMARY_OUTPUT_FILE, help=f"Workbook path (default: {SUMMARY_OUTPUT_FILE}).")
+    summary_parser.add_argument("--db", default=DB_FILE, help=f"DuckDB database with report_summary (default: {DB_FILE}); skipped if missing.")
+    args = parser.parse_args()
+
+    try:
+        resolve_engine(args.engine)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.workbook == "fines":
+        jobs = fines_jobs(args.data_lake_dir, args.report_type, args.output_dir, args.date)
+        if not jobs:
+            parser.error(f"no {args.report_type} reports in {args.data_lake_dir}.")
+        for path in write_workbooks(jobs, args.workers, args.engine, args.exact_widths):
+            print(f"Wrote {path}")
+    elif args.workbook == "summary":
+        db_file = args.db if os.path.exists(args.db) else None
+        sheets = summary_sheets(args.data_lake_dir, db_file)
+        if not sheets:
+            parser.error(f"no reports in {args.data_lake_dir} and no database at {args.db}.")
+        print(f"Wrote {write_workbook(args.output, sheets, args.engine, exact_widths=args.exact_widths, db_file=db_file)}")
+
+if __name__ == "__main__":
+    main()
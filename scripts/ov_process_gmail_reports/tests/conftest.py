@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ov_process_gmail_reports as ov  # noqa: E402
+from fake_google import FakeDrive, FakeGmail  # noqa: E402
+
+
+@pytest.fixture
+def ov_module(tmp_path, monkeypatch):
+    """ov_process_gmail_reports with its reports, caches and checkpoints under tmp_path, and empty in-memory state."""
+    reports_dir = tmp_path / "reports"
+    tmp_dir = tmp_path / ".tmp"
+    monkeypatch.setattr(ov, "REPORTS_DIR", str(reports_dir))
+    monkeypatch.setattr(ov, "INCOMING_DIR", str(reports_dir / ".incoming"))
+    monkeypatch.setattr(ov, "REPORT_INDEX_FILE", str(reports_dir / "report_index.json"))
+    monkeypatch.setattr(ov, "TMP_DIR", str(tmp_dir))
+    monkeypatch.setattr(ov, "HISTORY_CHECKPOINT_FILE", str(tmp_dir / "gmail_history.json"))
+    monkeypatch.setattr(ov, "GDRIVE_FOLDER_CACHE_FILE", str(tmp_dir / "gdrive_folders.json"))
+    monkeypatch.setattr(ov, "GDRIVE_UPLOAD_INDEX_FILE", str(tmp_dir / "gdrive_uploads.json"))
+    monkeypatch.setattr(ov, "_report_index", None)
+    monkeypatch.setattr(ov, "_gdrive_folder_cache", None)
+    monkeypatch.setattr(ov, "_gdrive_upload_index", None)
+    monkeypatch.setattr(ov, "_claimed_report_ids", set())
+    monkeypatch.setattr(ov, "API_CALLS", type(ov.API_CALLS)())
+    reports_dir.mkdir()
+    return ov
+
+
+@pytest.fixture
+def gmail():
+    return FakeGmail()
+
+
+@pytest.fixture
+def drive():
+    return FakeDrive()
@@ -0,0 +1,267 @@
+"""
+In-memory stand-ins for the Gmail and Google Drive API clients, covering the calls
+ov_process_gmail_reports.py makes. Every HTTP request the real client would send is
+recorded in `requests` (a batch counts once), so tests can check the number of API calls.
+"""
+
+import base64
+import io
+import itertools
+import threading
+from collections import Counter
+
+REPORT_SENDER = "no-reply@onvolunteers.com"
+REPORT_SUBJECT = "Requested OnVolunteers Report"
+
+
+def report_bytes(total_hours, families=None):
+    """Returns the .xlsx bytes of a User Volunteer Hours report with one row per total_hours value."""
+    import pandas as pd
+
+    families = families or [f"Family{i}" for i in range(len(total_hours))]
+    buffer = io.BytesIO()
+    pd.DataFrame({
+        "Last Name": families,
+        "First Name": ["Pat"] * len(families),
+        "Email": [f"{name.lower()}@example.org" for name in families],
+        "Finished Hours": total_hours,
+        "Total Hours": total_hours,
+        "Target Hours": [10.0] * len(families),
+    }).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+class FakeHttpError(Exception):
+    pass
+
+
+def http_error(status):
+    """Returns the googleapiclient HttpError the real client raises for an HTTP error status."""
+    from types import SimpleNamespace
+
+    from googleapiclient.errors import HttpError
+
+    return HttpError(SimpleNamespace(status=status, reason=f"HTTP {status}"), b"")
+
+
+class _Request:
+    """One API request; execute() answers it and records one HTTP request."""
+
+    def __init__(self, service, method, answer):
+        self.service = service
+        self.method = method
+        self.answer = answer
+
+    def execute(self):
+        self.service.record(self.method)
+        return self.answer()
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request, request_id))
+
+    def execute(self):
+        self.service.record("batch")
+        for request, request_id in self.requests:
+            try:
+                response, exception = request.answer(), None
+            except Exception as e:
+                response, exception = None, e
+            self.callback(request_id, response, exception)
+
+
+class _Resource:
+    """Resolves chained calls like service.users().messages().get(...) to the fake's methods."""
+
+    def __init__(self, service, path):
+        self._service = service
+        self._path = path
+
+    def __getattr__(self, name):
+        path = f"{self._path}.{name}" if self._path else name
+        # Looked up on the class: the service's own __getattr__ would resolve any name.
+        handler = getattr(type(self._service), f"_{path.replace('.', '_')}", None)
+        if handler is not None:
+            return lambda **kwargs: _Request(self._service, path, lambda: handler(self._service, **kwargs))
+        return lambda: _Resource(self._service, path)
+
+
+class _FakeService:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()
+
+    def record(self, method):
+        with self.lock:
+            self.requests[method] += 1
+
+    def __getattr__(self, name):
+        return getattr(_Resource(self, ""), name)
+
+
+class FakeGmail(_FakeService):
+    """
+    A Gmail mailbox of unread report emails. add_message() adds one email with report
+    attachments; unread() returns the IDs still labelled UNREAD.
+
+    Every added message bumps the mailbox historyId. Lists return at most page_size
+    results per page; history older than oldest_history_id is gone (404). Getting a whole
+    message in failing_ids, or the headers of one in failing_header_ids, fails with a 500.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.messages = {}
+        self.attachments = {}
+        self._ids = itertools.count(1)
+        self.history_id = 1000
+        self.history = []
+        self.oldest_history_id = 0
+        self.page_size = 100
+        self.queries = []
+        self.failing_ids = set()
+        self.failing_header_ids = set()
+
+    def add_message(self, *attachments):
+        """Adds an unread report email with the given (filename, bytes) attachments. Returns its ID."""
+        msg_id = f"msg{next(self._ids)}"
+        parts = []
+        for filename, data in attachments:
+            attachment_id = f"{msg_id}-att{len(parts)}"
+            self.attachments[(msg_id, attachment_id)] = data
+            parts.append({"filename": filename, "body": {"attachmentId": attachment_id, "size": len(data)}})
+        self.messages[msg_id] = {
+            "id": msg_id,
+            "labelIds": ["UNREAD", "INBOX"],
+            "payload": {
+                "headers": [{"name": "From", "value": REPORT_SENDER}, {"name": "Subject", "value": REPORT_SUBJECT}],
+                "parts": parts,
+            },
+        }
+        self.history_id += 1
+        self.history.append((self.history_id, msg_id))
+        return msg_id
+
+    def unread(self):
+        return [msg_id for msg_id, message in self.messages.items() if "UNREAD" in message["labelIds"]]
+
+    def new_batch_http_request(self, callback):
+        return _Batch(self, callback)
+
+    def _page(self, key, items, page_token):
+        start = int(page_token or 0)
+        result = {key: items[start:start + self.page_size]}
+        if start + self.page_size < len(items):
+            result["nextPageToken"] = str(start + self.page_size)
+        return result
+
+    def _users_getProfile(self, userId):
+        return {"emailAddress": "reports@example.org", "historyId": str(self.history_id)}
+
+    def _users_history_list(self, userId, startHistoryId, historyTypes=None, pageToken=None):
+        if int(startHistoryId) < self.oldest_history_id:
+            raise http_error(404)
+        records = [
+            {"id": str(history_id), "messagesAdded": [{"message": {"id": msg_id}}]}
+            for history_id, msg_id in self.history
+            if history_id > int(startHistoryId)
+        ]
+        return {**self._page("history", records, pageToken), "historyId": str(self.history_id)}
+
+    def _users_messages_list(self, userId, q, pageToken=None):
+        if pageToken is None:
+            self.queries.append(q)
+        return self._page("messages", [{"id": msg_id} for msg_id in self.unread()], pageToken)
+
+    def _users_messages_get(self, userId, id, format=None, **kwargs):
+        if id in (self.failing_header_ids if format == "metadata" else self.failing_ids):
+            raise http_error(500)
+        if id not in self.messages:
+            raise FakeHttpError(f"Message {id} not found")
+        return self.messages[id]
+
+    def _users_messages_attachments_get(self, userId, messageId, id):
+        data = self.attachments[(messageId, id)]
+        # Gmail sends base64url without padding.
+        return {"size": len(data), "data": base64.urlsafe_b64encode(data).decode().rstrip("=")}
+
+    def _users_messages_modify(self, userId, id, body):
+        self._remove_labels([id], body["removeLabelIds"])
+        return {"id": id}
+
+    def _users_messages_batchModify(self, userId, body):
+        self._remove_labels(body["ids"], body["removeLabelIds"])
+        return {}
+
+    def _remove_labels(self, msg_ids, labels):
+        with self.lock:
+            for msg_id in msg_ids:
+                self.messages[msg_id]["labelIds"] = [label for label in self.messages[msg_id]["labelIds"] if label not in labels]
+
+
+class _Upload:
+    """A resumable upload that completes in one chunk."""
+
+    def __init__(self, drive, body, media_body):
+        self.drive = drive
+        self.body = body
+        self.media_body = media_body
+
+    def next_chunk(self, num_retries=0):
+        self.drive.record("files.create")
+        data = self.media_body.getbytes(0, self.media_body.size())
+        self.media_body.stream().close()
+        return None, self.drive.add_file(self.body, data)
+
+
+class FakeDrive(_FakeService):
+    """A Google Drive holding a "Reports" folder. Folders and uploaded files are kept in `stored` by ID."""
+
+    FOLDER = "application/vnd.google-apps.folder"
+
+    def __init__(self):
+        super().__init__()
+        self.stored = {}
+        self._ids = itertools.count(1)
+        self.add_file({"name": "Reports", "mimeType": self.FOLDER}, None)
+
+    def add_file(self, body, data):
+        with self.lock:
+            file_id = f"file{next(self._ids)}"
+            self.stored[file_id] = {**body, "id": file_id, "data": data}
+        return {"id": file_id}
+
+    def uploads(self):
+        return [file for file in self.stored.values() if file.get("mimeType") != self.FOLDER]
+
+    def files(self):
+        return _DriveFiles(self)
+
+    def _files_list(self, q, fields=None):
+        name = q.split("name='")[1].split("'")[0]
+        parent = q.split(" and '")[1].split("'")[0] if " and '" in q else None
+        matches = [
+            {"id": file["id"], "name": file["name"]}
+            for file in list(self.stored.values())
+            if file["name"] == name and file.get("mimeType") == self.FOLDER and (parent is None or parent in file.get("parents", []))
+        ]
+        return {"files": matches}
+
+
+class _DriveFiles:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, **kwargs):
+        return _Request(self.drive, "files.list", lambda: self.drive._files_list(**kwargs))
+
+    def create(self, body, fields=None, media_body=None):
+        if media_body is not None:
+            return _Upload(self.drive, body, media_body)
+        return _Request(self.drive, "files.create", lambda: self.drive.add_file(body, None))
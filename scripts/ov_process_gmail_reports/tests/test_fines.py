@@ -0,0 +1,155 @@
+import importlib
+
+import duckdb
+import pandas as pd
+import pytest
+
+import data_lake
+import fines
+
+POLICIES = {
+    "parking": {"required_hours": 3.0, "fine_per_hour": 100.0},
+    "volunteer": {"required_hours": None, "fine_per_hour": 20.0},
+}
+
+# Latest report of each snapshot: (report_type, report_date, report_id, rows of (Last Name, Total Hours, Target Hours)).
+SNAPSHOTS = [
+    ("parking", "2025-09-01", "p1", [("Ames", 0.0, 10.0), ("Baker", 1.5, 10.0), ("Cruz", 3.0, 10.0), ("Diaz", 4.0, 10.0)]),
+    ("parking", "2025-10-01", "p2", [("Ames", 2.0, 10.0), ("Baker", 3.5, 10.0), ("Cruz", None, 10.0)]),
+    ("volunteer", "2025-10-01", "v1", [("Ames", 12.0, 10.0), ("Baker", 7.25, 10.0), ("Cruz", 0.0, None)]),
+]
+
+
+def report_rows(report_type, report_date, report_id, rows, processed_timestamp="2025-10-02T00:00:00"):
+    return pd.DataFrame({
+        "Last Name": [name for name, _, _ in rows],
+        "First Name": ["Pat"] * len(rows),
+        "Email": [f"{name.lower()}@example.org" for name, _, _ in rows],
+        "Finished Hours": [total for _, total, _ in rows],
+        "Total Hours": [total for _, total, _ in rows],
+        "Target Hours": [target for _, _, target in rows],
+        "report_id": report_id,
+        "report_type": report_type,
+        "report_date": report_date,
+        "processed_timestamp": processed_timestamp,
+    })
+
+
+@pytest.fixture
+def lake(tmp_path):
+    """A data lake of SNAPSHOTS, plus an older report of the first snapshot that only the latest one should replace."""
+    lake_dir = str(tmp_path / "data_lake")
+    stale = report_rows("parking", "2025-09-01", "p0", [("Ames", 9.0, 10.0)], processed_timestamp="2025-09-01T00:00:00")
+    data_lake.write_report(stale, lake_dir, "parking", "2025-09-01", "p0")
+    for report_type, report_date, report_id, rows in SNAPSHOTS:
+        data_lake.write_report(report_rows(report_type, report_date, report_id, rows), lake_dir, report_type, report_date, report_id)
+    return lake_dir
+
+
+@pytest.fixture
+def latest_rows():
+    return pd.concat([report_rows(*snapshot) for snapshot in SNAPSHOTS], ignore_index=True)
+
+
+def query(sql):
+    con = duckdb.connect()
+    try:
+        return con.execute(sql).fetchdf()
+    finally:
+        con.close()
+
+
+def test_parking_fines_charge_each_missing_hour():
+    df = pd.DataFrame({"Total Hours": [0.0, 1.5, 3.0, 4.0, None], "Target Hours": [10.0] * 5})
+    result = fines.compute_fines(df, report_type="parking", policies=POLICIES)
+    assert result["required_hours"].tolist() == [3.0] * 5
+    assert result["hours_owing"].tolist() == [3.0, 1.5, 0.0, 0.0, 3.0]
+    assert result["fine_amount"].tolist() == [300.0, 150.0, 0.0, 0.0, 300.0]
+    assert result["completed"].tolist() == [False, False, True, True, False]
+
+
+def test_volunteer_fines_use_each_familys_target():
+    df = pd.DataFrame({"Total Hours": [12.0, 7.25, 0.0], "Target Hours": [10.0, 10.0, None]})
+    result = fines.compute_fines(df, report_type="volunteer", policies=POLICIES)
+    # More hours than required is a negative shortfall: nothing owing, not a credit.
+    assert result["hours_owing"].tolist() == [0.0, 2.75, 0.0]
+    assert result["fine_amount"].tolist() == [0.0, 55.0, 0.0]
+    assert result["completed"].tolist() == [True, False, True]
+
+
+def test_unknown_report_type_is_rejected():
+    df = pd.DataFrame({"report_type": ["parking", "bake-sale"], "Total Hours": [1.0, 1.0]})
+    with pytest.raises(ValueError, match="bake-sale"):
+        fines.compute_fines(df, policies=POLICIES)
+
+
+def test_owing_families_largest_fine_first():
+    df = pd.DataFrame({"Last Name": ["Ames", "Baker", "Cruz"], "Total Hours": [2.0, 0.0, 5.0]})
+    owing = fines.owing_families(fines.compute_fines(df, report_type="parking", policies=POLICIES))
+    assert owing["Last Name"].tolist() == ["Baker", "Ames"]
+
+
+@pytest.fixture
+def reload_fines(monkeypatch):
+    """Reloads fines after the test's setenv calls, and again with the original environment afterwards."""
+    yield lambda: importlib.reload(fines)
+    monkeypatch.undo()
+    importlib.reload(fines)
+
+
+def test_policies_come_from_the_environment(monkeypatch, reload_fines):
+    monkeypatch.setenv("PARKING_REQUIRED_HOURS", "5")
+    monkeypatch.setenv("PARKING_FINE_PER_HOUR", "20")
+    monkeypatch.setenv("VOLUNTEER_FINE_PER_HOUR", "7.5")
+    reloaded = reload_fines()
+    assert reloaded.FINE_POLICIES == {
+        "parking": {"required_hours": 5.0, "fine_per_hour": 20.0},
+        "volunteer": {"required_hours": None, "fine_per_hour": 7.5},
+    }
+    result = reloaded.compute_fines(pd.DataFrame({"Total Hours": [1.0]}), report_type="parking")
+    assert result["fine_amount"].tolist() == [80.0]
+
+
+def test_default_policies(monkeypatch, reload_fines):
+    for name in ("PARKING_REQUIRED_HOURS", "PARKING_FINE_PER_HOUR", "VOLUNTEER_FINE_PER_HOUR"):
+        monkeypatch.delenv(name, raising=False)
+    assert reload_fines().FINE_POLICIES == {
+        "parking": {"required_hours": 3.0, "fine_per_hour": 100.0},
+        "volunteer": {"required_hours": None, "fine_per_hour": 0.0},
+    }
+
+
+def test_sql_matches_pandas_row_by_row(lake, latest_rows):
+    expected = fines.compute_fines(latest_rows, policies=POLICIES)
+    actual = query(f"SELECT * FROM ({fines.fines_sql(fines.data_lake_sql(lake), POLICIES)}) ORDER BY report_id, \"Last Name\"")
+    expected = expected.sort_values(["report_id", "Last Name"], ignore_index=True)
+    for column in ["Last Name", "report_type", "report_date", *fines.FINE_COLUMNS]:
+        assert actual[column].tolist() == expected[column].tolist(), column
+
+
+def test_season_sql_matches_pandas(lake, latest_rows):
+    priced = fines.compute_fines(latest_rows, policies=POLICIES)
+    expected = (
+        priced.assign(owing=~priced["completed"])
+        .groupby(["report_type", "report_date"], as_index=False)
+        .agg(families=("Last Name", "size"), owing_families=("owing", "sum"), hours_owing=("hours_owing", "sum"), fines=("fine_amount", "sum"))
+    )
+    actual = query(fines.season_sql(lake, policies=POLICIES))
+    assert actual.to_dict("records") == expected.to_dict("records")
+
+
+def test_season_sql_for_one_report_type(lake):
+    actual = query(fines.season_sql(lake, report_type="parking", policies=POLICIES))
+    assert actual["report_date"].tolist() == ["2025-09-01", "2025-10-01"]
+    assert actual["fines"].tolist() == [450.0, 400.0]
+
+
+def test_snapshot_owing_sql_matches_pandas(lake, latest_rows):
+    snapshot = latest_rows.loc[latest_rows["report_date"] == "2025-10-01"]
+    expected = pd.concat(
+        fines.owing_families(fines.compute_fines(rows, policies=POLICIES)) for _, rows in snapshot.groupby("report_type")
+    )
+    actual = query(fines.snapshot_owing_sql(lake, report_date="2025-10-01", policies=POLICIES))
+    assert actual[["report_type", "Last Name", "hours_owing", "fine_amount"]].to_dict("records") == (
+        expected[["report_type", "Last Name", "hours_owing", "fine_amount"]].to_dict("records")
+    )
@@ -0,0 +1,46 @@
+import duckdb
+import pandas as pd
+
+import data_lake
+import load_db
+
+
+def report_rows(report_id, families, report_type="parking", report_date="2025-09-01"):
+    return pd.DataFrame({
+        "Last Name": families,
+        "First Name": ["Pat"] * len(families),
+        "Email": [f"{name.lower()}@example.org" for name in families],
+        "Total Hours": [1.0] * len(families),
+        "Target Hours": [10.0] * len(families),
+        "report_id": report_id,
+        "report_type": report_type,
+        "report_date": report_date,
+    })
+
+
+def test_legacy_flat_files_are_migrated_and_loaded(tmp_path, monkeypatch):
+    lake_dir = tmp_path / "data_lake"
+    monkeypatch.setattr(load_db, "DATA_LAKE_DIR", str(lake_dir))
+    monkeypatch.setattr(load_db, "DB_FILE", str(tmp_path / "onvolunteers.db"))
+    data_lake.write_report(report_rows("new", ["Ames", "Baker"], report_date="2025-10-01"), str(lake_dir), "parking", "2025-10-01", "new")
+    # The old layout: flat files holding the partition columns in every row.
+    report_rows("old", ["Cruz"]).to_parquet(lake_dir / "parking-2025-09-01-1234.parquet")
+
+    load_db.load_data(threads=1)
+
+    assert not list(lake_dir.glob("*.parquet"))
+    assert [path.name for path in lake_dir.glob("report_type=parking/report_date=2025-09-01/*.parquet")] == ["parking-2025-09-01-1234.parquet"]
+    con = duckdb.connect(load_db.DB_FILE, read_only=True)
+    try:
+        rows = con.execute('SELECT report_id, report_date, "Last Name" FROM parking_hours ORDER BY "Last Name"').fetchall()
+    finally:
+        con.close()
+    assert rows == [("new", "2025-10-01", "Ames"), ("new", "2025-10-01", "Baker"), ("old", "2025-09-01", "Cruz")]
+
+    # A second load finds nothing new.
+    load_db.load_data(threads=1)
+    con = duckdb.connect(load_db.DB_FILE, read_only=True)
+    try:
+        assert con.execute("SELECT count(*) FROM parking_hours").fetchone()[0] == 3
+    finally:
+        con.close()
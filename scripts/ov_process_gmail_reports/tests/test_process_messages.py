@@ -0,0 +1,146 @@
+import os
+from datetime import date, timedelta
+
+import pytest
+
+from fake_google import report_bytes
+
+REPORT_NAME = "OnVolunteers_Volunteer_Hours_Report2025-10-01__a.xlsx"
+
+
+def run(ov, gmail, drive, workers, batch_size, service_pool=None):
+    messages = [{"id": msg_id} for msg_id in gmail.unread()]
+    reports_folder_id = ov.get_reports_folder_id(drive)
+    return ov.process_messages(gmail, drive, messages, reports_folder_id, workers=workers, batch_size=batch_size, service_pool=service_pool)
+
+
+def report_files(ov):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), ov.REPORTS_DIR)
+        for root, _, names in os.walk(ov.REPORTS_DIR)
+        for name in names
+        if name.endswith(".xlsx")
+    )
+
+
+@pytest.mark.parametrize("batch_size", [0, 50])
+def test_same_named_attachments_with_workers(ov_module, gmail, drive, batch_size):
+    # Different reports under the same attachment name, processed at the same time.
+    for seed in range(2):
+        gmail.add_message((REPORT_NAME, report_bytes([1.0 + seed, 2.0, 0.5])))
+
+    jobs = run(ov_module, gmail, drive, workers=4, batch_size=batch_size)
+
+    assert [job.error for job in jobs] == [None, None]
+    assert gmail.unread() == []
+    assert len(drive.uploads()) == 2
+    files = report_files(ov_module)
+    assert len(files) == 2 and all(name.startswith("parking-hours" + os.sep) for name in files)
+    assert not os.listdir(ov_module.INCOMING_DIR)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_same_report_twice(ov_module, gmail, drive, workers):
+    # The same report, byte for byte and under the same name, in two emails.
+    data = report_bytes([1.0, 2.0, 0.5])
+    for _ in range(2):
+        gmail.add_message((REPORT_NAME, data))
+
+    jobs = run(ov_module, gmail, drive, workers=workers, batch_size=50)
+
+    assert [job.error for job in jobs] == [None, None]
+    assert gmail.unread() == []
+    assert len(drive.uploads()) == 1
+    assert report_files(ov_module) == [os.path.join("parking-hours", "parking-hours-2025-10-01.xlsx")]
+    assert not os.listdir(ov_module.INCOMING_DIR)
+    assert len(ov_module._get_report_index()["reports"]) == 1
+
+
+def test_finished_jobs_keep_only_summaries(ov_module, gmail, drive):
+    gmail.add_message((REPORT_NAME, report_bytes([1.0, 2.0, 0.5])))
+    gmail.add_message(("OnVolunteers_Volunteer_Hours_Report2025-10-02__a.xlsx", report_bytes([6.0, 8.0, 5.0])))
+
+    jobs = run(ov_module, gmail, drive, workers=4, batch_size=50)
+
+    for job in jobs:
+        assert set(job.payload) == {"msg_id", "reports"}
+        assert job.records == []
+        for report in job.payload["reports"]:
+            assert set(report) <= set(ov_module.REPORT_SUMMARY_KEYS)
+    assert [report["report_type"] for job in jobs for report in job.payload["reports"]] == ["parking", "volunteer"]
+
+
+@pytest.mark.parametrize("batch_size, expected", [
+    # One batch of messages, one of attachments and one batchModify per 50 emails.
+    (50, {"batch": 4, "users.messages.batchModify": 2}),
+    (0, {"users.messages.get": 60, "users.messages.attachments.get": 60, "users.messages.modify": 60}),
+])
+def test_gmail_requests(ov_module, gmail, drive, batch_size, expected):
+    for day in range(60):
+        report_date = date(2025, 9, 1) + timedelta(days=day)
+        gmail.add_message((f"OnVolunteers_Volunteer_Hours_Report{report_date}__a.xlsx", report_bytes([1.0, 2.0, day / 30])))
+
+    jobs = run(ov_module, gmail, drive, workers=4, batch_size=batch_size)
+
+    assert all(job.error is None for job in jobs)
+    assert gmail.requests == expected
+    assert gmail.unread() == []
+    assert len(drive.uploads()) == 60
+
+
+def test_prefetch_bounded_by_bytes(ov_module, gmail, drive, monkeypatch):
+    sizes = []
+    for day in range(1, 7):
+        data = report_bytes([1.0, 2.0, day / 2])
+        sizes.append(len(data))
+        gmail.add_message((f"OnVolunteers_Volunteer_Hours_Report2025-10-0{day}__a.xlsx", data))
+    # Room for the attachments of two emails per batch, not three.
+    monkeypatch.setattr(ov_module, "GMAIL_PREFETCH_BYTES", 2 * max(sizes) + min(sizes) - 1)
+
+    jobs = run(ov_module, gmail, drive, workers=2, batch_size=50)
+
+    assert all(job.error is None for job in jobs)
+    # One batch of messages, then three of attachments.
+    assert gmail.requests == {"batch": 4, "users.messages.batchModify": 1}
+    assert gmail.unread() == []
+    assert len(drive.uploads()) == 6
+
+
+def test_drive_folders_cached_across_runs(ov_module, gmail, drive, monkeypatch):
+    for day in range(1, 4):
+        gmail.add_message((f"OnVolunteers_Volunteer_Hours_Report2025-10-0{day}__a.xlsx", report_bytes([1.0, 2.0, day / 2])))
+    run(ov_module, gmail, drive, workers=2, batch_size=50)
+    # Reports is looked up, parking-hours is looked up and created; later uploads use the cache.
+    assert drive.requests == {"files.list": 2, "files.create": 4}
+
+    # A new run reads the folder IDs from the cache file instead of asking Drive.
+    monkeypatch.setattr(ov_module, "_gdrive_folder_cache", None)
+    gmail.add_message(("OnVolunteers_Volunteer_Hours_Report2025-10-04__a.xlsx", report_bytes([1.0, 2.5])))
+    run(ov_module, gmail, drive, workers=1, batch_size=50)
+    assert drive.requests == {"files.list": 2, "files.create": 5}
+
+    # An unchanged file is not uploaded again.
+    path = os.path.join(ov_module.REPORTS_DIR, "parking-hours", "parking-hours-2025-10-04.xlsx")
+    folder_id = drive.uploads()[-1]["parents"][0]
+    assert ov_module.upload_to_gdrive(drive, path, folder_id) == drive.uploads()[-1]["id"]
+    assert drive.requests["files.create"] == 5
+
+
+def test_worker_services_reused_across_runs(ov_module, gmail, drive):
+    built = []
+
+    def factory():
+        built.append((gmail, drive))
+        return built[-1]
+
+    pool = ov_module.ServicePool(factory)
+    for cycle in range(3):
+        for day in range(1, 5):
+            gmail.add_message((f"OnVolunteers_Volunteer_Hours_Report2025-1{cycle}-0{day}__a.xlsx", report_bytes([1.0, 2.0, day / 2])))
+        jobs = run(ov_module, gmail, drive, workers=2, batch_size=50, service_pool=pool)
+        assert all(job.error is None for job in jobs)
+
+    # Every cycle uses at least one thread per stage; without reuse three cycles would build 9 or more.
+    # With it, no more are built than the 6 threads (2 each for download, upload and mark) that use them.
+    assert 0 < len(built) <= 6
+    assert gmail.unread() == []
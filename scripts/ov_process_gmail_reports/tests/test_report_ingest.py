@@ -0,0 +1,71 @@
+import io
+from datetime import datetime, time
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import report_reader
+from report_ingest import Report
+
+ENGINES = ["openpyxl", "stream"] + (["calamine"] if report_reader.calamine_available() else [])
+
+HEADER = ["Last Name", "Email", "Total Hours", "Target Hours", "Shift", "Signed Up", "Start", "Confirmed", "Note"]
+ROWS = [
+    ["Ames", "ames@example.org", 3, 10, 2, datetime(2025, 9, 1, 8, 30), time(8, 30), True, "late"],
+    ["Baker", None, 1.5, 10, None, datetime(2025, 9, 2), time(9), False, None],
+    ["Cruz", "cruz@example.org", 0, None, 4.25, None, None, None, 17],
+]
+
+
+def workbook_bytes(header, rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_rows_hash_is_the_same_for_every_engine(engine):
+    # Shift onwards are not in db_setup.REPORT_COLUMNS, so each engine keeps its own types for them:
+    # the stream engine reads Confirmed as True/False/None where pandas reads 1.0/0.0/NaN.
+    data = workbook_bytes(HEADER, ROWS)
+    assert Report(data, "report.xlsx", engine=engine).rows_hash == Report(data, "report.xlsx", engine="openpyxl").rows_hash
+
+
+def test_rows_hash_ignores_row_and_column_order():
+    reordered = [HEADER[::-1]] + [row[::-1] for row in ROWS[::-1]]
+    data = workbook_bytes(HEADER, ROWS)
+    assert Report(workbook_bytes(reordered[0], reordered[1:]), "b.xlsx").rows_hash == Report(data, "a.xlsx").rows_hash
+
+
+def test_rows_hash_changes_with_the_data():
+    changed = [row[:] for row in ROWS]
+    changed[1][2] = 2.5
+    assert Report(workbook_bytes(HEADER, changed), "b.xlsx").rows_hash != Report(workbook_bytes(HEADER, ROWS), "a.xlsx").rows_hash
+
+
+def test_rows_hash_tells_missing_from_zero():
+    blank = [row[:] for row in ROWS]
+    blank[1][4] = 0
+    assert Report(workbook_bytes(HEADER, blank), "b.xlsx").rows_hash != Report(workbook_bytes(HEADER, ROWS), "a.xlsx").rows_hash
+
+
+def test_stream_keeps_duplicate_headers_like_pandas():
+    header = ["Name", "Total Hours", "Name", None, "Name.1", "Total Hours", "Name"]
+    rows = [["a", 1, "b", 2, "c", 3.5, "d"], ["e", 2.0, "f", None, "g", 4, "h"]]
+    data = workbook_bytes(header, rows)
+
+    stream = report_reader.read_report(data, engine="stream")
+    expected = report_reader.read_report(data, engine="openpyxl")
+
+    assert stream.columns.tolist() == expected.columns.tolist() == [
+        "Name", "Total Hours", "Name.2", "Unnamed: 3", "Name.1", "Total Hours.1", "Name.3",
+    ]
+    assert stream["Name.2"].tolist() == ["b", "f"]
+    assert stream["Total Hours.1"].tolist() == [3.5, 4.0]
+    pd.testing.assert_frame_equal(stream.astype(str), expected.astype(str))
@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from openpyxl import load_workbook
+
+import report_writer
+
+ENGINES = ["openpyxl"] + (["xlsxwriter"] if report_writer.xlsxwriter_available() else [])
+
+
+def read_sheet(path, sheet_name="Report"):
+    return load_workbook(path)[sheet_name]
+
+
+def widths(worksheet, count):
+    """Column widths by position; xlsxwriter stores a run of equal widths as one column range."""
+    by_column = {}
+    for dimension in worksheet.column_dimensions.values():
+        for column in range(dimension.min, dimension.max + 1):
+            by_column[column] = dimension.width
+    return [by_column.get(column) for column in range(1, count + 1)]
+
+
+def test_column_widths_from_the_header_and_sample():
+    sample = [("Ames", 12.5, None), ("Baker-Cruz", 0.1 + 0.2, None)]
+    # Floats are measured as Excel's General format shows them: 0.30000000000000004 as 0.3.
+    assert report_writer.column_widths(["Name", "Hours", "Note"], sample) == [12, 7, 6]
+    # A known length wins over the sample, but never makes a column narrower than its header.
+    assert report_writer.column_widths(["Name", "Hours", "Note"], sample, {"Name": 30, "Note": 1}) == [32, 7, 6]
+    assert report_writer.column_widths(["Note"], [("x" * 100,)]) == [report_writer.MAX_COLUMN_WIDTH]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_widths_are_sampled_unless_exact(tmp_path, monkeypatch, engine):
+    monkeypatch.setattr(report_writer, "WIDTH_SAMPLE_ROWS", 2)
+    sql = "SELECT * FROM (VALUES ('Ames', 1), ('Baker', 2), ('Featherstonehaugh', 3)) AS t(Name, Hours)"
+
+    sampled = report_writer.write_workbook(str(tmp_path / "sampled.xlsx"), {"Report": sql}, engine)
+    exact = report_writer.write_workbook(str(tmp_path / "exact.xlsx"), {"Report": sql}, engine, exact_widths=True)
+
+    # xlsxwriter stores widths with its own padding, so compare to the nearest character.
+    assert widths(read_sheet(sampled), 2) == pytest.approx([7, 7], abs=1)
+    assert widths(read_sheet(exact), 2) == pytest.approx([19, 7], abs=1)
+    # Every row is written, whichever rows sized the columns.
+    assert [row[0] for row in read_sheet(exact).iter_rows(min_row=2, values_only=True)] == ["Ames", "Baker", "Featherstonehaugh"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_equals_sign_cells_stay_text(tmp_path, engine):
+    df = pd.DataFrame({"Name": ["=HYPERLINK(\"http://example.org\")", "Ames"], "Note": ["=1+1", "http://example.org"], "Hours": [1.0, 2.0]})
+
+    path = report_writer.write_workbook(str(tmp_path / "notes.xlsx"), {"Report": df}, engine)
+
+    worksheet = read_sheet(path)
+    assert [[cell.value for cell in row] for row in worksheet.iter_rows(min_row=2)] == df.values.tolist()
+    assert {cell.data_type for row in worksheet.iter_rows(min_row=2, max_col=2) for cell in row} == {"s"}
+
+
+def failing_batches():
+    schema = pa.schema([("Name", pa.string())])
+
+    def batches():
+        yield pa.record_batch([pa.array(["Ames"] * 10)], schema=schema)
+        raise RuntimeError("query failed")
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_failed_write_leaves_no_partial_workbook(tmp_path, engine):
+    path = tmp_path / "fines.xlsx"
+    report_writer.write_workbook(str(path), {"Report": pd.DataFrame({"Name": ["Baker"]})}, engine)
+
+    with pytest.raises(RuntimeError, match="query failed"):
+        report_writer.write_workbook(str(path), {"Report": failing_batches()}, engine)
+
+    # The temp file is gone and the previous workbook is untouched.
+    assert os.listdir(tmp_path) == ["fines.xlsx"]
+    assert [row[0] for row in read_sheet(path).iter_rows(values_only=True)] == ["Name", "Baker"]
+
+
+def test_split_jobs_writes_one_workbook_per_group_in_parallel(tmp_path):
+    df = pd.DataFrame({
+        "Activity": ["Parking Lot", "Bake Sale", "Parking Lot", "Bake Sale", "Car/Wash"],
+        "Last Name": ["Ames", "Baker", "Cruz", "Diaz", "Evans"],
+        "Total Hours": [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+    jobs = report_writer.split_jobs(df, "Activity", str(tmp_path / "hours-{value}.xlsx"))
+
+    paths = report_writer.write_workbooks(jobs, workers=2)
+
+    assert [os.path.basename(path) for path in paths] == ["hours-Bake_Sale.xlsx", "hours-Car_Wash.xlsx", "hours-Parking_Lot.xlsx"]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in paths)
+    rows = {os.path.basename(path): list(read_sheet(path).iter_rows(values_only=True)) for path in paths}
+    assert rows["hours-Parking_Lot.xlsx"] == [("Last Name", "Total Hours"), ("Ames", 1), ("Cruz", 3)]
+    assert rows["hours-Car_Wash.xlsx"] == [("Last Name", "Total Hours"), ("Evans", 5)]
@@ -0,0 +1,65 @@
+"""
+Start-up budget of the `ov` commands: `--help` must not import pandas, DuckDB, the Google
+clients or Playwright. Same measure as `benchmark.py startup`, in a fresh interpreter.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+OV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ov.py")
+
+# Milliseconds a command may take over a bare `python -c pass`.
+STARTUP_BUDGET_MS = 100
+
+RUNS = 5
+
+# googleapiclient.errors is cheap and imported for its HttpError; the discovery client is not.
+HEAVY_MODULES = {"pandas", "numpy", "duckdb", "openpyxl", "googleapiclient.discovery", "google_auth_oauthlib", "playwright"}
+
+
+def best_ms(command):
+    """Best wall time of RUNS runs of command, in milliseconds."""
+    import time
+
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+@pytest.fixture(scope="module")
+def baseline_ms():
+    return best_ms([sys.executable, "-c", "pass"])
+
+
+COMMANDS = [
+    [],
+    ["process"],
+    ["reports"],
+    ["identify"],
+    ["analyze"],
+    ["query"],
+    ["load-db"],
+    ["fines"],
+    ["excel"],
+    ["lake"],
+]
+
+
+@pytest.mark.parametrize("command", COMMANDS, ids=lambda command: " ".join(["ov", *command, "--help"]))
+def test_help_within_startup_budget(command, baseline_ms):
+    overhead = best_ms([sys.executable, OV, *command, "--help"]) - baseline_ms
+    assert overhead <= STARTUP_BUDGET_MS, f"{overhead:.1f} ms over a bare interpreter"
+
+
+@pytest.mark.parametrize("command", COMMANDS, ids=lambda command: " ".join(["ov", *command, "--help"]))
+def test_help_imports_no_heavy_module(command):
+    # -X importtime lists every module imported, on stderr.
+    result = subprocess.run([sys.executable, "-X", "importtime", OV, *command, "--help"], check=True, capture_output=True, text=True)
+    imported = {line.split("|")[-1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")}
+    assert not imported & HEAVY_MODULES
@@ -0,0 +1,114 @@
+import json
+from argparse import Namespace
+from datetime import datetime, timedelta
+
+from fake_google import report_bytes
+
+REPORT_NAME = "OnVolunteers_Volunteer_Hours_Report2025-10-01__a.xlsx"
+SENDER = "no-reply@onvolunteers.com"
+SUBJECT = "Requested OnVolunteers Report"
+
+
+def add_messages(gmail, count):
+    return [gmail.add_message((REPORT_NAME, report_bytes([1.0 + i, 2.0]))) for i in range(count)]
+
+
+def checkpoint(ov):
+    with open(ov.HISTORY_CHECKPOINT_FILE) as f:
+        return json.load(f)
+
+
+def test_history_follows_every_page(ov_module, gmail):
+    add_messages(gmail, 2)
+    ov_module.save_sync_checkpoint(gmail.history_id)
+    new_ids = add_messages(gmail, 5)
+    gmail.page_size = 2
+
+    assert ov_module.list_history_message_ids(gmail, checkpoint(ov_module)["historyId"]) == new_ids
+    assert gmail.requests["users.history.list"] == 3
+
+
+def test_incremental_sync_returns_only_new_unread_reports(ov_module, gmail):
+    add_messages(gmail, 2)
+    ov_module.save_sync_checkpoint(gmail.history_id)
+    new_ids = add_messages(gmail, 3)
+    gmail.messages[new_ids[0]]["labelIds"].remove("UNREAD")
+    gmail.page_size = 2
+
+    messages, history_id = ov_module.sync_emails(gmail, SENDER, SUBJECT)
+
+    assert messages == [{"id": msg_id} for msg_id in new_ids[1:]]
+    assert history_id == str(gmail.history_id)
+    assert gmail.requests["users.messages.list"] == 0
+
+
+def test_expired_history_falls_back_to_a_full_search(ov_module, gmail):
+    ov_module.save_sync_checkpoint(gmail.history_id)
+    synced_at = datetime.fromisoformat(checkpoint(ov_module)["synced_at"])
+    msg_ids = add_messages(gmail, 5)
+    gmail.oldest_history_id = gmail.history_id
+    gmail.page_size = 2
+
+    messages, history_id = ov_module.sync_emails(gmail, SENDER, SUBJECT)
+
+    assert messages == [{"id": msg_id} for msg_id in msg_ids]
+    assert history_id == str(gmail.history_id)
+    assert gmail.requests["users.history.list"] == 1
+    assert gmail.requests["users.messages.list"] == 3
+    # The search goes back to the day before the last sync, not just to yesterday.
+    assert gmail.queries == [f"from:{SENDER} subject:{SUBJECT} is:unread after:{synced_at - timedelta(days=1):%Y/%m/%d}"]
+
+
+def test_first_sync_searches(ov_module, gmail):
+    msg_ids = add_messages(gmail, 3)
+
+    messages, history_id = ov_module.sync_emails(gmail, SENDER, SUBJECT)
+
+    assert messages == [{"id": msg_id} for msg_id in msg_ids]
+    assert history_id == str(gmail.history_id)
+    assert gmail.requests["users.history.list"] == 0
+
+
+def test_checkpoint_kept_when_headers_cannot_be_fetched(ov_module, gmail):
+    ov_module.save_sync_checkpoint(gmail.history_id)
+    failing, fetched = add_messages(gmail, 2)
+    gmail.failing_header_ids.add(failing)
+
+    messages, history_id = ov_module.sync_emails(gmail, SENDER, SUBJECT)
+
+    assert messages == [{"id": fetched}]
+    assert history_id is None
+
+
+def incremental_run(ov, gmail, drive):
+    args = Namespace(incremental=True, workers=1, keep_unread=False, batch_size=50)
+    ov.process_new_emails(gmail, drive, args)
+
+
+def test_checkpoint_saved_after_a_successful_run(ov_module, gmail, drive):
+    ov_module.save_sync_checkpoint(gmail.history_id)
+    add_messages(gmail, 2)
+
+    incremental_run(ov_module, gmail, drive)
+
+    assert gmail.unread() == []
+    assert checkpoint(ov_module)["historyId"] == str(gmail.history_id)
+
+
+def test_checkpoint_kept_when_an_email_fails(ov_module, gmail, drive):
+    ov_module.save_sync_checkpoint(gmail.history_id)
+    previous = checkpoint(ov_module)
+    failing, processed = add_messages(gmail, 2)
+    gmail.failing_ids.add(failing)
+
+    incremental_run(ov_module, gmail, drive)
+
+    assert gmail.unread() == [failing]
+    assert checkpoint(ov_module) == previous
+
+    # The next run starts from the same checkpoint, so the failed email is retried.
+    gmail.failing_ids.clear()
+    incremental_run(ov_module, gmail, drive)
+
+    assert gmail.unread() == []
+    assert checkpoint(ov_module)["historyId"] == str(gmail.history_id)
@@ -0,0 +1,275 @@
+"""
+Direct HTTP client for the OnVolunteers Built-in Reports page (Report.aspx).
+
+Report.aspx is an ASP.NET WebForms page: choosing a report and an activity and clicking
+"Generate Report" posts the whole form back to the page, together with its hidden
+__VIEWSTATE/__EVENTVALIDATION fields. ReportClient replays those postbacks over one
+pooled requests.Session, so a report costs an HTTP request instead of a browser
+round-trip. It does not log in by itself: it borrows the cookies of a Playwright login
+(see ReportGenerator in ov_reports_list.py).
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from datetime import date
+from html.parser import HTMLParser
+
+import requests
+
+POSTBACK_PATTERN = re.compile(r"__doPostBack\(\s*'([^']*)'\s*,\s*'([^']*)'\s*\)")
+FILENAME_PATTERN = re.compile(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', re.IGNORECASE)
+
+# Input types a browser never submits with the form.
+UNSUBMITTED_INPUT_TYPES = {"submit", "button", "image", "reset", "file"}
+
+class ReportRequestError(Exception):
+    """Raised when Report.aspx rejects a postback or the session is no longer logged in."""
+
+class WebForm(HTMLParser):
+    """The submitted fields, dropdowns and postback links of an ASP.NET WebForms page."""
+
+    def __init__(self, html):
+        super().__init__(convert_charrefs=True)
+        # name -> value of every control the browser would submit, hidden state fields included.
+        self.fields = {}
+        # id (or name) -> {"name": ..., "options": [(value, text), ...], "onchange": ...}
+        self.selects = {}
+        # link text -> (__EVENTTARGET, __EVENTARGUMENT) of javascript:__doPostBack(...) links.
+        self.postback_links = {}
+        self._select = None
+        self._option = None
+        self._link = None
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "input":
+            name = attrs.get("name")
+            kind = (attrs.get("type") or "text").lower()
+            if not name or kind in UNSUBMITTED_INPUT_TYPES:
+                return
+            if kind in ("checkbox", "radio") and "checked" not in attrs:
+                return
+            self.fields[name] = attrs.get("value") or ""
+        elif tag == "select":
+            self._select = {"name": attrs.get("name"), "options": [], "onchange": attrs.get("onchange") or "", "selected": None}
+            self.selects[attrs.get("id") or attrs.get("name")] = self._select
+        elif tag == "option" and self._select is not None:
+            self._option = {"value": attrs.get("value"), "text": "", "selected": "selected" in attrs}
+        elif tag == "a":
+            match = POSTBACK_PATTERN.search(attrs.get("href") or "")
+            self._link = {"postback": match.groups(), "text": ""} if match else None
+
+    def handle_data(self, data):
+        if self._option is not None:
+            self._option["text"] += data
+        if self._link is not None:
+            self._link["text"] += data
+
+    def handle_endtag(self, tag):
+        if tag == "option" and self._option is not None:
+            text = self._option["text"].strip()
+            value = self._option["value"] if self._option["value"] is not None else text
+            self._select["options"].append((value, text))
+            if self._option["selected"]:
+                self._select["selected"] = value
+            self._option = None
+        elif tag == "select" and self._select is not None:
+            options = self._select["options"]
+            if self._select["name"] and options:
+                self.fields[self._select["name"]] = self._select["selected"] if self._select["selected"] is not None else options[0][0]
+            self._select = None
+        elif tag == "a" and self._link is not None:
+            self.postback_links[" ".join(self._link["text"].split())] = self._link["postback"]
+            self._link = None
+
+class ReportClient:
+    """Requests OnVolunteers reports with direct Report.aspx postbacks over one HTTP session."""
+
+    def __init__(self, portal_url, timeout=60):
+        self.report_url = f"{portal_url}/Report.aspx"
+        self.timeout = timeout
+        # One Session pools the connections to the portal and keeps its cookies.
+        self.session = requests.Session()
+        # The current Report.aspx form; every postback response carries the next view state.
+        self.form = None
+
+    def load_cookies(self, cookies):
+        """Adds cookies in Playwright's format, e.g. from BrowserContext.cookies()."""
+        for cookie in cookies:
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+
+    def load_storage_state(self, path):
+        """Loads the cookies of a saved Playwright storage_state file. Returns False if there is none."""
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            self.load_cookies(json.load(f).get("cookies", []))
+        return True
+
+    def _parse(self, response):
+        """Checks that a response is Report.aspx itself (not an error or the login page) and parses its form."""
+        if not response.ok:
+            raise ReportRequestError(f"Report.aspx returned HTTP {response.status_code}.")
+        if not response.url.split("?")[0].lower() == self.report_url.lower():
+            raise ReportRequestError(f"Redirected to {response.url}; the session is not logged in.")
+        self.form = WebForm(response.text)
+        if "ddlReport" not in self.form.selects:
+            raise ReportRequestError("Report.aspx has no report dropdown; the session may not be in the admin portal.")
+        return response
+
+    def load_form(self):
+        """Loads a fresh Report.aspx form."""
+        return self._parse(self.session.get(self.report_url, timeout=self.timeout))
+
+    def is_logged_in(self):
+        """Returns True if the session can open Report.aspx."""
+        try:
+            self.load_form()
+            return True
+        except (requests.RequestException, ReportRequestError) as e:
+            logging.debug(f"HTTP session check failed: {e}")
+            return False
+
+    def postback(self, event_target, event_argument="", values=None, allow_attachment=False):
+        """
+        Posts the current form back with the given control values, as __doPostBack(event_target,
+        event_argument) would. With allow_attachment, a file response is returned as is
+        instead of being parsed as the next form.
+        """
+        data = dict(self.form.fields)
+        data.update(values or {})
+        data["__EVENTTARGET"] = event_target
+        data["__EVENTARGUMENT"] = event_argument
+        response = self.session.post(self.report_url, data=data, timeout=self.timeout)
+        if allow_attachment and response.ok and is_attachment(response):
+            return response
+        return self._parse(response)
+
+    def _option_value(self, select_id, text=None, value=None):
+        """Returns the name of a dropdown and the value of its option with the given text or value."""
+        select = self.form.selects.get(select_id)
+        if select is None:
+            raise ReportRequestError(f"Report.aspx has no #{select_id} dropdown.")
+        for option_value, option_text in select["options"]:
+            if (text is not None and option_text == text) or (value is not None and option_value == value):
+                return select["name"], option_value
+        raise ReportRequestError(f"#{select_id} has no option {text or value!r}.")
+
+    def select_report(self, report_name):
+        """Selects a report, posting back first if the dropdown re-renders the page (AutoPostBack)."""
+        name, value = self._option_value("ddlReport", text=report_name)
+        if self.form.fields.get(name) == value:
+            return
+        if "__doPostBack" in self.form.selects["ddlReport"]["onchange"]:
+            self.postback(name, values={name: value})
+        else:
+            self.form.fields[name] = value
+
+    def get_catalog(self):
+        """Returns {"reports": [...], "activities": [...]} (lists of {"id", "name"}) from the Report.aspx dropdowns."""
+        if self.form is None:
+            self.load_form()
+        reports = [{"id": value, "name": text} for value, text in self.form.selects["ddlReport"]["options"]]
+        # The activity dropdown belongs to the 'User Volunteer Hours' report.
+        self.select_report("User Volunteer Hours")
+        if "ddlActivity" not in self.form.selects:
+            raise ReportRequestError("Report.aspx has no #ddlActivity dropdown.")
+        activities = [{"id": value, "name": text} for value, text in self.form.selects["ddlActivity"]["options"]]
+        return {"reports": reports, "activities": activities}
+
+    def generate_user_volunteer_hours_report(self, activity_id):
+        """
+        Requests the 'User Volunteer Hours' report for an activity. Returns the report as
+        (filename, bytes) if the portal answers with the file, else None (it will be emailed).
+        """
+        return self.submit_report(activity_id, *self.select_user_volunteer_hours_report(activity_id))
+
+    def select_user_volunteer_hours_report(self, activity_id):
+        """
+        Selects the 'User Volunteer Hours' report and an activity without generating it. Returns
+        the (event_target, event_argument, values) of the "Generate Report" postback.
+        """
+        if self.form is None:
+            self.load_form()
+        self.select_report("User Volunteer Hours")
+        name, value = self._option_value("ddlActivity", value=str(activity_id))
+        if "Generate Report" not in self.form.postback_links:
+            raise ReportRequestError("Report.aspx has no 'Generate Report' postback link.")
+        event_target, event_argument = self.form.postback_links["Generate Report"]
+        return event_target, event_argument, {name: value}
+
+    def submit_report(self, activity_id, event_target, event_argument, values):
+        """Posts "Generate Report". Returns the report as (filename, bytes) if the portal answers with the file, else None."""
+        logging.info(f"Generating 'User Volunteer Hours' report for activity ID {activity_id} over HTTP.")
+        response = self.postback(event_target, event_argument, values=values, allow_attachment=True)
+        filename = attachment_filename(response, report_filename(activity_id))
+        if filename is None:
+            return None
+        logging.info(f"Captured {filename} ({len(response.content)} bytes).")
+        return filename, response.content
+
+    def generate_reports(self, activity_ids, retries=2, on_report_file=None):
+        """
+        Requests the 'User Volunteer Hours' report of every activity. One that fails before the
+        "Generate Report" postback is sent is retried up to `retries` times on a freshly loaded
+        form; one that fails after is not, since the portal may already be generating it. Report
+        files the portal returns are passed to on_report_file(activity_id, filename, data), which
+        returns True once it has processed one. Returns one result dict per activity, like
+        ReportGenerator.generate_reports.
+        """
+        results = []
+        for activity_id in activity_ids:
+            start = time.perf_counter()
+            error = None
+            captured = None
+            submitted = False
+            for attempt in range(1, retries + 2):
+                try:
+                    postback = self.select_user_volunteer_hours_report(activity_id)
+                    submitted = True
+                    captured = self.submit_report(activity_id, *postback)
+                    error = None
+                    break
+                except (requests.RequestException, ReportRequestError) as e:
+                    error = e
+                    # The view state may be stale or invalid; start over from a fresh form.
+                    self.form = None
+                    if submitted:
+                        logging.warning(f"HTTP report for activity ID {activity_id} failed after it was requested; not retrying, as it may still arrive by email: {e}")
+                        break
+                    logging.warning(f"HTTP report for activity ID {activity_id} failed (attempt {attempt} of {retries + 1}): {e}")
+            if captured and on_report_file:
+                captured = on_report_file(activity_id, *captured)
+            elif on_report_file and error is None:
+                logging.info(f"No file returned for activity ID {activity_id}; it will arrive by email.")
+            results.append({
+                "activity_id": activity_id, "engine": "http", "attempts": attempt, "seconds": time.perf_counter() - start,
+                "error": error, "submitted": submitted, "captured": bool(captured and on_report_file),
+            })
+        return results
+
+def is_attachment(response):
+    """Returns True if a response is a file download (Content-Disposition: attachment)."""
+    return "attachment" in response.headers.get("Content-Disposition", "").lower()
+
+def report_filename(activity_id, report_date=None):
+    """
+    Returns a filename for a 'User Volunteer Hours' report of an activity, in the form of the
+    emailed attachments, so the processing pipeline can read its date (default: today).
+    """
+    return f"OnVolunteers_Volunteer_Hours_Report{(report_date or date.today()).isoformat()}__activity-{activity_id}.xlsx"
+
+def attachment_filename(response, default=None):
+    """
+    Returns the filename of a file download response, or default if the response names no
+    file, or None if it is not a download.
+    """
+    if not is_attachment(response):
+        return None
+    match = FILENAME_PATTERN.search(response.headers["Content-Disposition"])
+    return os.path.basename(match.group(1)) if match else default
@@ -3,19 +3,24 @@
 This script logs in to OnVolunteers and provides an interactive way to generate reports.
 """
 
-import asyncio
+import importlib.util
+import json
 import os
-from playwright.async_api import async_playwright
+import sys
+import threading
+import time
 from dotenv import load_dotenv
 import argparse
 import logging
-import logging.config
+
+# Playwright and the HTTP client (ov_report_client, which needs requests) are imported where
+# they are used, so --help and cached catalog lookups never load them. asyncio is imported
+# once main() has parsed the arguments, so --help does not pay for it either.
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # --- Logging Configuration ---
 LOG_DIR = os.path.join(SCRIPT_DIR, "log")
-os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "ov_reports_list.log")
 
 LOGGING_CONFIG = {
@@ -45,37 +50,203 @@ LOGGING_CONFIG = {
     },
 }
 
-logging.config.dictConfig(LOGGING_CONFIG)
+def setup_logging(debug=False):
+    """Logs to LOG_FILE and the console (at DEBUG level with debug). Called by main(), not at import."""
+    import logging.config
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    if debug:
+        LOGGING_CONFIG["handlers"]["console"]["level"] = "DEBUG"
+    logging.config.dictConfig(LOGGING_CONFIG)
+
 load_dotenv(dotenv_path=os.path.join(SCRIPT_DIR, 'ov.env'))
 
+# Portal URLs. Override them in ov.env to run against a local stand-in of the portal.
+OV_LOGIN_URL = os.getenv("OV_LOGIN_URL", "http://sfx.onvolunteers.com")
+OV_PORTAL_URL = os.getenv("OV_PORTAL_URL", "https://portal.onvolunteers.com")
+REPORT_URL = f"{OV_PORTAL_URL}/Report.aspx"
+
+# --- Scripted Mode Configuration ---
+# Activities whose 'User Volunteer Hours' report --scripted generates, unless OV_ACTIVITY_IDS or --activities say otherwise.
+DEFAULT_ACTIVITY_IDS = [
+    30212, # Parking Patrol 2025-2026
+    0, # All Activities
+]
+
+# --- Lean Browser Configuration ---
+# Chromium flags that cut memory and background work on a small VM.
+LEAN_BROWSER_ARGS = [
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-sync",
+    "--mute-audio",
+    "--no-first-run",
+    "--renderer-process-limit=2",
+    "--js-flags=--max-old-space-size=256",
+]
+# Resource types the automation never needs. Stylesheets and scripts stay: the bootstrap-select
+# dropdowns and the visibility checks depend on them.
+LEAN_BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "texttrack", "manifest"}
+# Third-party hosts (analytics, ads, tracking) whose requests are aborted in lean mode.
+LEAN_BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "newrelic.com",
+    "nr-data.net",
+)
+
+def is_blocked_host(url):
+    """Returns True if the URL's host is, or is a subdomain of, one of LEAN_BLOCKED_HOSTS."""
+    from urllib.parse import urlparse
+
+    host = urlparse(url).hostname or ""
+    return any(host == blocked or host.endswith(f".{blocked}") for blocked in LEAN_BLOCKED_HOSTS)
+
+# --- Session Configuration ---
+# Saved cookies/session of the last login, and the profile of the long-lived (--persistent) browser.
+SESSION_DIR = os.path.join(SCRIPT_DIR, ".session")
+STORAGE_STATE_FILE = os.path.join(SESSION_DIR, "storage_state.json")
+PROFILE_DIR = os.path.join(SESSION_DIR, "profile")
+
+# --- Catalog Cache Configuration ---
+# The report and activity dropdown options, cached so scripts can resolve activity names without a browser.
+CATALOG_CACHE_FILE = os.path.join(SCRIPT_DIR, ".cache", "catalog.json")
+CATALOG_TTL_HOURS = float(os.getenv("OV_CATALOG_TTL_HOURS", "24"))
+
+# --- Report Capture Configuration ---
+# How long to wait for the report file once "Generate Report" is clicked, when capturing it.
+CAPTURE_TIMEOUT = float(os.getenv("OV_CAPTURE_TIMEOUT", "20"))
+# Download link in the report modal, for when the portal does not start the download itself.
+DOWNLOAD_LINK_SELECTOR = '.modal a[href*=".xls"], .modal a:has-text("Download")'
+# Captured reports go through the processing pipeline of the sibling ov_process_gmail_reports.py.
+PROCESS_REPORTS_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "ov_process_gmail_reports")
+# Modules that pipeline needs; installed by the "process" extra (uv sync --extra process).
+PROCESS_REQUIRED_MODULES = ("googleapiclient", "google_auth_oauthlib", "pandas", "openpyxl", "pyarrow")
+
+# Reads the options of the #ddlReport and #ddlActivity selects (behind the bootstrap-select widgets) in one call.
+CATALOG_JS = """
+() => {
+    const options = (id) => Array.from(document.querySelectorAll(`#${id} option`))
+        .map((option) => ({id: option.value, name: option.textContent.trim()}));
+    return {reports: options("ddlReport"), activities: options("ddlActivity")};
+}
+"""
+
 class ReportGenerator:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, reuse_session=True, persistent=False, lean=False):
         self.headless = headless
+        # Start Chromium with low-memory flags, abort non-essential requests and stop waiting for the full page load.
+        self.lean = lean
+        self.wait_until = "domcontentloaded" if lean else "load"
+        self.blocked_requests = 0
+        # Restore the saved session instead of logging in, and save the session after a login.
+        self.reuse_session = reuse_session
+        # Keep one long-lived browser profile in PROFILE_DIR instead of a fresh context per run.
+        self.persistent = persistent
         self.playwright = None
         self.browser = None
+        self.context = None
         self.page = None
+        # Extra browser contexts opened for concurrent report requests.
+        self.worker_contexts = []
 
     async def __aenter__(self):
+        from playwright.async_api import async_playwright
+
         self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=self.headless)
-        self.page = await self.browser.new_page()
+        args = LEAN_BROWSER_ARGS if self.lean else []
+        if self.persistent:
+            self.context = await self.playwright.chromium.launch_persistent_context(PROFILE_DIR, headless=self.headless, args=args)
+        else:
+            self.browser = await self.playwright.chromium.launch(headless=self.headless, args=args)
+            storage_state = STORAGE_STATE_FILE if self.reuse_session and os.path.exists(STORAGE_STATE_FILE) else None
+            self.context = await self.browser.new_context(storage_state=storage_state)
+        if self.lean:
+            await self.context.route("**/*", self._route_lean)
+        self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.lean:
+            logging.info(f"Lean mode blocked {self.blocked_requests} requests.")
+        for context in self.worker_contexts:
+            await context.close()
+        if self.context:
+            await self.context.close()
         if self.browser:
             await self.browser.close()
         if self.playwright:
             await self.playwright.stop()
 
+    async def _route_lean(self, route):
+        """Aborts requests for non-essential resource types and blocked third-party hosts."""
+        request = route.request
+        if request.resource_type in LEAN_BLOCKED_RESOURCE_TYPES or is_blocked_host(request.url):
+            self.blocked_requests += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def has_saved_session(self):
+        """Returns True if there is a saved session to try before logging in."""
+        return self.persistent or os.path.exists(STORAGE_STATE_FILE)
+
+    async def is_logged_in(self):
+        """Checks whether the current session is still valid by opening the portal home page."""
+        start = time.perf_counter()
+        await self.page.goto(f"{OV_PORTAL_URL}/Default.aspx", wait_until=self.wait_until)
+        logging.info(f"Portal home page loaded in {time.perf_counter() - start:.2f}s.")
+        # An expired session is redirected to the login page.
+        if not self.page.url.startswith(f"{OV_PORTAL_URL}/Default.aspx"):
+            return False
+        return await self.switch_to_admin_portal()
+
+    async def save_session(self):
+        """Saves the session cookies so the next run can skip the login."""
+        if self.persistent:
+            # The persistent profile keeps its own cookies.
+            return
+        os.makedirs(SESSION_DIR, exist_ok=True)
+        await self.context.storage_state(path=STORAGE_STATE_FILE)
+        os.chmod(STORAGE_STATE_FILE, 0o600)
+        logging.debug(f"Saved session to {STORAGE_STATE_FILE}.")
+
+    async def ensure_logged_in(self):
+        """Reuses the saved session if it is still valid, otherwise logs in (and saves the new session)."""
+        if self.reuse_session and self.has_saved_session():
+            if await self.is_logged_in():
+                logging.info("Reusing saved OnVolunteers session.")
+                return True
+            logging.info("Saved session has expired. Logging in again...")
+
+        start = time.perf_counter()
+        if not await self.login():
+            return False
+        logging.info(f"Login took {time.perf_counter() - start:.2f}s.")
+        if self.reuse_session:
+            await self.save_session()
+        return True
+
     async def login(self):
         """Logs in to OnVolunteers."""
-        # Navigate to the login page
-        await self.page.goto("http://sfx.onvolunteers.com")
-        await self.page.wait_for_load_state('networkidle')
+        # Navigate to the login page and wait for the administrator link rather than for the network to go idle
+        await self.page.goto(OV_LOGIN_URL, wait_until=self.wait_until)
+        administrator_link = self.page.get_by_text("Administrator Click Here")
+        await administrator_link.wait_for()
 
-        # Click the "Administrator Click Here" link
-        await self.page.get_by_text("Administrator Click Here").click()
-        await self.page.wait_for_load_state()
+        # Click the "Administrator Click Here" link, then wait for the login form
+        await administrator_link.click()
+        await self.page.get_by_placeholder("username or email").wait_for()
 
         # Get username and password from environment variables
         username = os.getenv("OV_USERNAME")
@@ -93,16 +264,28 @@ class ReportGenerator:
         await self.page.get_by_role("link", name="Login").click()
 
         # Wait for navigation to complete
-        await self.page.wait_for_url("https://portal.onvolunteers.com/Default.aspx")
+        await self.page.wait_for_url(f"{OV_PORTAL_URL}/Default.aspx", wait_until=self.wait_until)
 
         logging.info("Successfully logged in to SFX OnVolunteers.")
+        return await self.switch_to_admin_portal()
+
+    async def switch_to_admin_portal(self):
+        """Switches from the parent portal to the admin portal if needed. Returns True once in the admin portal."""
+        from playwright.async_api import Error as PlaywrightError
+
+        # Wait for the portal switch link (either way) instead of for the whole page
+        switch_links = self.page.locator('a[href="Switch.aspx?p=0"], a[href="Switch.aspx?p=1"]')
+        try:
+            await switch_links.first.wait_for(timeout=10000)
+        except PlaywrightError:
+            pass
 
         # Check if we need to switch to the admin portal
         switch_to_admin_link = self.page.locator('a[href="Switch.aspx?p=0"]')
         if await switch_to_admin_link.is_visible():
             logging.info("Switching to Admin Portal...")
             await switch_to_admin_link.click()
-            await self.page.wait_for_url("https://portal.onvolunteers.com/Default.aspx")
+            await self.page.locator('a[href="Switch.aspx?p=1"]').wait_for()
 
         # Verify we are in the admin portal
         switch_to_parent_link = self.page.locator('a[href="Switch.aspx?p=1"]')
@@ -122,109 +305,361 @@ class ReportGenerator:
         await self.page.get_by_role("link", name="Built-in Reports").click()
 
         # Wait for the reports page to load
-        await self.page.wait_for_url("https://portal.onvolunteers.com/Report.aspx")
+        start = time.perf_counter()
+        await self.page.wait_for_url(REPORT_URL, wait_until=self.wait_until)
+        await self.page.locator('button[data-id="ddlReport"]').wait_for()
+        logging.info(f"Reports page loaded in {time.perf_counter() - start:.2f}s.")
         logging.info("Successfully navigated to the Built-in Reports page.")
 
-    async def generate_user_volunteer_hours_report(self, activity_id):
-        """Generates the 'User Volunteer Hours' report for a specific activity."""
+    async def get_catalog(self):
+        """Returns {"reports": [...], "activities": [...]} (lists of {"id", "name"}) from the Report.aspx dropdowns."""
+        catalog = await self.page.evaluate(CATALOG_JS)
+        if not catalog["activities"]:
+            # The activity dropdown is only filled in once 'User Volunteer Hours' is selected.
+            await self.page.locator('button[data-id="ddlReport"]').click()
+            await self.page.locator('.dropdown-menu.open').get_by_role("option", name="User Volunteer Hours", exact=True).click()
+            await self.page.locator('#ddlActivity option').first.wait_for(state="attached")
+            catalog = await self.page.evaluate(CATALOG_JS)
+        return catalog
+
+    async def generate_user_volunteer_hours_report(self, activity_id, page=None, capture=False):
+        """
+        Generates the 'User Volunteer Hours' report for a specific activity, on page or else the
+        main page. With capture, returns the report as (filename, bytes) if the portal offers it
+        for download, else None.
+        """
+        page = page or self.page
+        await self.select_user_volunteer_hours_report(activity_id, page)
+        return await self.submit_report(page, capture)
+
+    async def select_user_volunteer_hours_report(self, activity_id, page):
+        """Selects the 'User Volunteer Hours' report and an activity on page, without generating it."""
         logging.info(f"Generating 'User Volunteer Hours' report for activity ID: {activity_id}")
 
         # Select the "User Volunteer Hours" report
-        await self.page.locator('button[data-id="ddlReport"]').click()
-        await self.page.locator('.dropdown-menu.open').get_by_role("option", name="User Volunteer Hours", exact=True).click()
+        await page.locator('button[data-id="ddlReport"]').click()
+        await page.locator('.dropdown-menu.open').get_by_role("option", name="User Volunteer Hours", exact=True).click()
 
         # Select the activity
-        await self.page.locator('button[data-id="ddlActivity"]').click()
+        await page.locator('button[data-id="ddlActivity"]').click()
         
         # We can select the option by its value.
-        await self.page.locator('#ddlActivity').select_option(str(activity_id))
+        await page.locator('#ddlActivity').select_option(str(activity_id))
 
         # Click on the body to close the dropdown
-        await self.page.locator('body').click()
+        await page.locator('body').click()
 
         logging.info(f"Selected activity with ID: {activity_id}")
 
-        # Generate report
-        await self.page.get_by_role("link", name="Generate Report").click()
-        
+    async def submit_report(self, page, capture=False):
+        """
+        Clicks "Generate Report" on page and closes the report modal. With capture, returns the
+        report as (filename, bytes) if the portal offers it for download, else None.
+        """
+        # Generate report, listening for a download it may start
+        downloads = []
+        on_download = downloads.append
+        if capture:
+            page.on("download", on_download)
+        try:
+            await page.get_by_role("link", name="Generate Report").click()
+            captured = await self.capture_download(page, downloads) if capture else None
+        finally:
+            if capture:
+                page.remove_listener("download", on_download)
+
         # Wait for the report to be generated, then close it
         logging.info("\nReport generated. Closing the report...")
-        await self.page.locator('button[data-dismiss="modal"]:has-text("Close")').click()
+        await page.locator('button[data-dismiss="modal"]:has-text("Close")').click()
         logging.info("Report closed.")
+        return captured
+
+    async def capture_download(self, page, downloads):
+        """
+        Waits up to CAPTURE_TIMEOUT for the report file: a download the portal starts itself, or
+        one started from the modal's download link. Returns (filename, bytes), or None if the
+        portal offered no file.
+        """
+        import asyncio
+
+        link = page.locator(DOWNLOAD_LINK_SELECTOR).first
+        link_clicked = False
+        deadline = time.monotonic() + CAPTURE_TIMEOUT
+        while not downloads and time.monotonic() < deadline:
+            if not link_clicked and await link.is_visible():
+                await link.click()
+                link_clicked = True
+            await asyncio.sleep(0.25)
+        if not downloads:
+            return None
+        download = downloads[0]
+        # path() waits for the download to finish.
+        path = await download.path()
+        if path is None:
+            logging.warning(f"Download of {download.suggested_filename} failed: {await download.failure()}")
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        logging.info(f"Captured {download.suggested_filename} ({len(data)} bytes).")
+        return download.suggested_filename, data
+
+    async def new_worker_page(self):
+        """Opens a page for a concurrent worker that shares this generator's logged-in session."""
+        if self.persistent:
+            # Pages of the persistent context already share its cookies.
+            return await self.context.new_page()
+        context = await self.browser.new_context(storage_state=await self.context.storage_state())
+        if self.lean:
+            await context.route("**/*", self._route_lean)
+        self.worker_contexts.append(context)
+        return await context.new_page()
+
+    async def generate_reports(self, activity_ids, concurrency=1, retries=2, processor=None):
+        """
+        Generates the 'User Volunteer Hours' report of every activity, spread over `concurrency`
+        pages (the main page plus extra browser contexts sharing its login). A report that fails
+        before "Generate Report" is clicked is retried up to `retries` times on a freshly loaded
+        Report.aspx. One that fails after the click is not: the portal may already be generating
+        it, and a retry would email it twice. With a processor (CapturedReportProcessor), each
+        report file the portal offers is captured and processed. Returns one result dict per
+        activity with its attempts, seconds, error (None on success), whether it was submitted
+        and whether its file was captured.
+        """
+        import asyncio
+
+        from playwright.async_api import Error as PlaywrightError
+
+        queue = asyncio.Queue()
+        for activity_id in activity_ids:
+            queue.put_nowait(activity_id)
+        results = []
+
+        async def worker(page):
+            while not queue.empty():
+                activity_id = queue.get_nowait()
+                start = time.perf_counter()
+                error = None
+                captured = None
+                submitted = False
+                for attempt in range(1, retries + 2):
+                    try:
+                        if attempt > 1 or page.url != REPORT_URL:
+                            await page.goto(REPORT_URL, wait_until=self.wait_until)
+                            await page.locator('button[data-id="ddlReport"]').wait_for()
+                        await self.select_user_volunteer_hours_report(activity_id, page)
+                        submitted = True
+                        captured = await self.submit_report(page, capture=processor is not None)
+                        error = None
+                        break
+                    except PlaywrightError as e:
+                        error = e
+                        if submitted:
+                            logging.warning(f"Report for activity ID {activity_id} failed after it was requested; not retrying, as it may still arrive by email: {e}")
+                            break
+                        logging.warning(f"Report for activity ID {activity_id} failed (attempt {attempt} of {retries + 1}): {e}")
+                # Processed outside the retry loop: a pipeline failure must not request the report again.
+                if captured:
+                    captured = await asyncio.to_thread(processor.process, activity_id, *captured)
+                elif processor and error is None:
+                    logging.info(f"No file offered for activity ID {activity_id}; it will arrive by email.")
+                results.append({
+                    "activity_id": activity_id, "engine": "browser", "attempts": attempt, "seconds": time.perf_counter() - start,
+                    "error": error, "submitted": submitted, "captured": bool(captured),
+                })
+
+        pages = [self.page] + [await self.new_worker_page() for _ in range(min(concurrency, len(activity_ids)) - 1)]
+        await asyncio.gather(*(worker(page) for page in pages))
+        return results
+
+class CapturedReportProcessor:
+    """
+    Runs captured report files through ov_process_gmail_reports.py's classify, rename, upload
+    and data lake steps in this process, so a report is ready seconds after it is generated
+    instead of after the email round-trip. The pipeline module and the Google Drive
+    connection are loaded on the first report. Thread-safe.
+    """
+
+    def __init__(self):
+        self.pipeline = None
+        self.drive_service = None
+        self.reports_folder_id = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.pipeline is None:
+            self.pipeline = load_processing_pipeline()
+            self.drive_service, self.reports_folder_id = self.pipeline.connect_drive()
+        return self.reports_folder_id is not None
+
+    def process(self, activity_id, filename, data):
+        """Processes one captured report file. Returns True if it was classified and uploaded."""
+        with self.lock:
+            try:
+                if not self.connect():
+                    return False
+                headers = [{"name": "Subject", "value": f"OnVolunteers report for activity {activity_id} (captured from the portal)"}]
+                report = self.pipeline.process_report_file(self.drive_service, self.reports_folder_id, data, filename, f"portal-activity-{activity_id}", headers)
+            except Exception as e:
+                logging.error(f"Processing the captured report for activity ID {activity_id} failed: {e}")
+                return False
+        return report is not None
+
+def missing_processing_modules():
+    """Returns the modules of PROCESS_REQUIRED_MODULES that are not installed, without importing any of them."""
+    return [name for name in PROCESS_REQUIRED_MODULES if importlib.util.find_spec(name) is None]
+
+def load_processing_pipeline():
+    """Imports ov_process_gmail_reports.py from PROCESS_REPORTS_DIR and returns the module."""
+    if PROCESS_REPORTS_DIR not in sys.path:
+        sys.path.insert(0, PROCESS_REPORTS_DIR)
+    import ov_process_gmail_reports
+    return ov_process_gmail_reports
+
+def load_catalog_cache(ttl_hours=CATALOG_TTL_HOURS):
+    """Returns the cached catalog, or None if there is none or it is older than ttl_hours."""
+    try:
+        with open(CATALOG_CACHE_FILE) as f:
+            catalog = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - catalog.get("fetched_at", 0) > ttl_hours * 3600:
+        return None
+    return catalog
+
+def save_catalog_cache(catalog):
+    """Writes the catalog to the cache file atomically."""
+    os.makedirs(os.path.dirname(CATALOG_CACHE_FILE), exist_ok=True)
+    catalog = {"fetched_at": time.time(), "reports": catalog["reports"], "activities": catalog["activities"]}
+    tmp_file = f"{CATALOG_CACHE_FILE}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(tmp_file, CATALOG_CACHE_FILE)
+    return catalog
+
+async def get_catalog(report_generator=None, refresh=False, headless=True, reuse_session=True, persistent=False, lean=False):
+    """
+    Returns the report and activity catalog. It comes from the cache while that is fresh,
+    else from report_generator's Report.aspx page if one is open, else over HTTP with the
+    saved session, and only as a last resort from a new browser login.
+    """
+    catalog = None if refresh else load_catalog_cache()
+    if catalog:
+        logging.debug(f"Using cached catalog from {CATALOG_CACHE_FILE}.")
+        return catalog
+
+    if report_generator:
+        catalog = await report_generator.get_catalog()
+    else:
+        import asyncio
 
-async def run_scripted_actions(headless=True):
-    """Runs a predefined sequence of report generation actions."""
-    async with ReportGenerator(headless=headless) as report_generator:
-        if await report_generator.login():
-            await report_generator.navigate_to_reports()
-            await report_generator.generate_user_volunteer_hours_report(activity_id=30212) # Parking Patrol 2025-2026
-            await report_generator.generate_user_volunteer_hours_report(activity_id=0) # All Activities
+        from ov_report_client import ReportClient, ReportRequestError
 
-async def run_interactive_mode(headless=True):
+        client = ReportClient(OV_PORTAL_URL)
+        if reuse_session and client.load_storage_state(STORAGE_STATE_FILE) and await asyncio.to_thread(client.is_logged_in):
+            try:
+                catalog = await asyncio.to_thread(client.get_catalog)
+            except ReportRequestError as e:
+                logging.warning(f"Could not read the catalog over HTTP: {e}")
+        if catalog is None:
+            async with ReportGenerator(headless=headless, reuse_session=reuse_session, persistent=persistent, lean=lean) as browser_generator:
+                if not await browser_generator.ensure_logged_in():
+                    return None
+                await browser_generator.navigate_to_reports()
+                catalog = await browser_generator.get_catalog()
+    logging.info(f"Fetched {len(catalog['reports'])} reports and {len(catalog['activities'])} activities from the portal.")
+    return save_catalog_cache(catalog)
+
+def find_activity(catalog, name):
+    """Returns the activity whose name matches exactly (ignoring case), else the only one containing name."""
+    activities = [activity for activity in catalog["activities"] if activity["name"].lower() == name.lower()]
+    if not activities:
+        activities = [activity for activity in catalog["activities"] if name.lower() in activity["name"].lower()]
+    if len(activities) != 1:
+        matches = ", ".join(activity["name"] for activity in activities) or "none"
+        raise ValueError(f"Activity name '{name}' matches {len(activities)} activities ({matches}).")
+    return activities[0]
+
+def parse_activity_ids(value):
+    """Parses a comma-separated list of activity IDs, e.g. "30212,0"."""
+    return [int(activity_id) for activity_id in value.split(",") if activity_id.strip()]
+
+def log_report_timings(results):
+    """Logs how long each report took, and how many failed."""
+    logging.info("Report timings:")
+    for result in results:
+        status = "ok" if result["error"] is None else "FAILED"
+        captured = ", captured" if result.get("captured") else ""
+        if result["error"] is not None and result.get("submitted"):
+            captured = ", after it was requested (check the inbox before requesting it again)"
+        logging.info(f"  activity {result['activity_id']:>8}: {status:<6} {result['seconds']:6.1f}s, {result['attempts']} attempt(s) via {result['engine']}{captured}")
+    failed = sum(result["error"] is not None for result in results)
+    total = sum(result["seconds"] for result in results)
+    logging.info(f"{len(results) - failed} of {len(results)} reports generated ({total:.1f}s of report time).")
+    captured = sum(bool(result.get("captured")) for result in results)
+    if captured:
+        logging.info(f"{captured} report(s) captured and processed directly; the rest will arrive by email.")
+
+async def run_scripted_actions(headless=True, reuse_session=True, persistent=False, activity_ids=None, concurrency=1, retries=2, lean=False, process=False):
+    """Generates the 'User Volunteer Hours' report of each activity, several at a time, processing the captured files with process."""
+    processor = CapturedReportProcessor() if process else None
+    async with ReportGenerator(headless=headless, reuse_session=reuse_session, persistent=persistent, lean=lean) as report_generator:
+        if await report_generator.ensure_logged_in():
+            start = time.perf_counter()
+            results = await report_generator.generate_reports(activity_ids or DEFAULT_ACTIVITY_IDS, concurrency, retries, processor)
+            log_report_timings(results)
+            logging.info(f"Scripted run finished in {time.perf_counter() - start:.1f}s with concurrency {concurrency}.")
+
+async def run_http_actions(headless=True, reuse_session=True, persistent=False, activity_ids=None, concurrency=1, retries=2, lean=False, process=False):
+    """
+    Generates the 'User Volunteer Hours' report of each activity with direct Report.aspx
+    postbacks. The browser is only started to log in when the saved session has expired,
+    and to retry, the old way, any report the HTTP client could not request. With process,
+    report files returned by the postback are processed directly.
+    """
+    import asyncio
+
+    from ov_report_client import ReportClient
+
+    activity_ids = activity_ids or DEFAULT_ACTIVITY_IDS
+    processor = CapturedReportProcessor() if process else None
+    start = time.perf_counter()
+    client = ReportClient(OV_PORTAL_URL)
+    if reuse_session and client.load_storage_state(STORAGE_STATE_FILE) and await asyncio.to_thread(client.is_logged_in):
+        logging.info("Reusing saved OnVolunteers session over HTTP.")
+    else:
+        async with ReportGenerator(headless=headless, reuse_session=reuse_session, persistent=persistent, lean=lean) as report_generator:
+            if not await report_generator.ensure_logged_in():
+                return
+            client.load_cookies(await report_generator.context.cookies())
+
+    results = await asyncio.to_thread(client.generate_reports, activity_ids, retries, processor.process if processor else None)
+
+    # A report whose request reached the portal may still be emailed; only the others go to the browser.
+    failed = [result["activity_id"] for result in results if result["error"] is not None and not result["submitted"]]
+    if failed:
+        logging.warning(f"Falling back to the browser for {len(failed)} report(s)...")
+        async with ReportGenerator(headless=headless, reuse_session=reuse_session, persistent=persistent, lean=lean) as report_generator:
+            if await report_generator.ensure_logged_in():
+                retried = {result["activity_id"]: result for result in await report_generator.generate_reports(failed, concurrency, retries, processor)}
+                results = [retried.get(result["activity_id"], result) for result in results]
+
+    log_report_timings(results)
+    logging.info(f"Scripted run finished in {time.perf_counter() - start:.1f}s over HTTP.")
+
+async def run_interactive_mode(headless=True, reuse_session=True, persistent=False, lean=False, refresh_catalog=False):
     """Runs the original interactive report generation script."""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
-        page = await browser.new_page()
-
-        # Navigate to the login page
-        await page.goto("http://sfx.onvolunteers.com")
-        await page.wait_for_load_state('networkidle')
-
-        # Click the "Administrator Click Here" link
-        await page.get_by_text("Administrator Click Here").click()
-        await page.wait_for_load_state()
-
-        # Get username and password from environment variables
-        username = os.getenv("OV_USERNAME")
-        password = os.getenv("OV_PASSWORD")
-
-        if not username or not password:
-            logging.warning("Please set the OV_USERNAME and OV_PASSWORD environment variables.")
-            await browser.close()
-            return
-
-        # Fill in the username and password
-        await page.get_by_placeholder("username or email").fill(username)
-        await page.get_by_placeholder("password").fill(password)
-
-        # Click the login button
-        await page.get_by_role("link", name="Login").click()
-
-        # Wait for navigation to complete
-        await page.wait_for_url("https://portal.onvolunteers.com/Default.aspx")
-
-        logging.info("Successfully logged in to SFX OnVolunteers.")
-
-        # Check if we need to switch to the admin portal
-        switch_to_admin_link = page.locator('a[href="Switch.aspx?p=0"]')
-        if await switch_to_admin_link.is_visible():
-            logging.info("Switching to Admin Portal...")
-            await switch_to_admin_link.click()
-            await page.wait_for_url("https://portal.onvolunteers.com/Default.aspx")
-
-        # Verify we are in the admin portal
-        switch_to_parent_link = page.locator('a[href="Switch.aspx?p=1"]')
-        if not await switch_to_parent_link.is_visible():
-            logging.warning("Could not verify that we are in the admin portal. Exiting.")
-            await browser.close()
+    async with ReportGenerator(headless=headless, reuse_session=reuse_session, persistent=persistent, lean=lean) as report_generator:
+        if not await report_generator.ensure_logged_in():
             return
+        await report_generator.navigate_to_reports()
+        page = report_generator.page
 
-        logging.info("Successfully in the Admin Portal.")
-
-        # Hover over the "Reports" menu
-        await page.get_by_role("link", name=" Reports").hover()
-
-        # Click the "Built-in Reports" link
-        await page.get_by_role("link", name="Built-in Reports").click()
-
-        # Wait for the reports page to load
-        await page.wait_for_url("https://portal.onvolunteers.com/Report.aspx")
+        # Get the report and activity options once, from the cache or a single page evaluation
+        catalog = await get_catalog(report_generator, refresh=refresh_catalog)
+        report_options = [report["name"] for report in catalog["reports"]]
+        activity_options = catalog["activities"]
 
         while True:
-            # Get the report options from the combobox
-            report_options_text = await page.locator("#ddlReport").inner_text()
-            report_options = report_options_text.split('\n')
-
             logging.info("\nAvailable reports:")
             for i, option in enumerate(report_options):
                 if option != "Select Report":
@@ -235,7 +670,6 @@ async def run_interactive_mode(headless=True):
             choice = input("\nEnter the number of the report you want to generate: ")
 
             if choice == str(len(report_options)) or choice.lower() == 'exit':
-                await browser.close()
                 logging.info("Exiting...")
                 break
 
@@ -248,24 +682,16 @@ async def run_interactive_mode(headless=True):
                 await page.locator('.dropdown-menu.open').get_by_role("option", name=selected_report, exact=True).click()
 
                 if selected_report == "User Volunteer Hours":
-                    # Get activity options
-                    logging.info("Clicking on the activity dropdown...")
-                    await page.locator('button[data-id="ddlActivity"]').click()
-                    logging.info("Activity dropdown clicked.")
-                    
-                    logging.info("Getting activity options...")
-                    activity_options_elements = await page.locator('button[data-id="ddlActivity"] ~ .dropdown-menu.open .text').all()
-                    logging.info(f"Found {len(activity_options_elements)} activity options.")
-                    activity_options = [await el.inner_text() for el in activity_options_elements]
-
                     logging.info("\nAvailable activities:")
                     for i, option in enumerate(activity_options):
-                        logging.info(f"{i}. {option}")
+                        logging.info(f"{i}. {option['name']}")
 
                     activity_choice = input("\nEnter the number of the activity: ")
                     selected_activity = activity_options[int(activity_choice)]
-                    await page.locator(f'.dropdown-menu.open .text:has-text("{selected_activity}")').click()
-                    logging.info(f"\nYou selected activity: {selected_activity}")
+                    await page.locator('button[data-id="ddlActivity"]').click()
+                    await page.locator('#ddlActivity').select_option(selected_activity["id"])
+                    await page.locator('body').click()
+                    logging.info(f"\nYou selected activity: {selected_activity['name']}")
 
                     # Generate report
                     await page.get_by_role("link", name="Generate Report").click()
@@ -287,26 +713,71 @@ async def run_interactive_mode(headless=True):
             except (ValueError, IndexError):
                 logging.warning("\nInvalid choice. Please try again.")
 
-async def main():
+def main():
     """Main function to run the script."""
     parser = argparse.ArgumentParser(description="Generate reports from OnVolunteers.")
     parser.add_argument('--scripted', action='store_true', help='Run in scripted mode.')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging.')
     parser.add_argument('--headless', type=str, help='Override headless mode setting.')
+    parser.add_argument('--fresh-login', action='store_true', help='Ignore the saved session and log in again (the new session is not saved).')
+    parser.add_argument('--persistent', action='store_true', help='Use a long-lived browser profile that stays logged in between runs.')
+    parser.add_argument('--activities', type=parse_activity_ids, default=os.getenv("OV_ACTIVITY_IDS"), help='Comma-separated activity IDs for --scripted (default: OV_ACTIVITY_IDS, else the built-in list).')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv("OV_CONCURRENCY", "1")), help='Reports generated at once in --scripted mode, each in its own browser context (default: OV_CONCURRENCY or 1).')
+    parser.add_argument('--retries', type=int, default=2, help='Retries for a failed report in --scripted mode (default: 2).')
+    parser.add_argument('--lean', action='store_true', default=os.getenv("OV_LEAN", "false").lower() in ["true", "1"], help='Start a low-memory browser that skips images, fonts and analytics (default: OV_LEAN).')
+    parser.add_argument('--list-activities', action='store_true', help='Print the activity IDs and names (from the catalog cache when fresh) and exit.')
+    parser.add_argument('--activity-name', action='append', default=[], help='Resolve an activity name to its ID, via the catalog cache; with --scripted, also generate its report. Repeatable.')
+    parser.add_argument('--refresh-catalog', action='store_true', help='Ignore the catalog cache and read the catalog from the portal.')
+    parser.add_argument('--engine', choices=['browser', 'http'], default=os.getenv("OV_ENGINE", "browser"), help='How --scripted requests reports: by driving the browser, or with direct HTTP postbacks and the browser as fallback (default: OV_ENGINE or browser).')
+    parser.add_argument('--process', action='store_true', default=os.getenv("OV_PROCESS", "false").lower() in ["true", "1"], help='In --scripted mode, capture each report file the portal offers and run it through ov_process_gmail_reports.py right away; reports without a file still arrive by email (default: OV_PROCESS).')
     args = parser.parse_args()
 
-    if args.debug:
-        LOGGING_CONFIG["handlers"]["console"]["level"] = "DEBUG"
-        logging.config.dictConfig(LOGGING_CONFIG)
+    if args.scripted and args.process:
+        # Checked once here: otherwise every captured report would fail on the same import.
+        missing = missing_processing_modules()
+        if missing:
+            parser.error(
+                f"--process needs the dependencies of ov_process_gmail_reports.py (missing: {', '.join(missing)}). "
+                "Install them with 'uv sync --extra process' (or 'pip install -r ../ov_process_gmail_reports/requirements.txt')."
+            )
+
+    setup_logging(args.debug)
 
     headless_mode = os.getenv("OV_HEADLESS", "false").lower() in ["true", "1"]
     if args.headless is not None:
         headless_mode = args.headless.lower() in ['true', 't']
 
+    browser_options = dict(headless=headless_mode, reuse_session=not args.fresh_login, persistent=args.persistent, lean=args.lean)
+    import asyncio
+
+    asyncio.run(run(args, browser_options))
+
+async def run(args, browser_options):
+    """Runs the mode chosen on the command line."""
+    if args.list_activities or args.activity_name:
+        catalog = await get_catalog(refresh=args.refresh_catalog, **browser_options)
+        if catalog is None:
+            return
+        if args.list_activities:
+            for activity in catalog["activities"]:
+                print(f"{activity['id']}\t{activity['name']}")
+            return
+        try:
+            named_ids = [int(find_activity(catalog, name)["id"]) for name in args.activity_name]
+        except ValueError as e:
+            logging.error(e)
+            return
+        if not args.scripted:
+            for name, activity_id in zip(args.activity_name, named_ids):
+                print(f"{activity_id}\t{name}")
+            return
+        args.activities = (args.activities or []) + named_ids
+
     if args.scripted:
-        await run_scripted_actions(headless=headless_mode)
+        run_actions = run_http_actions if args.engine == "http" else run_scripted_actions
+        await run_actions(activity_ids=args.activities, concurrency=args.concurrency, retries=args.retries, process=args.process, **browser_options)
     else:
-        await run_interactive_mode(headless=headless_mode)
+        await run_interactive_mode(refresh_catalog=args.refresh_catalog, **browser_options)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
\ No newline at end of file
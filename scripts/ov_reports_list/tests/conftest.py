@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ov_reports_list  # noqa: E402
+from fake_portal import FakePortal  # noqa: E402
+
+
+@pytest.fixture
+def portal():
+    with FakePortal() as portal:
+        yield portal
+
+
+@pytest.fixture
+def reports_list(tmp_path, monkeypatch, portal):
+    """ov_reports_list pointed at the fake portal, with its session and catalog cache under tmp_path."""
+    session_dir = tmp_path / ".session"
+    monkeypatch.setattr(ov_reports_list, "OV_PORTAL_URL", portal.url)
+    monkeypatch.setattr(ov_reports_list, "REPORT_URL", f"{portal.url}/Report.aspx")
+    monkeypatch.setattr(ov_reports_list, "SESSION_DIR", str(session_dir))
+    monkeypatch.setattr(ov_reports_list, "STORAGE_STATE_FILE", str(session_dir / "storage_state.json"))
+    monkeypatch.setattr(ov_reports_list, "CATALOG_CACHE_FILE", str(tmp_path / ".cache" / "catalog.json"))
+    return ov_reports_list
@@ -0,0 +1,127 @@
+"""
+A local stand-in for the OnVolunteers Report.aspx page, served over HTTP from the pages in
+fixtures/. It checks what a real WebForms page checks: the session cookie, and the view
+state of the form the postback came from. Every postback is recorded in `posts`.
+"""
+
+import os
+import threading
+import urllib.parse
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SESSION_COOKIE = "ASP.NET_SessionId"
+SESSION_ID = "test-session"
+REPORT_FIELD = "ctl00$Main$ddlReport"
+ACTIVITY_FIELD = "ctl00$Main$ddlActivity"
+GENERATE_TARGET = "ctl00$Main$lnkGenerate"
+USER_VOLUNTEER_HOURS = "12"
+REPORT_BYTES = b"PK\x03\x04 fake xlsx"
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return f.read()
+
+
+def report_page(view_state, report=None):
+    """Report.aspx with the given view state and report selected, with the activity dropdown of User Volunteer Hours."""
+    page = fixture("report.html")
+    page = page.replace("{view_state}", view_state).replace("{event_validation}", f"ev-{view_state}")
+    if report:
+        page = page.replace('<option selected="selected" value="0">', '<option value="0">')
+        page = page.replace(f'<option value="{report}">', f'<option selected="selected" value="{report}">')
+    return page.replace("{activity_select}", fixture("activity_select.html") if report == USER_VOLUNTEER_HOURS else "")
+
+
+class FakePortal:
+    """
+    Serves Report.aspx on 127.0.0.1. `attachment` decides how "Generate Report" answers: a
+    Content-Disposition filename, "" for a download without one, or None for the page itself
+    (the report is emailed). fail_loads and fail_generates make the next GETs or
+    "Generate Report" postbacks answer HTTP 500.
+    """
+
+    def __init__(self):
+        self.posts = []
+        self.attachment = "UserVolunteerHours.xlsx"
+        self.fail_loads = 0
+        self.fail_generates = 0
+        self.lock = threading.Lock()
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                portal.handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                portal.handle(self, urllib.parse.parse_qs(self.rfile.read(length).decode(), keep_blank_values=True))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def cookies(self, session_id=SESSION_ID):
+        """The session cookie in Playwright's format, as BrowserContext.cookies() returns it."""
+        return [{"name": SESSION_COOKIE, "value": session_id, "domain": "127.0.0.1", "path": "/"}]
+
+    def handle(self, request, form):
+        path = urllib.parse.urlparse(request.path).path
+        if path == "/Login.aspx":
+            return self.respond(request, 200, fixture("login.html"))
+        if path != "/Report.aspx":
+            return self.respond(request, 404, "Not found")
+        cookie = SimpleCookie(request.headers.get("Cookie", ""))
+        if SESSION_COOKIE not in cookie or cookie[SESSION_COOKIE].value != SESSION_ID:
+            return self.respond(request, 302, "", {"Location": "/Login.aspx?ReturnUrl=%2fReport.aspx"})
+        if form is None:
+            with self.lock:
+                failing, self.fail_loads = self.fail_loads > 0, max(self.fail_loads - 1, 0)
+            if failing:
+                return self.respond(request, 500, "Server Error")
+            return self.respond(request, 200, report_page("vs-initial"))
+        return self.postback(request, {name: values[0] for name, values in form.items()})
+
+    def postback(self, request, fields):
+        with self.lock:
+            self.posts.append(fields)
+        view_state = fields.get("__VIEWSTATE")
+        if fields.get("__EVENTVALIDATION") != f"ev-{view_state}":
+            return self.respond(request, 500, "Invalid postback or callback argument.")
+        if fields["__EVENTTARGET"] == REPORT_FIELD:
+            return self.respond(request, 200, report_page(f"vs-report-{fields[REPORT_FIELD]}", fields[REPORT_FIELD]))
+        if fields["__EVENTTARGET"] == GENERATE_TARGET:
+            if view_state != f"vs-report-{USER_VOLUNTEER_HOURS}" or ACTIVITY_FIELD not in fields:
+                return self.respond(request, 500, "Invalid postback or callback argument.")
+            with self.lock:
+                failing, self.fail_generates = self.fail_generates > 0, max(self.fail_generates - 1, 0)
+            if failing:
+                return self.respond(request, 500, "Server Error")
+            if self.attachment is None:
+                return self.respond(request, 200, report_page(view_state, fields[REPORT_FIELD]))
+            disposition = f'attachment; filename="{self.attachment}"' if self.attachment else "attachment"
+            return self.respond(request, 200, REPORT_BYTES, {"Content-Disposition": disposition, "Content-Type": "application/vnd.ms-excel"})
+        return self.respond(request, 200, report_page(view_state, fields.get(REPORT_FIELD)))
+
+    def respond(self, request, status, body, headers=None):
+        body = body if isinstance(body, bytes) else body.encode()
+        request.send_response(status)
+        for name, value in (headers or {"Content-Type": "text/html; charset=utf-8"}).items():
+            request.send_header(name, value)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
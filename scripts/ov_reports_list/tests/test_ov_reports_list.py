@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from fake_portal import ACTIVITY_FIELD, GENERATE_TARGET
+
+
+def save_session(reports_list, cookies):
+    os.makedirs(reports_list.SESSION_DIR, exist_ok=True)
+    with open(reports_list.STORAGE_STATE_FILE, "w") as f:
+        json.dump({"cookies": cookies, "origins": []}, f)
+
+
+class BrowserStub:
+    """Stands in for ReportGenerator, recording the reports the browser is asked to retry."""
+
+    instances = []
+
+    def __init__(self, **options):
+        self.retried = []
+        BrowserStub.instances.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def ensure_logged_in(self):
+        return True
+
+    async def generate_reports(self, activity_ids, concurrency=1, retries=2, processor=None):
+        self.retried.extend(activity_ids)
+        return [{"activity_id": activity_id, "seconds": 0.0, "attempts": 1, "engine": "browser", "error": None, "submitted": True}
+                for activity_id in activity_ids]
+
+
+@pytest.fixture
+def browser(reports_list, monkeypatch):
+    BrowserStub.instances = []
+    monkeypatch.setattr(reports_list, "ReportGenerator", BrowserStub)
+    return BrowserStub.instances
+
+
+@pytest.mark.parametrize("url, blocked", [
+    ("https://google-analytics.com/collect", True),
+    ("https://www.google-analytics.com/g/collect?v=2", True),
+    ("https://static.hotjar.com/c/hotjar.js", True),
+    ("https://notgoogle-analytics.com/collect", False),
+    ("https://google-analytics.com.example.org/", False),
+    ("https://portal.onvolunteers.com/Report.aspx", False),
+    ("about:blank", False),
+])
+def test_is_blocked_host(reports_list, url, blocked):
+    assert reports_list.is_blocked_host(url) is blocked
+
+
+def test_parse_activity_ids(reports_list):
+    assert reports_list.parse_activity_ids("30212, 0,,30300,") == [30212, 0, 30300]
+    with pytest.raises(ValueError):
+        reports_list.parse_activity_ids("30212,parking")
+
+
+CATALOG = {
+    "reports": [{"id": "12", "name": "User Volunteer Hours"}],
+    "activities": [
+        {"id": "30212", "name": "Parking Lot"},
+        {"id": "30300", "name": "Parking Lot Captains"},
+        {"id": "30400", "name": "Bake Sale"},
+    ],
+}
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Parking Lot", "30212"),
+    ("parking lot captains", "30300"),
+    ("bake", "30400"),
+])
+def test_find_activity(reports_list, name, expected):
+    assert reports_list.find_activity(CATALOG, name)["id"] == expected
+
+
+@pytest.mark.parametrize("name, matches", [("Park", 2), ("Car Wash", 0)])
+def test_find_activity_needs_one_match(reports_list, name, matches):
+    with pytest.raises(ValueError, match=f"matches {matches} activities"):
+        reports_list.find_activity(CATALOG, name)
+
+
+def test_catalog_cache_round_trip(reports_list):
+    assert reports_list.load_catalog_cache() is None
+    saved = reports_list.save_catalog_cache(CATALOG)
+    assert reports_list.load_catalog_cache() == saved
+    assert saved["reports"] == CATALOG["reports"] and saved["activities"] == CATALOG["activities"]
+    assert not os.path.exists(f"{reports_list.CATALOG_CACHE_FILE}.tmp")
+
+
+def test_catalog_cache_expires(reports_list):
+    saved = reports_list.save_catalog_cache(CATALOG)
+    with open(reports_list.CATALOG_CACHE_FILE, "w") as f:
+        json.dump({**saved, "fetched_at": time.time() - 2 * 3600}, f)
+    assert reports_list.load_catalog_cache(ttl_hours=1) is None
+    assert reports_list.load_catalog_cache(ttl_hours=3) is not None
+
+
+def test_unreadable_catalog_cache(reports_list):
+    os.makedirs(os.path.dirname(reports_list.CATALOG_CACHE_FILE))
+    with open(reports_list.CATALOG_CACHE_FILE, "w") as f:
+        f.write('{"fetched_at": ')
+    assert reports_list.load_catalog_cache() is None
+
+
+def test_get_catalog_over_http_then_from_the_cache(reports_list, portal, browser):
+    save_session(reports_list, portal.cookies())
+
+    catalog = asyncio.run(reports_list.get_catalog())
+    assert [activity["id"] for activity in catalog["activities"]] == ["0", "30212", "30300", "Unassigned"]
+    assert reports_list.load_catalog_cache() == catalog
+    posts = len(portal.posts)
+
+    assert asyncio.run(reports_list.get_catalog()) == catalog
+    assert len(portal.posts) == posts
+
+    asyncio.run(reports_list.get_catalog(refresh=True))
+    assert len(portal.posts) > posts
+    assert browser == []
+
+
+def test_has_saved_session(reports_list, portal):
+    generator = reports_list.ReportGenerator()
+    assert not generator.has_saved_session()
+    save_session(reports_list, portal.cookies())
+    assert generator.has_saved_session()
+
+
+def test_http_run_sends_only_unsubmitted_failures_to_the_browser(reports_list, portal, browser):
+    save_session(reports_list, portal.cookies())
+    portal.fail_generates = 1
+
+    asyncio.run(reports_list.run_http_actions(activity_ids=[99, 30300, 0], retries=0))
+
+    # 99 is not in the activity dropdown, so it never reached the portal; 30300 failed after Generate Report was sent.
+    generated = [post[ACTIVITY_FIELD] for post in portal.posts if post["__EVENTTARGET"] == GENERATE_TARGET]
+    assert generated == ["30300", "0"]
+    assert [generator.retried for generator in browser] == [[99]]
+
+
+def test_missing_processing_modules(reports_list, monkeypatch):
+    monkeypatch.setattr(reports_list, "PROCESS_REQUIRED_MODULES", ("json", "no_such_module_for_tests"))
+    assert reports_list.missing_processing_modules() == ["no_such_module_for_tests"]
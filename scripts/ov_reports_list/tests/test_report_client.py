@@ -0,0 +1,140 @@
+import json
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from fake_portal import ACTIVITY_FIELD, GENERATE_TARGET, REPORT_BYTES, REPORT_FIELD, SESSION_COOKIE
+from ov_report_client import ReportClient, ReportRequestError, attachment_filename, is_attachment, report_filename
+
+
+@pytest.fixture
+def client(portal):
+    client = ReportClient(portal.url, timeout=5)
+    client.load_cookies(portal.cookies())
+    return client
+
+
+def test_load_form(client):
+    client.load_form()
+    assert client.form.fields["__VIEWSTATE"] == "vs-initial"
+
+
+def test_expired_session_is_not_logged_in(portal):
+    client = ReportClient(portal.url, timeout=5)
+    client.load_cookies(portal.cookies(session_id="expired"))
+    with pytest.raises(ReportRequestError, match="not logged in"):
+        client.load_form()
+    assert not client.is_logged_in()
+
+
+def test_server_error(client, portal):
+    portal.fail_loads = 1
+    with pytest.raises(ReportRequestError, match="HTTP 500"):
+        client.load_form()
+
+
+def test_session_from_storage_state(tmp_path, portal):
+    path = tmp_path / "storage_state.json"
+    client = ReportClient(portal.url, timeout=5)
+    assert not client.load_storage_state(str(path))
+    path.write_text(json.dumps({"cookies": portal.cookies(), "origins": []}))
+    assert client.load_storage_state(str(path))
+    assert client.session.cookies.get(SESSION_COOKIE) == "test-session"
+    assert client.is_logged_in()
+
+
+def test_select_report_posts_back_with_the_view_state(client, portal):
+    client.load_form()
+    client.select_report("User Volunteer Hours")
+    post, = portal.posts
+    assert post["__EVENTTARGET"] == REPORT_FIELD
+    assert post["__VIEWSTATE"] == "vs-initial"
+    assert post["__EVENTVALIDATION"] == "ev-vs-initial"
+    assert post[REPORT_FIELD] == "12"
+    assert client.form.fields["__VIEWSTATE"] == "vs-report-12"
+    # Already selected: no second postback.
+    client.select_report("User Volunteer Hours")
+    assert len(portal.posts) == 1
+
+
+def test_catalog(client):
+    catalog = client.get_catalog()
+    assert catalog["reports"][1] == {"id": "12", "name": "User Volunteer Hours"}
+    assert [activity["id"] for activity in catalog["activities"]] == ["0", "30212", "30300", "Unassigned"]
+
+
+def test_generate_report_returns_the_file(client, portal):
+    assert client.generate_user_volunteer_hours_report(30212) == ("UserVolunteerHours.xlsx", REPORT_BYTES)
+    generate = portal.posts[-1]
+    assert generate["__EVENTTARGET"] == GENERATE_TARGET
+    assert generate["__VIEWSTATE"] == "vs-report-12"
+    assert generate[ACTIVITY_FIELD] == "30212"
+
+
+def test_generate_report_without_a_filename(client, portal):
+    portal.attachment = ""
+    filename, data = client.generate_user_volunteer_hours_report(30212)
+    assert filename == report_filename(30212)
+    assert data == REPORT_BYTES
+
+
+def test_generate_report_emailed(client, portal):
+    portal.attachment = None
+    assert client.generate_user_volunteer_hours_report(30212) is None
+
+
+def test_unknown_activity(client):
+    with pytest.raises(ReportRequestError, match="no option '99'"):
+        client.generate_user_volunteer_hours_report(99)
+
+
+def test_generate_reports_retries_failures_before_the_request(client, portal):
+    portal.fail_loads = 2
+    result, = client.generate_reports([30212], retries=2)
+    assert result["error"] is None
+    assert result["attempts"] == 3
+    assert sum(post["__EVENTTARGET"] == GENERATE_TARGET for post in portal.posts) == 1
+
+
+def test_generate_reports_does_not_retry_after_the_request(client, portal):
+    portal.fail_generates = 1
+    result, = client.generate_reports([30212, 0], retries=2)[:1]
+    assert isinstance(result["error"], ReportRequestError)
+    assert result["submitted"] and result["attempts"] == 1
+    # One Generate Report postback per activity: the failed one was not sent again.
+    assert [post[ACTIVITY_FIELD] for post in portal.posts if post["__EVENTTARGET"] == GENERATE_TARGET] == ["30212", "0"]
+
+
+def test_generate_reports_passes_files_on(client):
+    received = []
+
+    def on_report_file(activity_id, filename, data):
+        received.append((activity_id, filename, data))
+        return True
+
+    results = client.generate_reports([30212, 0], on_report_file=on_report_file)
+    assert [result["captured"] for result in results] == [True, True]
+    assert received == [(30212, "UserVolunteerHours.xlsx", REPORT_BYTES), (0, "UserVolunteerHours.xlsx", REPORT_BYTES)]
+
+
+def response(disposition=None):
+    return SimpleNamespace(headers={"Content-Disposition": disposition} if disposition is not None else {})
+
+
+@pytest.mark.parametrize("disposition, expected", [
+    ('attachment; filename="Hours Report.xlsx"', "Hours Report.xlsx"),
+    ("attachment; filename=hours.xlsx", "hours.xlsx"),
+    ("attachment; filename*=UTF-8''hours%20report.xlsx", "hours%20report.xlsx"),
+    ('ATTACHMENT; FILENAME="../../etc/hours.xlsx"', "hours.xlsx"),
+    ("attachment", "default.xlsx"),
+    ('inline; filename="hours.xlsx"', None),
+    (None, None),
+])
+def test_attachment_filename(disposition, expected):
+    assert attachment_filename(response(disposition), "default.xlsx") == expected
+    assert is_attachment(response(disposition)) == (expected is not None)
+
+
+def test_report_filename():
+    assert report_filename(30212, date(2025, 10, 1)) == "OnVolunteers_Volunteer_Hours_Report2025-10-01__activity-30212.xlsx"
@@ -0,0 +1,39 @@
+from fake_portal import fixture, report_page
+from ov_report_client import WebForm
+
+
+def test_submitted_fields():
+    form = WebForm(report_page("vs-1"))
+    assert form.fields == {
+        "__EVENTTARGET": "",
+        "__EVENTARGUMENT": "",
+        "__VIEWSTATE": "vs-1",
+        "__EVENTVALIDATION": "ev-vs-1",
+        "ctl00$Main$txtSearch": "",
+        # An unchecked checkbox and the submit button are not submitted.
+        "ctl00$Main$chkEmail": "on",
+        "ctl00$Main$ddlReport": "0",
+    }
+
+
+def test_dropdowns():
+    form = WebForm(report_page("vs-1", report="12"))
+    assert form.selects["ddlReport"]["name"] == "ctl00$Main$ddlReport"
+    assert form.selects["ddlReport"]["options"] == [("0", "-- Select a report --"), ("12", "User Volunteer Hours"), ("13", "Family Hours & Fines")]
+    assert "__doPostBack" in form.selects["ddlReport"]["onchange"]
+    # An option without a value submits its text; without a selected option, the first one is submitted.
+    assert form.selects["ddlActivity"]["options"][-1] == ("Unassigned", "Unassigned")
+    assert form.fields["ctl00$Main$ddlActivity"] == "0"
+    assert form.fields["ctl00$Main$ddlReport"] == "12"
+
+
+def test_postback_links():
+    form = WebForm(report_page("vs-1"))
+    # Link text is matched with its whitespace collapsed; plain links are not postbacks.
+    assert form.postback_links == {"Generate Report": ("ctl00$Main$lnkGenerate", "")}
+
+
+def test_page_without_form():
+    form = WebForm(fixture("login.html"))
+    assert "ddlReport" not in form.selects
+    assert form.postback_links == {}